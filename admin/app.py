@@ -2,22 +2,52 @@
 ArielGo Admin Dashboard
 A Flask web application for managing laundry bookings with authentication
 """
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session
+from flask import Flask, Response, render_template, stream_template, stream_with_context, request, redirect, url_for, jsonify, flash, session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from functools import wraps
 import sqlite3
 import os
-import hashlib
-import bcrypt
-import json
 from datetime import datetime
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables before the admin modules read their settings
 load_dotenv()
+
+import archive
+import audit
+import capacity
+import db
+import dispatch
+import etags
+import export
+import fragments
+import live
+import manifests
+import metrics
+import schema
+import search
+import shards
+import stats
+import timeseries
+import workload
+from audit import audit_log
+from booking_view import BookingView, DASHBOARD_COLUMNS, DETAIL_COLUMNS, LIST_COLUMNS
+from db import get_db_connection
+from fragments import Deferred, fragment_cache
+from pagination import KeysetPage, decode_cursor, keyset_query, parse_page_size
+from passwords import HashPoolBusy, hash_password, hash_pool, verify_password
+from user_cache import user_cache
+from workload import workload_cache
+
 app = Flask(__name__)
+app.add_template_global(fragments.cached_fragment)
+app.add_template_global(shards.location_param)
+app.add_template_global(list(db.LOCATIONS), 'locations')
+app.add_template_global(db.PRIMARY_LOCATION, 'primary_location')
+app.add_template_global(live.LIVE_STREAM_URL, 'live_stream_url')
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'database', 'arielgo.db')
+db.init_app(app)
+metrics.init_app(app)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -25,6 +55,18 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access the admin dashboard.'
 
+def install_admin_schema():
+    """Make sure the admin indexes and trigger-maintained tables exist at every location"""
+    with app.app_context():
+        for location in db.LOCATIONS:
+            schema.install_admin_schema(
+                get_db_connection(readonly=False, location=location),
+                on_error=lambda name, e: app.logger.warning('Could not install %s at %s: %s', name, location, e),
+                accounts=location == db.PRIMARY_LOCATION,
+            )
+
+install_admin_schema()
+
 # USER MODEL
 class User(UserMixin):
     def __init__(self, id, username, email, full_name, role):
@@ -42,47 +84,34 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user from database"""
-    conn = get_db_connection()
+    """Load user from the cache, falling back to the database"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    return fetch_user(get_db_connection(), user_id)
+
+def fetch_user(conn, user_id):
+    """Load an active user from the database into the cache; None if there isn't one"""
+    # Taken before the read, so an invalidation that lands mid-load keeps the row out of the cache
+    stamp = user_cache.stamp()
     user_data = conn.execute(
         'SELECT * FROM admin_users WHERE id = ? AND is_active = 1',
         (user_id,)
     ).fetchone()
-    conn.close()
 
     if user_data:
-        return User(
+        user = User(
             id=user_data['id'],
             username=user_data['username'],
             email=user_data['email'],
             full_name=user_data['full_name'],
             role=user_data['role']
         )
+        user_cache.set(user_id, user, stamp)
+        return user
     return None
 
-# DATABASE HELPER FUNCTIONS
-def get_db_connection():
-    """Create a database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def verify_password(password, password_hash):
-    """
-    Verify password against hash
-    Supports both bcrypt (new) and SHA256 (legacy) for migration
-    """
-    # Check if it's a bcrypt hash (starts with $2a$, $2b$, or $2y$)
-    if password_hash.startswith('$2'):
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
-
-    # Legacy SHA256 support (for migration period)
-    return hashlib.sha256(password.encode()).hexdigest() == password_hash
-
-def hash_password(password):
-    """Hash a password using bcrypt (secure password hashing)"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
+# HELPER FUNCTIONS
 def format_price(cents):
     """Convert cents to dollar string"""
     return f"${cents / 100:.2f}"
@@ -98,19 +127,14 @@ def get_service_name(service_code):
     }
     return service_map.get(service_code, service_code)
 
-def process_booking(booking_row):
-    """Convert SQLite Row to dict and parse itemsJson"""
-    booking = dict(booking_row)
-    if booking.get('itemsJson'):
-        try:
-            booking['itemsJson'] = json.loads(booking['itemsJson'])
-        except (json.JSONDecodeError, TypeError):
-            booking['itemsJson'] = None
-    return booking
-
-def process_bookings(booking_rows):
-    """Process multiple bookings"""
-    return [process_booking(b) for b in booking_rows]
+def audit_event(action, target_type, target_id, location=None, **detail):
+    """
+    Queue an audit event attributed to the logged-in user (written in the background)
+    Booking events go to the booking's location; accounts are at the primary.
+    """
+    audit.log_for(location).record(action, target_type, target_id,
+                                   actor_id=current_user.id, actor=current_user.full_name or current_user.username,
+                                   **detail)
 
 # AUTHORIZATION DECORATORS
 def role_required(*roles):
@@ -126,6 +150,14 @@ def role_required(*roles):
         return decorated_function
     return decorator
 
+@app.errorhandler(HashPoolBusy)
+def handle_hash_pool_busy(e):
+    """Password hashing is saturated: fail fast and let the user retry"""
+    flash('The server is busy right now. Please try again in a moment.', 'error')
+    response = redirect(request.url)
+    response.headers['Retry-After'] = '2'
+    return response
+
 # AUTHENTICATION ROUTES
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -151,7 +183,6 @@ def login():
                 (datetime.now().isoformat(), user_data['id'])
             )
             conn.commit()
-            conn.close()
 
             # Create user object and log in
             user = User(
@@ -167,7 +198,6 @@ def login():
             next_page = request.args.get('next')
             return redirect(next_page if next_page else url_for('dashboard'))
         else:
-            conn.close()
             flash('Invalid username or password', 'error')
 
     return render_template('login.html')
@@ -184,153 +214,481 @@ def logout():
 
 @app.route('/')
 @login_required
+@etags.conditional()
 def dashboard():
     """Main dashboard showing booking statistics"""
-    conn = get_db_connection()
+    locations = shards.request_locations()
 
-    # Get total bookings
-    total_bookings = conn.execute('SELECT COUNT(*) as count FROM bookings').fetchone()['count']
-
-    # Get revenue (sum of all totals)
-    revenue = conn.execute('SELECT SUM(totalPrice) as revenue FROM bookings').fetchone()['revenue'] or 0
-
-    # Get bookings by status
-    pending = conn.execute('SELECT COUNT(*) as count FROM bookings WHERE status = ?', ('pending',)).fetchone()['count']
-    confirmed = conn.execute('SELECT COUNT(*) as count FROM bookings WHERE status = ?', ('confirmed',)).fetchone()['count']
-    in_progress = conn.execute('SELECT COUNT(*) as count FROM bookings WHERE status = ?', ('in_progress',)).fetchone()['count']
-    completed = conn.execute('SELECT COUNT(*) as count FROM bookings WHERE status = ?', ('completed',)).fetchone()['count']
+    # Totals and status counts come from each location's trigger-maintained summary table
+    booking_stats = stats.sum_stats(
+        shards.fan_out(lambda conn, location: stats.read_stats(conn), locations).values()
+    )
 
-    # Get recent bookings
-    recent_bookings = conn.execute(
-        'SELECT * FROM bookings ORDER BY createdAt DESC LIMIT 10'
-    ).fetchall()
+    # Recent bookings are only read if the rendered table isn't cached
+    if len(locations) == 1:
+        conn = get_db_connection(location=locations[0])
+        recent_bookings = Deferred(lambda: [
+            BookingView(row, locations[0]) for row in conn.execute(
+                f'SELECT {DASHBOARD_COLUMNS} FROM bookings ORDER BY createdAt DESC LIMIT 10'
+            )
+        ])
+    else:
+        recent_bookings = Deferred(lambda: shards.newest(locations, DASHBOARD_COLUMNS, page_size=10))
+
+    dashboard_stats = {
+        'total_bookings': booking_stats['total_bookings'],
+        'revenue': format_price(booking_stats['revenue']),
+        'pending': booking_stats['by_status']['pending'],
+        'confirmed': booking_stats['by_status']['confirmed'],
+        'in_progress': booking_stats['by_status']['in_progress'],
+        'completed': booking_stats['by_status']['completed']
+    }
 
-    conn.close()
+    return render_template(
+        'dashboard.html',
+        stats=dashboard_stats,
+        bookings=recent_bookings,
+        location_filter=locations[0] if len(locations) == 1 else None
+    )
 
-    stats = {
-        'total_bookings': total_bookings,
-        'revenue': format_price(revenue),
-        'pending': pending,
-        'confirmed': confirmed,
-        'in_progress': in_progress,
-        'completed': completed
-    }
+def invalidate_booking_caches():
+    """Drop cached workload and rendered tables after this worker writes bookings or users"""
+    workload_cache.invalidate()
+    fragment_cache.invalidate()
 
-    # Process bookings to parse itemsJson
-    processed_bookings = process_bookings(recent_bookings)
+def read_workloads():
+    """Each driver's workload summed over the locations in ?location= (all by default)"""
+    return workload.sum_workloads(shards.fan_out(
+        lambda conn, location: workload_cache.get(conn, location=location), shards.request_locations()
+    ).values())
 
-    return render_template('dashboard.html', stats=stats, bookings=processed_bookings)
+def get_active_drivers(conn):
+    """Active drivers for the bulk-assign dropdown"""
+    return conn.execute('''
+        SELECT id, username, full_name
+        FROM admin_users
+        WHERE role = 'driver' AND is_active = 1
+        ORDER BY full_name
+    ''').fetchall()
 
 @app.route('/bookings')
 @login_required
+@etags.conditional()
 def bookings():
-    """View all bookings"""
+    """View bookings, newest first, one keyset page at a time"""
     status_filter = request.args.get('status', 'all')
+    page_size = parse_page_size(request.args.get('per_page'))
+    locations = shards.request_locations()
+    where, params = (None, ()) if status_filter == 'all' else ('status = ?', (status_filter,))
+
+    # Not fragment-cached: the table is streamed row by row, and a call block would
+    # render it whole first
+    drivers = get_active_drivers(get_db_connection())
+    if len(locations) == 1:
+        # One location: rows are read and processed as the template streams them out
+        location = locations[0]
+        cursor = decode_cursor(request.args.get('cursor'))
+        sql, params = keyset_query(LIST_COLUMNS, where, params, cursor=cursor, page_size=page_size)
+        conn = get_db_connection(location=location)
+        page = KeysetPage(conn.execute(sql, params), page_size, process=lambda row: BookingView(row, location))
+    else:
+        cursor = shards.decode_cursor(request.args.get('cursor'))
+        page = shards.newest(locations, LIST_COLUMNS, where, params, cursor, page_size)
+
+    return stream_template(
+        'bookings.html',
+        bookings=page,
+        drivers=drivers,
+        status_filter=status_filter,
+        location_filter=locations[0] if len(locations) == 1 else None,
+        per_page=page_size,
+        is_first_page=cursor is None
+    )
 
-    conn = get_db_connection()
+@app.route('/bookings/search')
+@login_required
+def search_bookings():
+    """Find bookings by customer name, phone, email, address or notes"""
+    query = request.args.get('q', '').strip()
+    limit = min(
+        parse_page_size(request.args.get('limit'), search.DEFAULT_SEARCH_LIMIT),
+        search.MAX_SEARCH_LIMIT
+    )
 
-    if status_filter == 'all':
-        all_bookings = conn.execute('SELECT * FROM bookings ORDER BY createdAt DESC').fetchall()
-    else:
-        all_bookings = conn.execute(
-            'SELECT * FROM bookings WHERE status = ? ORDER BY createdAt DESC',
-            (status_filter,)
-        ).fetchall()
+    locations = shards.request_locations()
+    results = shards.search_bookings(locations, query, LIST_COLUMNS, limit)
+
+    return render_template(
+        'bookings.html',
+        bookings=results,
+        drivers=get_active_drivers(get_db_connection()),
+        search_query=query,
+        status_filter='all',
+        location_filter=locations[0] if len(locations) == 1 else None,
+        per_page=limit,
+        is_first_page=True
+    )
 
-    conn.close()
+@app.route('/bookings/export')
+@login_required
+def export_bookings():
+    """Download bookings as CSV or NDJSON, streamed in batches"""
+    status_filter = request.args.get('status', 'all')
+    export_format = request.args.get('format', 'csv')
+    expand_items = request.args.get('items') == 'expand'
+
+    if export_format not in export.EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(export.EXPORT_FORMATS)}'}), 400
+    try:
+        start, end_exclusive = export.parse_date_range(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Each location's bookings are read oldest first and merged; with several locations
+    # configured, every row names its location
+    cursors = {}
+    for location in shards.request_locations():
+        conn = get_db_connection(location=location)
+        include_archived = request.args.get('archived') == 'include' and archive.has_archive(conn)
+        sql, params = export.export_query(status_filter, start, end_exclusive, include_archived)
+        cursors[location] = conn.execute(sql, params)
+    located = len(db.LOCATIONS) > 1
+    if located:
+        batches = export.merge_batches(cursors)
+    else:
+        batches = export.iter_batches(cursors[db.PRIMARY_LOCATION])
 
-    # Process bookings to parse itemsJson
-    processed_bookings = process_bookings(all_bookings)
+    if export_format == 'csv':
+        chunks, mimetype = export.csv_chunks(batches, expand_items, located), 'text/csv'
+    else:
+        chunks, mimetype = export.ndjson_chunks(batches, expand_items, located), 'application/x-ndjson'
+
+    headers = {
+        'Content-Disposition': (
+            f'attachment; filename="bookings-{status_filter}-'
+            f'{datetime.now().strftime("%Y%m%d-%H%M%S")}.{export_format}"'
+        ),
+        'Cache-Control': 'no-store',
+        'Vary': 'Accept-Encoding',
+        'X-Accel-Buffering': 'no',
+    }
+    if request.accept_encodings['gzip']:
+        chunks = export.gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
 
-    return render_template('bookings.html', bookings=processed_bookings, status_filter=status_filter)
+    # The request context (and its pooled connection) stays open until the last batch is sent
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
 
 @app.route('/bookings/<int:booking_id>')
 @login_required
+@etags.conditional(marker=etags.booking_row_marker)
 def booking_detail(booking_id):
     """View single booking details"""
-    conn = get_db_connection()
+    location = shards.request_location()
+    conn = get_db_connection(location=location)
 
-    # Fetch booking with driver name if assigned
-    booking = conn.execute('''
-        SELECT b.*, u.full_name as driver_name
+    # Fetch booking with driver name if assigned (other locations see admin_users
+    # through the attached primary)
+    booking = conn.execute(f'''
+        SELECT {DETAIL_COLUMNS}, u.full_name as driver_name
         FROM bookings b
         LEFT JOIN admin_users u ON b.driver_id = u.id
         WHERE b.id = ?
     ''', (booking_id,)).fetchone()
 
     # Fetch all active drivers for assignment dropdown
-    drivers = conn.execute('''
-        SELECT id, username, full_name
-        FROM admin_users
-        WHERE role = 'driver' AND is_active = 1
-        ORDER BY full_name
-    ''').fetchall()
+    drivers = get_active_drivers(get_db_connection())
 
-    conn.close()
+    # Not in the live table: it may have been archived
+    archived_at = None
+    if booking is None:
+        booking = archive.read_archived_booking(conn, booking_id)
+        archived_at = booking['archivedAt'] if booking is not None else None
 
     if booking is None:
         flash('Booking not found', 'error')
         return redirect(url_for('bookings'))
 
-    # Process booking to parse itemsJson
-    processed_booking = process_booking(booking)
+    history = audit.target_events(conn, 'booking', booking_id, log=audit.log_for(location))
 
-    return render_template('booking_detail.html', booking=processed_booking, drivers=drivers)
+    return render_template('booking_detail.html', booking=BookingView(booking, location), drivers=drivers,
+                           archived_at=archived_at, history=history)
 
 @app.route('/bookings/<int:booking_id>/status', methods=['POST'])
 @login_required
 def update_status(booking_id):
     """Update booking status"""
+    location = shards.request_location()
+    detail_url = url_for('booking_detail', booking_id=booking_id, location=shards.location_param(location))
     new_status = request.form.get('status')
 
-    if new_status not in ['pending', 'confirmed', 'in_progress', 'completed', 'cancelled']:
+    if new_status not in stats.BOOKING_STATUSES:
         flash('Invalid status', 'error')
-        return redirect(url_for('booking_detail', booking_id=booking_id))
+        return redirect(detail_url)
 
-    conn = get_db_connection()
-    conn.execute(
+    conn = get_db_connection(location=location)
+    cursor = conn.execute(
         'UPDATE bookings SET status = ?, updatedAt = ? WHERE id = ?',
         (new_status, datetime.now().isoformat(), booking_id)
     )
     conn.commit()
-    conn.close()
+    invalidate_booking_caches()
+    if cursor.rowcount:
+        audit_event('status', 'booking', booking_id, location=location, status=new_status)
 
     flash(f'Booking status updated to {new_status}', 'success')
-    return redirect(url_for('booking_detail', booking_id=booking_id))
+    return redirect(detail_url)
 
 @app.route('/bookings/<int:booking_id>/assign-driver', methods=['POST'])
 @login_required
 def assign_driver(booking_id):
     """Assign driver to booking"""
+    location = shards.request_location()
+    detail_url = url_for('booking_detail', booking_id=booking_id, location=shards.location_param(location))
     driver_id = request.form.get('driver_id')
 
     if not driver_id:
         flash('Please select a driver', 'error')
-        return redirect(url_for('booking_detail', booking_id=booking_id))
+        return redirect(detail_url)
 
-    conn = get_db_connection()
-
-    # Verify driver exists and is active
-    driver = conn.execute(
+    # Verify driver exists and is active (accounts live at the primary location)
+    driver = get_db_connection().execute(
         'SELECT * FROM admin_users WHERE id = ? AND role = ? AND is_active = 1',
         (driver_id, 'driver')
     ).fetchone()
 
     if not driver:
         flash('Invalid driver selected', 'error')
-        conn.close()
-        return redirect(url_for('booking_detail', booking_id=booking_id))
+        return redirect(detail_url)
 
     # Assign driver to booking
-    conn.execute(
+    conn = get_db_connection(location=location)
+    cursor = conn.execute(
         'UPDATE bookings SET driver_id = ?, updatedAt = ? WHERE id = ?',
         (driver_id, datetime.now().isoformat(), booking_id)
     )
     conn.commit()
-    conn.close()
+    invalidate_booking_caches()
+    if cursor.rowcount:
+        audit_event('driver', 'booking', booking_id, location=location,
+                    driver_id=driver['id'], driver=driver['full_name'])
 
     flash(f'Driver {driver["full_name"]} assigned successfully', 'success')
-    return redirect(url_for('booking_detail', booking_id=booking_id))
+    return redirect(detail_url)
+
+# BULK BOOKING ROUTES
+
+MAX_BULK_BOOKINGS = 500
+
+def parse_bulk_request():
+    """
+    Read booking_ids and the other fields from a JSON body or a form post
+    Returns (unique booking ids, fields, results pre-filled for unparseable ids);
+    raises ValueError for a JSON body that isn't an object with a booking_ids list
+    """
+    if request.is_json:
+        fields = request.get_json(silent=True)
+        if fields is None:
+            fields = {}
+        if not isinstance(fields, dict):
+            raise ValueError('Request body must be a JSON object')
+        raw_ids = fields.get('booking_ids') or []
+        if not isinstance(raw_ids, list):
+            raise ValueError('booking_ids must be a list')
+    else:
+        fields = request.form
+        raw_ids = request.form.getlist('booking_ids')
+
+    booking_ids, results = [], {}
+    for raw_id in raw_ids:
+        try:
+            booking_ids.append(int(raw_id))
+        except (TypeError, ValueError):
+            results[str(raw_id)] = 'invalid_id'
+
+    return list(dict.fromkeys(booking_ids)), fields, results
+
+def apply_bulk_update(conn, set_clause, values, booking_ids, results):
+    """
+    Apply the same change to many bookings in one transaction
+    Marks each id 'updated' or 'not_found' in results and returns the updated count
+    """
+    placeholders = ', '.join('?' * len(booking_ids))
+    updated_at = datetime.now().isoformat()
+
+    # Take the write lock up front so the existence check and updates are atomic
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        found = {
+            row['id'] for row in conn.execute(
+                f'SELECT id FROM bookings WHERE id IN ({placeholders})', booking_ids
+            )
+        }
+        conn.executemany(
+            f'UPDATE bookings SET {set_clause}, updatedAt = ? WHERE id = ?',
+            [(*values, updated_at, booking_id) for booking_id in booking_ids if booking_id in found]
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    invalidate_booking_caches()
+
+    for booking_id in booking_ids:
+        results[str(booking_id)] = 'updated' if booking_id in found else 'not_found'
+    return len(found)
+
+def bulk_response(message, results=None, updated=0, error=False):
+    """JSON for API callers, flash + redirect back to the listing for the UI"""
+    if request.is_json:
+        if error:
+            return jsonify({'error': message}), 400
+        return jsonify({'updated': updated, 'results': results})
+
+    flash(message, 'error' if error else 'success')
+    return redirect(url_for('bookings', status=request.form.get('status_filter', 'all'),
+                            location=request.args.get('location')))
+
+@app.route('/bookings/bulk/status', methods=['POST'])
+@login_required
+def bulk_update_status():
+    """Update the status of many bookings at once (all at one location)"""
+    location = shards.request_location()
+    try:
+        booking_ids, fields, results = parse_bulk_request()
+    except ValueError as e:
+        return bulk_response(str(e), error=True)
+    new_status = fields.get('status')
+
+    if new_status not in stats.BOOKING_STATUSES:
+        return bulk_response('Invalid status', error=True)
+    if not booking_ids:
+        return bulk_response('Please select at least one booking', error=True)
+    if len(booking_ids) > MAX_BULK_BOOKINGS:
+        return bulk_response(f'Select at most {MAX_BULK_BOOKINGS} bookings at a time', error=True)
+
+    conn = get_db_connection(location=location)
+    updated = apply_bulk_update(conn, 'status = ?', (new_status,), booking_ids, results)
+    for booking_id in booking_ids:
+        if results[str(booking_id)] == 'updated':
+            audit_event('status', 'booking', booking_id, location=location, status=new_status, bulk=True)
+
+    return bulk_response(
+        f'{updated} booking{"s" if updated != 1 else ""} updated to {new_status}',
+        results, updated
+    )
+
+@app.route('/bookings/bulk/assign-driver', methods=['POST'])
+@login_required
+def bulk_assign_driver():
+    """Assign one driver to many bookings at once (all at one location)"""
+    location = shards.request_location()
+    try:
+        booking_ids, fields, results = parse_bulk_request()
+    except ValueError as e:
+        return bulk_response(str(e), error=True)
+    driver_id = fields.get('driver_id')
+
+    if not driver_id:
+        return bulk_response('Please select a driver', error=True)
+    if not booking_ids:
+        return bulk_response('Please select at least one booking', error=True)
+    if len(booking_ids) > MAX_BULK_BOOKINGS:
+        return bulk_response(f'Select at most {MAX_BULK_BOOKINGS} bookings at a time', error=True)
+
+    # Verify driver exists and is active (once for the whole batch)
+    driver = get_db_connection().execute(
+        'SELECT id, full_name FROM admin_users WHERE id = ? AND role = ? AND is_active = 1',
+        (driver_id, 'driver')
+    ).fetchone()
+
+    if not driver:
+        return bulk_response('Invalid driver selected', error=True)
+
+    conn = get_db_connection(location=location)
+    updated = apply_bulk_update(conn, 'driver_id = ?', (driver['id'],), booking_ids, results)
+    for booking_id in booking_ids:
+        if results[str(booking_id)] == 'updated':
+            audit_event('driver', 'booking', booking_id, location=location,
+                        driver_id=driver['id'], driver=driver['full_name'], bulk=True)
+
+    return bulk_response(
+        f'Driver {driver["full_name"]} assigned to {updated} booking{"s" if updated != 1 else ""}',
+        results, updated
+    )
+
+# DISPATCH ROUTES
+
+def dispatch_settings(fields):
+    """Pickup date and planner limits from query args or a JSON body"""
+    pickup_date = dispatch.parse_pickup_date(fields.get('date'))
+    try:
+        capacity = int(fields.get('capacity') or dispatch.DISPATCH_DRIVER_CAPACITY)
+        max_stops = int(fields.get('max_stops') or dispatch.DISPATCH_MAX_STOPS_PER_WINDOW)
+    except (TypeError, ValueError):
+        raise ValueError('capacity and max_stops must be whole numbers') from None
+    if capacity < 1 or max_stops < 1:
+        raise ValueError('capacity and max_stops must be at least 1')
+    return pickup_date, capacity, max_stops
+
+@app.route('/dispatch/preview')
+@login_required
+def dispatch_preview():
+    """Proposed driver assignments for a pickup date's unassigned bookings at one location"""
+    location = shards.request_location()
+    try:
+        pickup_date, capacity, max_stops = dispatch_settings(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection(location=location)
+    bookings, drivers = dispatch.load_dispatch_inputs(conn, pickup_date, get_db_connection())
+    plan = dispatch.plan_dispatch(bookings, drivers, capacity, max_stops)
+    plan['date'] = pickup_date
+    plan['location'] = location
+    return jsonify(plan)
+
+@app.route('/dispatch/commit', methods=['POST'])
+@login_required
+def dispatch_commit():
+    """
+    Save driver assignments at one location (?location=, the primary by default)
+    Takes the assignments from a preview, or plans and saves in one step when only a date is given
+    """
+    location = shards.request_location()
+    fields = request.get_json(silent=True) or {}
+    try:
+        pickup_date, capacity, max_stops = dispatch_settings(fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection(location=location)
+    accounts = get_db_connection(readonly=True)
+    summary = None
+    if fields.get('assignments'):
+        try:
+            assignments = {
+                int(booking_id): int(driver_id)
+                for booking_id, driver_id in fields['assignments'].items()
+            }
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'error': 'assignments must map booking ids to driver ids'}), 400
+    else:
+        bookings, drivers = dispatch.load_dispatch_inputs(conn, pickup_date, accounts)
+        plan = dispatch.plan_dispatch(bookings, drivers, capacity, max_stops)
+        assignments, summary = plan['assignments'], plan['summary']
+
+    results = dispatch.apply_dispatch(conn, assignments, pickup_date, accounts)
+    invalidate_booking_caches()
+    for booking_id, result in results.items():
+        if result == 'assigned':
+            audit_event('driver', 'booking', booking_id, location=location,
+                        driver_id=assignments[int(booking_id)], dispatch=True)
+    assigned = sum(1 for result in results.values() if result == 'assigned')
+
+    return jsonify({
+        'date': pickup_date, 'location': location, 'assigned': assigned, 'results': results, 'summary': summary
+    })
 
 # ADMIN MANAGEMENT ROUTES (Super Admin Only)
 
@@ -340,7 +698,6 @@ def admin_users():
     """View all admin users"""
     conn = get_db_connection()
     users = conn.execute('SELECT * FROM admin_users ORDER BY created_at DESC').fetchall()
-    conn.close()
 
     return render_template('admin_users.html', users=users)
 
@@ -368,7 +725,6 @@ def create_admin():
                 VALUES (?, ?, ?, ?, ?)
             ''', (username, password_hash, email, full_name, role))
             conn.commit()
-            conn.close()
 
             flash(f'Admin user {username} created successfully', 'success')
             return redirect(url_for('admin_users'))
@@ -393,9 +749,11 @@ def toggle_admin_status(user_id):
         new_status = 0 if user['is_active'] else 1
         conn.execute('UPDATE admin_users SET is_active = ? WHERE id = ?', (new_status, user_id))
         conn.commit()
+        user_cache.invalidate(user_id)
+        invalidate_booking_caches()
+        audit_event('activated' if new_status else 'deactivated', 'admin_user', user_id)
         flash(f'User {user["username"]} {"activated" if new_status else "deactivated"}', 'success')
 
-    conn.close()
     return redirect(url_for('admin_users'))
 
 # ==================================
@@ -411,9 +769,39 @@ def drivers():
         'SELECT * FROM admin_users WHERE role = ? ORDER BY created_at DESC',
         ('driver',)
     ).fetchall()
-    conn.close()
+    workloads = read_workloads()
 
-    return render_template('drivers.html', drivers=drivers)
+    return render_template(
+        'drivers.html', drivers=drivers, workloads=workloads, no_workload=workload.empty_workload()
+    )
+
+@app.route('/api/drivers/workload')
+@login_required
+def api_driver_workload():
+    """API endpoint for each driver's assigned, in-progress and completed bookings, today and this week"""
+    conn = get_db_connection()
+    drivers = conn.execute(
+        'SELECT id, full_name, is_active FROM admin_users WHERE role = ? ORDER BY full_name',
+        ('driver',)
+    ).fetchall()
+    workloads = read_workloads()
+
+    today = datetime.now().date()
+    week_start, week_end = workload.week_bounds(today)
+    return jsonify({
+        'today': today.isoformat(),
+        'week_start': week_start.isoformat(),
+        'week_end': week_end.isoformat(),
+        'drivers': [
+            {
+                'driver_id': driver['id'],
+                'driver_name': driver['full_name'],
+                'is_active': bool(driver['is_active']),
+                **workloads.get(driver['id'], workload.empty_workload()),
+            }
+            for driver in drivers
+        ],
+    })
 
 @app.route('/drivers/create', methods=['GET', 'POST'])
 @login_required
@@ -443,7 +831,6 @@ def create_driver():
                 VALUES (?, ?, ?, ?, 'driver', 1)
             ''', (username, password_hash, email, full_name))
             conn.commit()
-            conn.close()
 
             flash(f'Driver {username} created successfully', 'success')
             return redirect(url_for('drivers'))
@@ -466,7 +853,6 @@ def edit_driver(driver_id):
 
     if not driver:
         flash('Driver not found', 'error')
-        conn.close()
         return redirect(url_for('drivers'))
 
     if request.method == 'POST':
@@ -496,15 +882,14 @@ def edit_driver(driver_id):
                 )
 
             conn.commit()
+            user_cache.invalidate(driver_id)
             flash('Driver updated successfully', 'success')
-            conn.close()
             return redirect(url_for('drivers'))
 
         except sqlite3.IntegrityError:
             flash('Email already exists', 'error')
             return render_template('edit_driver.html', driver=driver)
 
-    conn.close()
     return render_template('edit_driver.html', driver=driver)
 
 @app.route('/drivers/<int:driver_id>/toggle', methods=['POST'])
@@ -524,14 +909,43 @@ def toggle_driver_status(driver_id):
             (new_status, driver_id)
         )
         conn.commit()
+        user_cache.invalidate(driver_id)
+        invalidate_booking_caches()
+        audit_event('activated' if new_status else 'deactivated', 'admin_user', driver_id)
         flash(
             f'Driver {driver["username"]} {"activated" if new_status else "deactivated"}',
             'success'
         )
 
-    conn.close()
     return redirect(url_for('drivers'))
 
+@app.route('/drivers/<int:driver_id>/manifest')
+@login_required
+def driver_manifest(driver_id):
+    """A driver's ordered stops at one location (?location=, the primary by default) for a pickup date (today by default)"""
+    location = shards.request_location()
+    try:
+        pickup_date = dispatch.parse_pickup_date(request.args.get('date') or datetime.now().date().isoformat())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    driver = get_db_connection().execute(
+        'SELECT id, full_name FROM admin_users WHERE id = ? AND role = ?',
+        (driver_id, 'driver')
+    ).fetchone()
+    if driver is None:
+        return jsonify({'error': 'Driver not found'}), 404
+
+    manifest, cached = manifests.get_manifest(
+        get_db_connection(location=location),
+        lambda: get_db_connection(readonly=False, location=location),
+        driver_id, pickup_date
+    )
+    manifest['driver_name'] = driver['full_name']
+    manifest['location'] = location
+    manifest['cached'] = cached
+    return jsonify(manifest)
+
 # PROFILE ROUTE
 
 @app.route('/profile', methods=['GET', 'POST'])
@@ -564,39 +978,166 @@ def profile():
                 (new_hash, current_user.id)
             )
             conn.commit()
+            user_cache.invalidate(current_user.id)
             flash('Password updated successfully', 'success')
         else:
             flash('Current password is incorrect', 'error')
 
-        conn.close()
-
     return render_template('profile.html')
 
 # API ROUTES
 
+# Existing counters, exported as gauges on /metrics
+metrics.registry.add_collector('db_pool', db.pool_stats, label='pool')
+metrics.registry.add_collector('user_cache', user_cache.stats)
+metrics.registry.add_collector('hash_pool', hash_pool.stats)
+metrics.registry.add_collector('live', live.change_feed.stats)
+metrics.registry.add_collector('workload_cache', workload_cache.stats)
+metrics.registry.add_collector('fragment_cache', fragment_cache.stats)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint (login session or METRICS_TOKEN bearer token)"""
+    if not (current_user.is_authenticated or metrics.token_authorized(request.headers.get('Authorization'))):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/db/slow-queries')
+@login_required
+def api_slow_queries():
+    """API endpoint for the most recent statements slower than SLOW_QUERY_MS"""
+    return jsonify({
+        'threshold_ms': metrics.SLOW_QUERY_MS,
+        'queries': metrics.registry.slow_queries()
+    })
+
 @app.route('/api/stats')
 @login_required
+@etags.conditional()
 def api_stats():
-    """API endpoint for statistics"""
-    conn = get_db_connection()
+    """API endpoint for statistics, summed over the locations picked by ?location="""
+    locations = shards.request_locations()
+    results = shards.fan_out(lambda conn, location: stats.read_stats(conn), locations)
+    if len(locations) == 1:
+        return jsonify(results[locations[0]])
+    combined = stats.sum_stats(results.values())
+    combined['by_location'] = results
+    return jsonify(combined)
+
+@app.route('/api/stats/timeseries')
+@login_required
+def api_stats_timeseries():
+    """API endpoint for revenue, bag and booking counts over time, summed over locations"""
+    # Read here: the fan-out threads have no request context
+    options = {
+        'granularity': request.args.get('granularity', 'day'),
+        'start': request.args.get('start'),
+        'end': request.args.get('end'),
+        'basis': request.args.get('basis', 'created'),
+        'service': request.args.get('service'),
+        'status': request.args.get('status'),
+    }
+    try:
+        results = shards.fan_out(
+            lambda conn, location: timeseries.read_timeseries(conn, **options), shards.request_locations()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(timeseries.sum_timeseries(results.values()))
 
-    total_bookings = conn.execute('SELECT COUNT(*) as count FROM bookings').fetchone()['count']
-    revenue = conn.execute('SELECT SUM(totalPrice) as revenue FROM bookings').fetchone()['revenue'] or 0
-    total_bags = conn.execute('SELECT SUM(numberOfBags) as bags FROM bookings').fetchone()['bags'] or 0
+@app.route('/api/capacity')
+@login_required
+def api_capacity():
+    """API endpoint for booked vs projected pickups per day and window, with drivers needed, summed over locations"""
+    locations = shards.request_locations()
+    try:
+        start, days, weeks = capacity.parse_forecast_args(
+            request.args.get('start'), request.args.get('days'), request.args.get('weeks')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    by_status = {}
-    for status in ['pending', 'confirmed', 'in_progress', 'completed', 'cancelled']:
-        count = conn.execute('SELECT COUNT(*) as count FROM bookings WHERE status = ?', (status,)).fetchone()['count']
-        by_status[status] = count
+    results = shards.fan_out(
+        lambda conn, location: capacity.capacity_cache.location_forecast(conn, start, days, weeks, location),
+        locations
+    )
+    return jsonify(capacity.forecast_response(start, days, weeks, list(results.values())))
 
-    conn.close()
+@app.route('/api/bookings/search')
+@login_required
+def api_search_bookings():
+    """API endpoint for ranked booking search"""
+    query = request.args.get('q', '').strip()
+    limit = min(
+        parse_page_size(request.args.get('limit'), search.DEFAULT_SEARCH_LIMIT),
+        search.MAX_SEARCH_LIMIT
+    )
 
-    return jsonify({
-        'total_bookings': total_bookings,
-        'revenue': revenue,
-        'total_bags': total_bags,
-        'by_status': by_status
-    })
+    results = [
+        dict(booking.to_dict(), location=booking.location)
+        for booking in shards.search_bookings(shards.request_locations(), query, LIST_COLUMNS, limit)
+    ]
+    return jsonify({'query': query, 'count': len(results), 'results': results})
+
+@app.route('/api/live')
+@login_required
+def live_updates():
+    """Server-Sent Events stream of booking changes and refreshed stats, for ?location= or all locations"""
+    locations = shards.request_locations()
+    # Each stream pins a worker thread; past the cap, send the browser to retry later
+    # (production serves this stream from async_api.py instead)
+    try:
+        subscription = live.change_feed.subscribe(locations, limit=live.LIVE_MAX_STREAMS)
+    except live.FeedFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+
+    # Fresh totals first, so a reconnecting dashboard catches up on anything it missed
+    totals = stats.sum_stats(
+        shards.fan_out(lambda conn, location: stats.read_stats(conn), locations).values()
+    )
+    initial = [live.format_event('stats', totals)]
+
+    return Response(
+        live.change_feed.stream(subscription, initial),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/live/stats')
+@login_required
+def api_live_stats():
+    """API endpoint for change-feed poller and subscriber counters"""
+    return jsonify(live.change_feed.stats())
+
+@app.route('/api/db/pool')
+@login_required
+def api_db_pool():
+    """API endpoint for connection pool and lock-wait counters"""
+    return jsonify(db.pool_stats())
+
+@app.route('/api/hash/pool')
+@login_required
+def api_hash_pool():
+    """API endpoint for password hashing latency and queue counters"""
+    return jsonify(hash_pool.stats())
+
+@app.route('/api/audit/stats')
+@login_required
+def api_audit_stats():
+    """API endpoint for audit writer queue and batch counters"""
+    return jsonify(audit_log.stats())
+
+@app.route('/api/cache/users')
+@login_required
+def api_user_cache():
+    """API endpoint for user_loader cache hit-rate counters"""
+    return jsonify(user_cache.stats())
+
+@app.route('/api/cache/fragments')
+@login_required
+def api_fragment_cache():
+    """API endpoint for rendered-fragment cache hit-rate and size counters"""
+    return jsonify(fragment_cache.stats())
 
 if __name__ == '__main__':
     app.run(debug=True, port=5002)
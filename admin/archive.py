@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Hot/cold archival of finished bookings
+Completed and cancelled bookings untouched for ARCHIVE_AFTER_DAYS move from bookings
+to bookings_archive in chunked transactions, so the listings, indexes and triggers work
+on the live set. The archive lives in the same database file, which keeps each move
+atomic with the trigger-maintained tables:
+
+- booking_stats and the time-series rollups keep counting archived bookings (lifetime
+  totals); their delete triggers skip rows while archive_in_progress holds its row,
+  which each move fills and clears in its own transaction
+- bookings_fts drops archived rows (search covers the live set)
+- booking_changes gets one 'archived' row per chunk, so caches and ETags move on
+
+Booking detail and exports can still reach archived rows. Without --db, every location
+in ARIELGO_LOCATIONS is archived in turn. Usage:
+    python archive.py run [--db PATH] [--days 365] [--chunk-size 1000] [--dry-run]
+    python archive.py status [--db PATH]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+
+from booking_view import DETAIL_COLUMNS
+from db import LOCATIONS
+
+# Finished bookings older than this (by last update) are archived
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+# Bookings moved per transaction; each holds the write lock for its duration
+ARCHIVE_CHUNK_SIZE = int(os.getenv('ARCHIVE_CHUNK_SIZE', '1000'))
+
+ARCHIVE_TABLE = 'bookings_archive'
+ARCHIVABLE_STATUSES = ('completed', 'cancelled')
+
+# Delete triggers on bookings that must not see an archive move as a deletion; each
+# carries ARCHIVE_GUARD, so a move suspends them without touching the schema
+SUSPENDED_TRIGGERS = (
+    'trg_booking_stats_delete',
+    'trg_booking_rollups_delete',
+    'trg_booking_changes_delete',
+)
+# Holds one row only inside an archive move's transaction; part of every schema whose
+# triggers use ARCHIVE_GUARD
+ARCHIVE_GUARD_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS archive_in_progress (
+        id INTEGER PRIMARY KEY CHECK (id = 1)
+    );
+'''
+ARCHIVE_GUARD = 'WHEN NOT EXISTS (SELECT 1 FROM archive_in_progress)'
+
+# Finished bookings last touched before a cutoff, oldest id first (LIMIT -1: all of them)
+ELIGIBLE_QUERY = f'''
+    SELECT id FROM bookings
+    WHERE status IN ({', '.join('?' * len(ARCHIVABLE_STATUSES))}) AND createdAt < ?
+      AND COALESCE(updatedAt, createdAt) < ?
+    ORDER BY id
+    LIMIT ?
+'''
+
+ARCHIVED_DETAIL_QUERY = f'''
+    SELECT {DETAIL_COLUMNS}, b.archivedAt, u.full_name as driver_name
+    FROM {ARCHIVE_TABLE} b
+    LEFT JOIN admin_users u ON b.driver_id = u.id
+    WHERE b.id = ?
+'''
+
+ARCHIVE_INDEXES = [
+    f'CREATE INDEX IF NOT EXISTS idx_bookings_archive_created ON {ARCHIVE_TABLE}(createdAt, id)',
+    f'CREATE INDEX IF NOT EXISTS idx_bookings_archive_status_created ON {ARCHIVE_TABLE}(status, createdAt, id)',
+    f'CREATE INDEX IF NOT EXISTS idx_bookings_archive_pickup_slot '
+    f'ON {ARCHIVE_TABLE}(pickupDate, pickupTime, service, status, numberOfBags)',
+]
+
+
+def _columns(conn, table):
+    """[(name, declared type)] of table, in order"""
+    return [(row[1], row[2]) for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def _table_exists(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def _sync_archive_table(conn):
+    """
+    Create bookings_archive with bookings' columns plus archivedAt, adding any column
+    the Node server has since added to bookings. Returns the shared column names.
+    """
+    columns = _columns(conn, 'bookings')
+    if not columns:
+        raise sqlite3.OperationalError('no such table: bookings')
+
+    if not _table_exists(conn, ARCHIVE_TABLE):
+        definitions = [
+            'id INTEGER PRIMARY KEY' if name == 'id' else f'"{name}" {declared}'.rstrip()
+            for name, declared in columns
+        ]
+        definitions.append('archivedAt TEXT NOT NULL')
+        conn.execute(f'CREATE TABLE {ARCHIVE_TABLE} ({", ".join(definitions)})')
+    else:
+        archived = {name for name, _ in _columns(conn, ARCHIVE_TABLE)}
+        for name, declared in columns:
+            if name not in archived:
+                conn.execute(f'ALTER TABLE {ARCHIVE_TABLE} ADD COLUMN "{name}" {declared}'.rstrip())
+
+    for statement in ARCHIVE_INDEXES:
+        conn.execute(statement)
+    conn.execute(ARCHIVE_GUARD_SCHEMA)
+    return [name for name, _ in columns]
+
+
+def _unguarded_triggers(conn):
+    """SUSPENDED_TRIGGERS still installed from a schema without ARCHIVE_GUARD"""
+    return [
+        name for name, sql in conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+            f"AND name IN ({', '.join('?' * len(SUSPENDED_TRIGGERS))})", SUSPENDED_TRIGGERS
+        )
+        if 'archive_in_progress' not in sql
+    ]
+
+
+def install_archive(conn):
+    """Create bookings_archive and its indexes (or catch up with new bookings columns)"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        _sync_archive_table(conn)
+
+
+def has_archive(conn):
+    return _table_exists(conn, ARCHIVE_TABLE)
+
+
+def lifetime_bookings(conn, columns):
+    """
+    FROM-clause source over live and archived bookings, for rebuilds of lifetime totals
+    Falls back to bookings alone before the archive table exists.
+    """
+    if not has_archive(conn):
+        return 'bookings'
+    return f'(SELECT {columns} FROM bookings UNION ALL SELECT {columns} FROM {ARCHIVE_TABLE})'
+
+
+def cutoff(days=ARCHIVE_AFTER_DAYS, now=None):
+    """createdAt-style UTC timestamp; finished bookings last touched before it are archived"""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _eligible_ids(conn, before, limit=-1):
+    return [row[0] for row in conn.execute(ELIGIBLE_QUERY, (*ARCHIVABLE_STATUSES, before, before, limit))]
+
+
+def read_archived_booking(conn, booking_id):
+    """An archived booking with its driver's name and archivedAt, or None"""
+    if not has_archive(conn):
+        return None
+    return conn.execute(ARCHIVED_DETAIL_QUERY, (booking_id,)).fetchone()
+
+
+def _archive_chunk(conn, columns, before, chunk_size):
+    """Move up to chunk_size eligible bookings in one transaction; returns how many moved"""
+    column_list = ', '.join(f'"{name}"' for name in columns)
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        ids = _eligible_ids(conn, before, chunk_size)
+        if not ids:
+            return 0
+
+        # Seen only by this transaction: other connections' deletes still fire the
+        # triggers, and the schema (and every connection's statement cache) is untouched
+        conn.execute('INSERT INTO archive_in_progress (id) VALUES (1)')
+        placeholders = ', '.join('?' * len(ids))
+        conn.execute(f'''
+            INSERT INTO {ARCHIVE_TABLE} ({column_list}, archivedAt)
+            SELECT {column_list}, strftime('%Y-%m-%d %H:%M:%S', 'now') FROM bookings
+            WHERE id IN ({placeholders})
+        ''', ids)
+        conn.execute(f'DELETE FROM bookings WHERE id IN ({placeholders})', ids)
+        conn.execute('DELETE FROM archive_in_progress')
+        if _table_exists(conn, 'booking_changes'):
+            conn.execute(
+                "INSERT INTO booking_changes (booking_id, kind) VALUES (?, 'archived')", (ids[-1],)
+            )
+    return len(ids)
+
+
+def archive_bookings(conn, days=ARCHIVE_AFTER_DAYS, chunk_size=ARCHIVE_CHUNK_SIZE, progress=None):
+    """
+    Move every finished booking last touched more than days ago into the archive
+    Works in chunk_size transactions so the Node server's writes interleave; safe to
+    stop and re-run. Returns the number of bookings archived.
+    """
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        columns = _sync_archive_table(conn)
+        unguarded = _unguarded_triggers(conn)
+    if unguarded:
+        raise sqlite3.OperationalError(
+            f'{", ".join(unguarded)} predate archive_in_progress; restart the admin app or run '
+            f'database/create_admin_users.py to reinstall them before archiving'
+        )
+
+    before = cutoff(days)
+    total = 0
+    while True:
+        moved = _archive_chunk(conn, columns, before, chunk_size)
+        if not moved:
+            return total
+        total += moved
+        if progress:
+            progress(total)
+
+
+def archive_status(conn, days=ARCHIVE_AFTER_DAYS):
+    """Live, archived and currently eligible booking counts"""
+    archived, oldest, newest = 0, None, None
+    if has_archive(conn):
+        archived, oldest, newest = conn.execute(
+            f'SELECT COUNT(*), MIN(archivedAt), MAX(archivedAt) FROM {ARCHIVE_TABLE}'
+        ).fetchone()
+    return {
+        'live': conn.execute('SELECT COUNT(*) FROM bookings').fetchone()[0],
+        'archived': archived,
+        'eligible': conn.execute(
+            f'SELECT COUNT(*) FROM ({ELIGIBLE_QUERY})', (*ARCHIVABLE_STATUSES, cutoff(days), cutoff(days), -1)
+        ).fetchone()[0],
+        'after_days': days,
+        'first_archived_at': oldest,
+        'last_archived_at': newest,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive finished bookings out of the live table')
+    parser.add_argument('command', choices=['run', 'status'])
+    parser.add_argument('--db', help='Archive this database file only (default: every location)')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help='Archive finished bookings untouched for this many days (default: %(default)s)')
+    parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE,
+                        help='Bookings moved per transaction (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be archived')
+    args = parser.parse_args()
+
+    targets = {args.db: args.db} if args.db else LOCATIONS
+    failed = False
+    for name, path in targets.items():
+        # One location failing (locked, missing table) doesn't stop the others
+        prefix = f'{name}: ' if len(targets) > 1 else ''
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout = 5000')
+        try:
+            if args.command == 'status' or args.dry_run:
+                status = archive_status(conn, args.days)
+                print(f'ℹ️  {prefix}{status["live"]} live bookings, {status["archived"]} archived, '
+                      f'{status["eligible"]} finished more than {args.days} days ago')
+                continue
+            total = archive_bookings(
+                conn, args.days, args.chunk_size,
+                progress=lambda moved: print(f'   {prefix}{moved} archived')
+            )
+            print(f'✅ {prefix}Archived {total} bookings finished more than {args.days} days ago')
+        except sqlite3.Error as e:
+            print(f'❌ {prefix}{e}')
+            failed = True
+        finally:
+            conn.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Async read API for polling clients (ASGI, served by uvicorn)
+The same reads as the Flask JSON routes, under /async/api/, for wall displays and
+other clients that poll. Waiting connections are coroutines, not threads: a
+long-poll on /async/api/stats/poll costs no thread until bookings change, so one
+process holds thousands of them. SQLite work runs on a small thread pool over the
+shared read-only connection pool. Requests are authenticated with the Flask
+session cookie, so a browser logged in to the admin needs nothing else. Like the
+Flask routes, totals and listings cover every location unless ?location= picks one.
+
+Usage:
+    uvicorn async_api:app --port 5003
+    python async_api.py --port 5003
+"""
+import argparse
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import wraps
+
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import archive
+import db
+import live
+import shards
+import stats
+from app import app as flask_app, fetch_user
+from booking_view import DETAIL_COLUMNS, LIST_COLUMNS
+from pagination import parse_page_size
+from user_cache import user_cache
+
+# Threads running SQLite reads; more than the read pool's size only adds waiting
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', str(db.POOL_SIZE)))
+# Longest a /stats/poll request waits for a change before answering anyway
+ASYNC_POLL_TIMEOUT = float(os.getenv('ASYNC_POLL_TIMEOUT', '30'))
+
+_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_THREADS, thread_name_prefix='async-db')
+
+
+def _with_read_connection(query, args, location):
+    pool = db.pools_for(location)[1]
+    conn = pool.acquire()
+    try:
+        return query(conn, *args)
+    finally:
+        pool.release(conn)
+
+
+async def run_query(query, *args, location=None):
+    """Run query(conn, *args) on the DB thread pool with a pooled read-only connection to location"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _with_read_connection, query, args, location)
+
+
+async def run_locations(query, locations, *args):
+    """{location: query(conn, *args)} for each location, run side by side on the DB thread pool"""
+    results = await asyncio.gather(*(run_query(query, *args, location=location) for location in locations))
+    return dict(zip(locations, results))
+
+
+def request_locations(request):
+    """Locations picked by ?location= (all by default), or None for an unknown one"""
+    location = request.query_params.get('location')
+    if not location:
+        return list(db.LOCATIONS)
+    return [location] if location in db.LOCATIONS else None
+
+
+def latest_seq(conn):
+    return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM booking_changes').fetchone()[0]
+
+
+async def change_marker():
+    """Sum of every location's latest booking_changes seq; moves whenever any location changes"""
+    return sum((await run_locations(latest_seq, list(db.LOCATIONS))).values())
+
+
+async def read_stats(locations):
+    """Totals for locations, shaped like /api/stats (with by_location across several)"""
+    results = await run_locations(stats.read_stats, locations)
+    if len(locations) == 1:
+        return results[locations[0]]
+    combined = stats.sum_stats(results.values())
+    combined['by_location'] = results
+    return combined
+
+
+class ChangeNotifier:
+    """
+    Wakes long-poll waiters when booking_changes moves
+    One loop per process checks the latest seq every LIVE_POLL_INTERVAL, and only
+    while someone is waiting, so idle pollers cost one query per location per tick in
+    total. With several locations the seq is the sum of theirs.
+    """
+
+    def __init__(self, interval=live.LIVE_POLL_INTERVAL):
+        self.interval = interval
+        self.seq = 0
+        self.waiters = 0
+        self.wakeups = 0
+        self._changed = None
+        self._task = None
+
+    async def start(self):
+        self.seq = await change_marker()
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.waiters:
+                continue
+            try:
+                seq = await change_marker()
+            except sqlite3.Error:
+                continue
+            if seq != self.seq:
+                self.seq = seq
+                self.wakeups += 1
+                # Wake everyone waiting on this event; later waiters get a fresh one
+                changed, self._changed = self._changed, asyncio.Event()
+                changed.set()
+
+    async def wait(self, since, timeout):
+        """Wait until the seq moves past since; returns True if it did"""
+        if self.seq > since:
+            return True
+        self.waiters += 1
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiters -= 1
+
+    def stats(self):
+        return {
+            'seq': self.seq,
+            'waiters': self.waiters,
+            'wakeups': self.wakeups,
+            'poll_interval': self.interval,
+        }
+
+
+notifier = ChangeNotifier()
+
+_session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+_session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+
+async def current_user(request):
+    """The logged-in admin user from the Flask session cookie, or None"""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie or _session_serializer is None:
+        return None
+    try:
+        session = _session_serializer.loads(cookie, max_age=_session_max_age)
+    except BadSignature:
+        return None
+
+    user_id = session.get('_user_id')
+    if user_id is None:
+        return None
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await run_query(fetch_user, user_id)
+    return user
+
+
+def login_required(endpoint):
+    @wraps(endpoint)
+    async def wrapper(request):
+        if await current_user(request) is None:
+            return JSONResponse({'error': 'Login required'}, status_code=401)
+        return await endpoint(request)
+    return wrapper
+
+
+def unknown_location():
+    return JSONResponse({'error': 'Unknown location'}, status_code=404)
+
+
+@login_required
+async def api_stats(request):
+    """Booking totals, same as /api/stats"""
+    locations = request_locations(request)
+    if locations is None:
+        return unknown_location()
+    return JSONResponse(await read_stats(locations))
+
+
+@login_required
+async def api_stats_poll(request):
+    """
+    Long-poll for booking totals
+    Answers as soon as bookings change after ?since=<seq> (or straight away without
+    since), else after ?timeout= seconds (capped at ASYNC_POLL_TIMEOUT).
+    """
+    locations = request_locations(request)
+    if locations is None:
+        return unknown_location()
+    try:
+        since = int(request.query_params['since']) if 'since' in request.query_params else None
+        timeout = min(float(request.query_params.get('timeout', ASYNC_POLL_TIMEOUT)), ASYNC_POLL_TIMEOUT)
+    except ValueError:
+        return JSONResponse({'error': 'since and timeout must be numbers'}, status_code=400)
+
+    changed = True
+    if since is not None:
+        changed = await notifier.wait(since, max(0.0, timeout))
+    seq = notifier.seq
+
+    return JSONResponse({
+        'seq': seq,
+        'changed': changed,
+        'stats': await read_stats(locations) if changed else None,
+    })
+
+
+def _read_bookings(locations, status_filter, cursor, page_size):
+    where, params = (None, ()) if status_filter == 'all' else ('status = ?', (status_filter,))
+    pools = {location: db.pools_for(location)[1] for location in locations}
+    connections = {location: pool.acquire() for location, pool in pools.items()}
+    try:
+        page = shards.newest(locations, LIST_COLUMNS, where, params, cursor, page_size, connections)
+    finally:
+        for location, conn in connections.items():
+            pools[location].release(conn)
+    return {
+        'bookings': [dict(booking.to_dict(parse_items=False), location=booking.location) for booking in page],
+        'next_cursor': page.next_cursor,
+    }
+
+
+@login_required
+async def api_bookings(request):
+    """Newest-first keyset page of bookings, the JSON counterpart of /bookings"""
+    locations = request_locations(request)
+    if locations is None:
+        return unknown_location()
+    params = request.query_params
+    loop = asyncio.get_running_loop()
+    # Several locations are read side by side on the shard pool, as in the Flask app
+    return JSONResponse(await loop.run_in_executor(
+        _executor, _read_bookings, locations,
+        params.get('status', 'all'),
+        shards.decode_cursor(params.get('cursor')),
+        parse_page_size(params.get('per_page')),
+    ))
+
+
+def _read_booking(conn, booking_id):
+    booking = conn.execute(f'''
+        SELECT {DETAIL_COLUMNS}, u.full_name as driver_name
+        FROM bookings b
+        LEFT JOIN admin_users u ON b.driver_id = u.id
+        WHERE b.id = ?
+    ''', (booking_id,)).fetchone()
+    return booking if booking is not None else archive.read_archived_booking(conn, booking_id)
+
+
+@login_required
+async def api_booking_detail(request):
+    """
+    One booking (live or archived) with its driver's name, the JSON counterpart of /bookings/<id>
+    Like there, a booking outside the primary location is addressed with ?location=.
+    """
+    location = request.query_params.get('location') or db.PRIMARY_LOCATION
+    if location not in db.LOCATIONS:
+        return unknown_location()
+    booking = await run_query(_read_booking, request.path_params['booking_id'], location=location)
+    if booking is None:
+        return JSONResponse({'error': 'Booking not found'}, status_code=404)
+    return JSONResponse(dict(booking, location=location))
+
+
+class LiveSubscription:
+    """
+    A change-feed subscription read by a coroutine
+    The feed's poller thread puts messages and the event loop gets them; past
+    SUBSCRIBER_BUFFER unread messages a put raises queue.Full, as with the feed's own
+    queues, and the feed ends the stream.
+    """
+
+    def __init__(self, loop, maxsize=live.SUBSCRIBER_BUFFER):
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._lock = threading.Lock()
+        self._unread = 0
+        self.maxsize = maxsize
+
+    def put_nowait(self, message):
+        with self._lock:
+            # The closing None always goes through
+            if message is not None and self._unread >= self.maxsize:
+                raise queue.Full
+            self._unread += 1
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, message)
+        except RuntimeError:
+            # The loop has closed (shutdown); let the feed drop this subscriber
+            raise queue.Full from None
+
+    def get_nowait(self):
+        # Messages already handed to the loop can't be taken back; None follows them
+        raise queue.Empty
+
+    async def get(self, timeout):
+        message = await asyncio.wait_for(self._queue.get(), timeout)
+        with self._lock:
+            self._unread -= 1
+        return message
+
+
+@login_required
+async def api_live(request):
+    """
+    Server-Sent Events stream of booking changes and refreshed stats, same as /api/live
+    Each open stream is a coroutine, so open dashboards don't hold threads.
+    """
+    locations = request_locations(request)
+    if locations is None:
+        return unknown_location()
+    # Fresh totals first, so a reconnecting dashboard catches up on anything it missed
+    totals = stats.sum_stats((await run_locations(stats.read_stats, locations)).values())
+    subscription = live.change_feed.subscribe(locations, LiveSubscription(asyncio.get_running_loop()))
+
+    async def events():
+        try:
+            yield f'retry: {int(live.change_feed.poll_interval * 1000) * 2}\n\n'
+            yield live.format_event('stats', totals)
+            while True:
+                try:
+                    message = await subscription.get(live.LIVE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            live.change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@login_required
+async def api_async_stats(request):
+    """Long-poll waiters, live streams and DB pool counters for this process"""
+    return JSONResponse({
+        'notifier': notifier.stats(), 'live': live.change_feed.stats(), 'read_pool': db.read_pool.stats()
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await notifier.start()
+    try:
+        yield
+    finally:
+        await notifier.stop()
+        live.change_feed.stop()
+
+
+app = Starlette(
+    routes=[
+        Route('/async/api/stats', api_stats),
+        Route('/async/api/stats/poll', api_stats_poll),
+        Route('/async/api/bookings', api_bookings),
+        Route('/async/api/bookings/{booking_id:int}', api_booking_detail),
+        Route('/async/api/live', api_live),
+        Route('/async/api/status', api_async_stats),
+    ],
+    lifespan=lifespan,
+)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Serve the async read API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5003)
+    args = parser.parse_args()
+    # A deep accept backlog so a wall of pollers reconnecting at once isn't refused
+    uvicorn.run(app, host=args.host, port=args.port, backlog=4096, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
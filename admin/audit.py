@@ -0,0 +1,336 @@
+"""
+Audit log of admin actions, written off the request thread
+Handlers enqueue an event (who, what, which booking or account) and return; one
+writer thread per worker drains the queue and inserts events in batched transactions,
+every AUDIT_BATCH_SIZE events or AUDIT_FLUSH_MS, so a burst of actions shares one
+commit instead of paying one each. Pending events are flushed at interpreter exit.
+A booking's events are written to its own location's database, account events to the
+primary's; each location has its own log.
+"""
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import db
+from db import split_statements
+
+# Events written per transaction
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '256'))
+# Longest an event waits in memory before its batch is written
+AUDIT_FLUSH_MS = int(os.getenv('AUDIT_FLUSH_MS', '100'))
+# Events buffered per worker; past this a handler writes its own event
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+# Attempts at writing a batch (e.g. while the database is locked) before it is dropped
+AUDIT_WRITE_ATTEMPTS = 3
+
+logger = logging.getLogger('arielgo.audit')
+
+AUDIT_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS audit_events (
+        id INTEGER PRIMARY KEY,
+        occurred_at TEXT NOT NULL,
+        actor_id INTEGER,
+        actor TEXT,
+        action TEXT NOT NULL,
+        target_type TEXT NOT NULL,
+        target_id INTEGER NOT NULL,
+        detail TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_audit_events_target ON audit_events(target_type, target_id, id);
+'''
+
+INSERT_EVENT = '''
+    INSERT INTO audit_events (occurred_at, actor_id, actor, action, target_type, target_id, detail)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+TARGET_EVENTS_QUERY = '''
+    SELECT id, occurred_at, actor_id, actor, action, detail
+    FROM audit_events
+    WHERE target_type = ? AND target_id = ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+
+LATEST_EVENT_QUERY = 'SELECT MAX(id) FROM audit_events WHERE target_type = ? AND target_id = ?'
+
+# Queue marker telling the writer to commit what it has and exit (flush() queues an Event)
+_STOP = object()
+
+
+def install_audit(conn):
+    """Create the audit_events table and its per-target index"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        for statement in split_statements(AUDIT_SCHEMA):
+            conn.execute(statement)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:23]
+
+
+class AuditLog:
+    """Bounded event queue with a group-committing writer thread"""
+
+    def __init__(self, batch_size=AUDIT_BATCH_SIZE, flush_ms=AUDIT_FLUSH_MS,
+                 queue_size=AUDIT_QUEUE_SIZE, pool=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.pool = pool or db.write_pool
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        # Enqueued but not yet committed, so this worker's pages can show them already
+        self._unwritten = {}
+        self._seq = itertools.count()
+
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.overflow_writes = 0
+        self.write_errors = 0
+        self.dropped = 0
+        self.max_batch = 0
+        self.flush_time = 0.0
+        self.max_flush_time = 0.0
+
+    def record(self, action, target_type, target_id, actor_id=None, actor=None, **detail):
+        """Queue one event; returns without touching the database unless the queue is full"""
+        seq = next(self._seq)
+        event = (seq, _now(), actor_id, actor, action, target_type, int(target_id),
+                 json.dumps(detail, separators=(',', ':')) if detail else None)
+        with self._lock:
+            self.enqueued += 1
+            self._unwritten[seq] = event
+            closed = self._closed
+            if not closed and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+        if not closed:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                pass
+        # Queue full (or writer closed): pay for this event's commit rather than lose it
+        with self._lock:
+            self.overflow_writes += 1
+        self._write([event])
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, waiters, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception:
+                # Never let one bad batch end the writer thread; count it as dropped instead
+                logger.exception('Audit writer failed on %d events', len(batch))
+                self._forget(batch, dropped=True)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write(self, batch):
+        """Insert a batch in one transaction, retrying a few times before dropping it"""
+        for attempt in range(1, AUDIT_WRITE_ATTEMPTS + 1):
+            started = time.perf_counter()
+            conn = None
+            try:
+                # A PoolTimeout is an OperationalError, so waiting too long counts as a failed attempt
+                conn = self.pool.acquire()
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany(INSERT_EVENT, [event[1:] for event in batch])
+                conn.commit()
+                error = None
+            except sqlite3.Error as e:
+                error = e
+            finally:
+                if conn is not None:
+                    self.pool.release(conn)
+
+            if error is None:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.written += len(batch)
+                    self.batches += 1
+                    self.max_batch = max(self.max_batch, len(batch))
+                    self.flush_time += elapsed
+                    self.max_flush_time = max(self.max_flush_time, elapsed)
+                self._forget(batch)
+                return
+
+            with self._lock:
+                self.write_errors += 1
+            if attempt < AUDIT_WRITE_ATTEMPTS:
+                time.sleep(self.flush_interval)
+
+        logger.error('Dropped %d audit events: %s', len(batch), error)
+        self._forget(batch, dropped=True)
+
+    def _forget(self, batch, dropped=False):
+        with self._lock:
+            for event in batch:
+                self._unwritten.pop(event[0], None)
+            if dropped:
+                self.dropped += len(batch)
+
+    def unwritten(self, target_type, target_id):
+        """This worker's not-yet-committed events for one target, newest first"""
+        with self._lock:
+            events = [
+                event for event in self._unwritten.values()
+                if event[5] == target_type and event[6] == target_id
+            ]
+        return [
+            {'id': None, 'occurred_at': event[1], 'actor_id': event[2], 'actor': event[3],
+             'action': event[4], 'detail': event[7]}
+            for event in reversed(events)
+        ]
+
+    def flush(self, timeout=5):
+        """Block until everything queued so far is committed; False on timeout"""
+        with self._lock:
+            running = self._thread is not None and self._thread.is_alive()
+        if not running:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=5):
+        """Flush and stop the writer; later events are written inline"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                thread.join(timeout)
+            except queue.Full:
+                pass
+        # Whatever the writer didn't get to (it died, or the queue stayed full)
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                leftovers.append(item)
+            elif isinstance(item, threading.Event):
+                item.set()
+        if leftovers:
+            self._write(leftovers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'writer_running': self._thread is not None and self._thread.is_alive(),
+                'queued': self._queue.qsize(),
+                'unwritten': len(self._unwritten),
+                'batch_size': self.batch_size,
+                'flush_ms': int(self.flush_interval * 1000),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'batches': self.batches,
+                'avg_batch': round(self.written / self.batches, 2) if self.batches else 0.0,
+                'max_batch': self.max_batch,
+                'avg_flush_ms': round(self.flush_time / self.batches * 1000, 3) if self.batches else 0.0,
+                'max_flush_ms': round(self.max_flush_time * 1000, 3),
+                'overflow_writes': self.overflow_writes,
+                'write_errors': self.write_errors,
+                'dropped': self.dropped,
+            }
+
+
+def target_events(conn, target_type, target_id, limit=50, log=None):
+    """
+    Audit events for one booking or account, newest first
+    Includes events this worker has queued but not yet committed. [] if the audit
+    table hasn't been installed.
+    """
+    log = log or audit_log
+    try:
+        rows = conn.execute(TARGET_EVENTS_QUERY, (target_type, target_id, limit)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    events = log.unwritten(target_type, target_id)
+    events += [dict(row) for row in rows]
+    for event in events[:limit]:
+        event['detail'] = json.loads(event['detail']) if event['detail'] else {}
+    return events[:limit]
+
+
+def latest_event_id(conn, target_type, target_id):
+    """Newest committed event id for a target, as a cheap change marker"""
+    try:
+        row = conn.execute(LATEST_EVENT_QUERY, (target_type, target_id)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0]
+
+
+audit_log = AuditLog()
+# Logs of the non-primary locations, created on first use
+_location_logs = {}
+_location_logs_lock = threading.Lock()
+
+
+def log_for(location=None):
+    """The AuditLog writing to a location's database (audit_log for the primary)"""
+    if location in (None, db.PRIMARY_LOCATION):
+        return audit_log
+    with _location_logs_lock:
+        log = _location_logs.get(location)
+        if log is None:
+            log = _location_logs[location] = AuditLog(pool=db.pools_for(location)[0])
+        return log
+
+
+def close_all():
+    """Flush and stop every location's writer"""
+    audit_log.close()
+    with _location_logs_lock:
+        logs = list(_location_logs.values())
+    for log in logs:
+        log.close()
+
+
+atexit.register(close_all)
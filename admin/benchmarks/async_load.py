@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Load test: async read API (uvicorn) against the WSGI routes (gunicorn)
+Both servers run against the same synthetic database and the same session cookie.
+
+1. Throughput: C keep-alive clients request stats, a bookings page and a booking for
+   a fixed time on each tier; reports requests/s and p50/p95/p99.
+2. Idle pollers: N clients hold a connection open the way each tier lets them wait
+   for changes (SSE on /api/live for WSGI, long-poll on /async/api/stats/poll), then
+   probe requests measure whether the server still answers everyone else.
+
+Usage:
+    python benchmarks/async_load.py
+    python benchmarks/async_load.py --bookings 100000 --concurrency 100 --pollers 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+from http.cookies import SimpleCookie
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ADMIN_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ADMIN_DIR)
+
+from synthetic_db import PASSWORD, generate  # noqa: E402
+
+WSGI_PORT = 5902
+ASYNC_PORT = 5903
+PROBE_TIMEOUT = 5.0
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def read_response(reader):
+    """Status code and body of one HTTP/1.1 response (Content-Length or chunked)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        body = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body.append(await reader.readexactly(size))
+            await reader.readline()
+        return status, b''.join(body)
+    return status, await reader.readexactly(int(headers.get('content-length', 0)))
+
+
+def request_bytes(path, cookie):
+    return (f'GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: session={cookie}\r\n'
+            f'Connection: keep-alive\r\n\r\n').encode()
+
+
+async def throughput(port, paths, cookie, concurrency, duration):
+    """C keep-alive clients cycling through paths for duration seconds"""
+    timings, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client(offset):
+        nonlocal errors
+        reader = writer = None
+        i = offset
+        while time.perf_counter() < deadline:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                started = time.perf_counter()
+                writer.write(request_bytes(paths[i % len(paths)], cookie))
+                status, _ = await asyncio.wait_for(read_response(reader), PROBE_TIMEOUT)
+                timings.append(time.perf_counter() - started)
+                if status != 200:
+                    errors += 1
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                errors += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+            i += 1
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    ordered = sorted(timings)
+    return {
+        'requests': len(timings),
+        'requests_per_second': round(len(timings) / duration, 1),
+        'errors': errors,
+        'p50_ms': round(_percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(_percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(_percentile(ordered, 99) * 1000, 3),
+    }
+
+
+async def hold_pollers(port, path, cookie, count, ramp_per_second=1000):
+    """Open count connections waiting on path; returns (tasks, writers, answered-count getter)"""
+    writers, answered = [], 0
+
+    async def poller():
+        nonlocal answered
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            return
+        writers.append(writer)
+        writer.write(request_bytes(path, cookie))
+        try:
+            # SSE answers with headers straight away; a long-poll only when it times out
+            line = await reader.readline()
+            if line.startswith(b'HTTP/1.1 200'):
+                answered += 1
+            await reader.read()
+        except (OSError, ConnectionError):
+            pass
+
+    tasks = []
+    for n in range(count):
+        tasks.append(asyncio.create_task(poller()))
+        if n % ramp_per_second == ramp_per_second - 1:
+            await asyncio.sleep(1)
+    await asyncio.sleep(2)
+    return tasks, writers, lambda: answered
+
+
+async def probe(port, path, cookie, count):
+    """Fresh-connection requests while pollers are held; returns latency and failures"""
+    timings, failures = [], 0
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), PROBE_TIMEOUT)
+            writer.write(request_bytes(path, cookie).replace(b'keep-alive', b'close'))
+            status, _ = await asyncio.wait_for(read_response(reader), PROBE_TIMEOUT)
+            writer.close()
+            if status == 200:
+                timings.append(time.perf_counter() - started)
+            else:
+                failures += 1
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            failures += 1
+    ordered = sorted(timings)
+    return {
+        'probes': count,
+        'failed': failures,
+        'p50_ms': round(_percentile(ordered, 50) * 1000, 3),
+        'max_ms': round(max(ordered) * 1000, 3) if ordered else None,
+    }
+
+
+async def idle_pollers(port, poll_path, probe_path, cookie, count, probes, pid):
+    tasks, writers, answered = await hold_pollers(port, poll_path, cookie, count)
+    result = await probe(port, probe_path, cookie, probes)
+    result.update({
+        'pollers': count,
+        'pollers_connected': len(writers),
+        'pollers_answered': answered(),
+        'server_rss_mb': process_rss_mb(pid),
+    })
+    for writer in writers:
+        writer.close()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return result
+
+
+def process_rss_mb(pid):
+    """Resident memory of pid and its children (gunicorn workers), from /proc"""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return round(total / 1024, 1) if total else None
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/async/api/status', timeout=1)
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+            continue
+        return
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def login(port):
+    """Log in through the WSGI app and return the session cookie value"""
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    opener = urllib.request.build_opener(NoRedirect)
+    data = urllib.parse.urlencode({'username': 'admin', 'password': PASSWORD}).encode()
+    try:
+        response = opener.open(f'http://127.0.0.1:{port}/login', data=data)
+    except urllib.error.HTTPError as e:
+        response = e
+    cookie = SimpleCookie()
+    for header in response.headers.get_all('Set-Cookie') or []:
+        cookie.load(header)
+    if 'session' not in cookie:
+        raise RuntimeError('login failed')
+    return cookie['session'].value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the async read API against the WSGI routes')
+    parser.add_argument('--bookings', type=int, default=10_000)
+    parser.add_argument('--drivers', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=50, help='Keep-alive clients in the throughput phase')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per throughput run')
+    parser.add_argument('--pollers', type=int, default=2000, help='Idle polling connections to hold')
+    parser.add_argument('--probes', type=int, default=20)
+    parser.add_argument('--wsgi-workers', type=int, default=2)
+    parser.add_argument('--wsgi-threads', type=int, default=8)
+    parser.add_argument('--bcrypt-rounds', type=int, default=4)
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'))
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = os.path.join(args.data_dir, f'arielgo-{args.bookings}-d{args.drivers}-s42-r{args.bcrypt_rounds}.db')
+    if not os.path.exists(path):
+        generate(path, args.bookings, args.drivers, 42, args.bcrypt_rounds)
+
+    # Queueing under load would otherwise flood stderr with slow-query warnings
+    env = dict(os.environ, ARIELGO_DB_PATH=path, LIVE_POLL_INTERVAL='1', SLOW_QUERY_MS='60000')
+    servers = {
+        'wsgi': subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{WSGI_PORT}',
+             '--workers', str(args.wsgi_workers), '--threads', str(args.wsgi_threads),
+             '--log-level', 'warning', 'app:app'],
+            cwd=ADMIN_DIR, env=env
+        ),
+        'async': subprocess.Popen(
+            [sys.executable, 'async_api.py', '--port', str(ASYNC_PORT)], cwd=ADMIN_DIR, env=env
+        ),
+    }
+    try:
+        wait_for_port(WSGI_PORT)
+        wait_for_port(ASYNC_PORT)
+        cookie = login(WSGI_PORT)
+        booking_id = args.bookings // 2
+
+        tiers = {
+            'wsgi': {
+                'port': WSGI_PORT,
+                'stats': '/api/stats',
+                'list': '/bookings?per_page=50',
+                'detail': f'/bookings/{booking_id}',
+                'poll': '/api/live',
+            },
+            'async': {
+                'port': ASYNC_PORT,
+                'stats': '/async/api/stats',
+                'list': '/async/api/bookings?per_page=50',
+                'detail': f'/async/api/bookings/{booking_id}',
+                'poll': '/async/api/stats/poll?since=999999999&timeout=60',
+            },
+        }
+
+        results = {}
+        for tier, routes in tiers.items():
+            print(f'{tier}', file=sys.stderr)
+            results[tier] = {}
+            for name in ('stats', 'list', 'detail'):
+                result = asyncio.run(throughput(
+                    routes['port'], [routes[name]], cookie, args.concurrency, args.duration
+                ))
+                results[tier][name] = result
+                print(f'    {name:<8} {result["requests_per_second"]:>8.1f} req/s   '
+                      f'p50 {result["p50_ms"]:>8.2f} ms   p95 {result["p95_ms"]:>8.2f} ms   '
+                      f'p99 {result["p99_ms"]:>8.2f} ms   errors {result["errors"]}', file=sys.stderr)
+
+            result = asyncio.run(idle_pollers(
+                routes['port'], routes['poll'], routes['stats'], cookie,
+                args.pollers, args.probes, servers[tier].pid
+            ))
+            results[tier]['idle_pollers'] = result
+            print(f'    pollers  {result["pollers_connected"]}/{result["pollers"]} connected, '
+                  f'{result["pollers_answered"]} being served, '
+                  f'{result["probes"] - result["failed"]}/{result["probes"]} probes answered '
+                  f'(p50 {result["p50_ms"]} ms), server RSS {result["server_rss_mb"]} MB', file=sys.stderr)
+    finally:
+        for server in servers.values():
+            server.terminate()
+        for server in servers.values():
+            server.wait()
+
+    report = {
+        'bookings': args.bookings,
+        'concurrency': args.concurrency,
+        'duration_seconds': args.duration,
+        'wsgi': f'gunicorn --workers {args.wsgi_workers} --threads {args.wsgi_threads}',
+        'results': results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
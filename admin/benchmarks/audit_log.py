@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark: audit logging on the booking write path
+C threads each run N status updates the way update_status does (UPDATE, commit)
+against a scratch database with the admin schema installed, three ways:
+
+- none:  no audit record
+- sync:  an audit INSERT and a second commit on the request thread
+- async: audit.AuditLog.record(), committed in batches by the writer thread
+
+Reports updates per second and p50/p95/p99 handler latency for each, the async
+writer's batch counters, and how long the final flush took. With --synchronous FULL
+every commit is an fsync, which is where the second commit hurts most.
+
+Usage: python benchmarks/audit_log.py [--updates 4000] [--concurrency 4] [--synchronous FULL]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import audit  # noqa: E402
+import metrics  # noqa: E402
+import schema  # noqa: E402
+from db import ConnectionPool  # noqa: E402
+from synthetic_db import generate  # noqa: E402
+
+STATUSES = ('pending', 'confirmed', 'in_progress', 'completed')
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(pool, mode, updates, concurrency, booking_ids, log=None):
+    """Per-update handler latencies (seconds) and wall time for one mode"""
+    timings = [[] for _ in range(concurrency)]
+
+    def worker(n):
+        rnd = random.Random(n)
+        conn = pool.acquire()
+        try:
+            for _ in range(updates // concurrency):
+                booking_id, status = rnd.choice(booking_ids), rnd.choice(STATUSES)
+                started = time.perf_counter()
+                conn.execute(
+                    'UPDATE bookings SET status = ?, updatedAt = ? WHERE id = ?',
+                    (status, datetime.now().isoformat(), booking_id)
+                )
+                conn.commit()
+                if mode == 'sync':
+                    conn.execute(audit.INSERT_EVENT, (
+                        audit._now(), 1, 'bench', 'status', 'booking', booking_id, f'{{"status":"{status}"}}'
+                    ))
+                    conn.commit()
+                elif mode == 'async':
+                    log.record('status', 'booking', booking_id, actor_id=1, actor='bench', status=status)
+                timings[n].append(time.perf_counter() - started)
+        finally:
+            pool.release(conn)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(t for per_thread in timings for t in per_thread), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark audit logging on the booking write path')
+    parser.add_argument('--bookings', type=int, default=10_000)
+    parser.add_argument('--updates', type=int, default=4000, help='Status updates per mode')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent handler threads')
+    parser.add_argument('--synchronous', default='NORMAL', choices=['NORMAL', 'FULL'],
+                        help='PRAGMA synchronous for every connection (the admin pool uses NORMAL)')
+    parser.add_argument('--batch-size', type=int, default=audit.AUDIT_BATCH_SIZE)
+    parser.add_argument('--flush-ms', type=int, default=audit.AUDIT_FLUSH_MS)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    # Lock waits between the handler threads trip the slow-query log; it isn't what's measured here
+    metrics.slow_query_logger.disabled = True
+
+    results = {'updates': args.updates, 'concurrency': args.concurrency, 'synchronous': args.synchronous}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'audit.db')
+        generate(path, args.bookings, drivers=20, bcrypt_rounds=4)
+
+        pool = ConnectionPool(path, max_size=args.concurrency + 2)
+        conn = pool.acquire()
+        # The admin triggers (stats, rollups, search, change feed) fire on every update, as in production
+        schema.install_admin_schema(conn)
+        booking_ids = [row[0] for row in conn.execute('SELECT id FROM bookings')]
+        pool.release(conn)
+        # Connections are opened with synchronous=NORMAL; override for every one the pool hands out
+        original_acquire = pool.acquire
+
+        def acquire():
+            conn = original_acquire()
+            conn.execute(f'PRAGMA synchronous = {args.synchronous}')
+            return conn
+        pool.acquire = acquire
+
+        log = audit.AuditLog(batch_size=args.batch_size, flush_ms=args.flush_ms, pool=pool)
+        # Warm the page cache so the first mode measured isn't also paying for cold reads
+        run(pool, 'none', args.updates, args.concurrency, booking_ids)
+        for mode in ('none', 'sync', 'async'):
+            timings, wall = run(pool, mode, args.updates, args.concurrency, booking_ids, log)
+            results[mode] = {
+                'updates_per_second': round(len(timings) / wall, 1),
+                'p50_ms': round(_percentile(timings, 50) * 1000, 3),
+                'p95_ms': round(_percentile(timings, 95) * 1000, 3),
+                'p99_ms': round(_percentile(timings, 99) * 1000, 3),
+            }
+        started = time.perf_counter()
+        log.close()
+        results['async']['final_flush_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        results['async']['writer'] = {
+            key: value for key, value in log.stats().items()
+            if key in ('written', 'batches', 'avg_batch', 'max_batch', 'avg_flush_ms', 'overflow_writes', 'dropped')
+        }
+        pool.close_all()
+
+    for mode in ('sync', 'async'):
+        results[mode]['throughput_vs_none'] = round(
+            results[mode]['updates_per_second'] / results['none']['updates_per_second'], 3
+        )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.updates:,} status updates per mode, {args.concurrency} threads, synchronous={args.synchronous}')
+    for mode in ('none', 'sync', 'async'):
+        r = results[mode]
+        ratio = f'   {r["throughput_vs_none"]:.2f}x of none' if 'throughput_vs_none' in r else ''
+        print(f'  {mode:<6} {r["updates_per_second"]:>9.1f} updates/s   p50 {r["p50_ms"]:>7.3f} ms'
+              f'   p95 {r["p95_ms"]:>7.3f} ms   p99 {r["p99_ms"]:>7.3f} ms{ratio}')
+    writer = results['async']['writer']
+    print(f'  writer: {writer["written"]} events in {writer["batches"]} transactions '
+          f'(avg {writer["avg_batch"]}, max {writer["max_batch"]}), '
+          f'{writer["overflow_writes"]} written inline, final flush {results["async"]["final_flush_ms"]} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: BookingView vs. the old dict-copy process_bookings
+Builds an in-memory bookings table, then times and measures allocations for
+turning query rows into the objects the /bookings list template reads.
+
+Usage: python benchmarks/booking_view.py [--rows 10000 100000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from booking_view import BookingView, LIST_COLUMNS  # noqa: E402
+
+SERVICES = ['standard', 'same-day', 'rush', 'dry-cleaning', 'specialty']
+STATUSES = ['pending', 'confirmed', 'in_progress', 'completed', 'cancelled']
+
+# Fields bookings.html touches for every row
+LIST_FIELDS = (
+    'id', 'name', 'phone', 'email', 'service', 'numberOfBags', 'totalPrice',
+    'status', 'pickupDate', 'pickupTime', 'createdAt'
+)
+
+
+def process_booking(booking_row):
+    """The previous app.process_booking: full dict copy plus eager json.loads"""
+    booking = dict(booking_row)
+    if booking.get('itemsJson'):
+        try:
+            booking['itemsJson'] = json.loads(booking['itemsJson'])
+        except (json.JSONDecodeError, TypeError):
+            booking['itemsJson'] = None
+    return booking
+
+
+def process_bookings(booking_rows):
+    return [process_booking(b) for b in booking_rows]
+
+
+def build_db(rows):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('''
+        CREATE TABLE bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, phone TEXT, email TEXT,
+            address TEXT, service TEXT, pickupDate TEXT, pickupTime TEXT,
+            numberOfBags INTEGER, pricePerBag INTEGER, totalPrice INTEGER, status TEXT,
+            notes TEXT, paymentIntentId TEXT, paymentStatus TEXT, stripeCustomerId TEXT,
+            createdAt TEXT, updatedAt TEXT, user_id INTEGER, itemsJson TEXT, driver_id INTEGER
+        )
+    ''')
+    rnd = random.Random(42)
+    items = json.dumps([
+        {'name': 'Dress Shirt', 'quantity': 3, 'total': 1500},
+        {'name': 'Suit Jacket', 'quantity': 1, 'total': 1800},
+    ])
+    conn.executemany('''
+        INSERT INTO bookings (name, phone, email, address, service, pickupDate, pickupTime,
+            numberOfBags, pricePerBag, totalPrice, status, notes, paymentIntentId,
+            paymentStatus, createdAt, updatedAt, itemsJson, driver_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        (
+            f'Customer {i}', f'206-555-{i % 10000:04d}', f'customer{i}@example.com',
+            f'{i} University Way NE, Seattle, WA', service, '2026-03-01', '9:00 AM - 11:00 AM',
+            2, 3200, 6400, rnd.choice(STATUSES), 'Leave at the front desk', f'pi_{i:012d}',
+            'paid', '2026-02-28 10:00:00', '2026-02-28 10:00:00',
+            items if service in ('dry-cleaning', 'specialty') else None, None,
+        )
+        for i, service in ((i, rnd.choice(SERVICES)) for i in range(rows))
+    ))
+    return conn
+
+
+def render_list(bookings):
+    """Touch what the list template touches: every list field, items only for per-item services"""
+    for booking in bookings:
+        for field in LIST_FIELDS:
+            booking[field]
+        if booking['service'] in ('dry-cleaning', 'specialty') and booking['itemsJson']:
+            len(booking['itemsJson'])
+
+
+def measure(label, build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    bookings = build()
+    render_list(bookings)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'variant': label, 'seconds': elapsed, 'peak_bytes': peak}
+
+
+def run(rows):
+    conn = build_db(rows)
+    results = [
+        measure('process_bookings (SELECT *)', lambda: process_bookings(
+            conn.execute('SELECT * FROM bookings').fetchall()
+        )),
+        measure('BookingView (projected)', lambda: [
+            BookingView(row)
+            for row in conn.execute(f'SELECT {LIST_COLUMNS} FROM bookings').fetchall()
+        ]),
+    ]
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        results = run(rows)
+        baseline = results[0]
+        print(f'\n{rows:,} rows')
+        for result in results:
+            print(
+                f"  {result['variant']:<30} {result['seconds'] * 1000:9.1f} ms"
+                f"  peak {result['peak_bytes'] / 1024 / 1024:8.1f} MiB"
+                f"  ({result['seconds'] / baseline['seconds']:.2f}x time,"
+                f" {result['peak_bytes'] / baseline['peak_bytes']:.2f}x memory)"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pickup-slot capacity forecast
+Builds a synthetic database, installs the admin schema and times the forecast over
+8, 26 and 52 trailing weeks:
+
+- rows:   every booking fetched as a Row and counted per slot in a Python dict
+          (what a straightforward implementation would do)
+- cold:   capacity.weekly_profile + the upcoming slots, i.e. a cache miss
+- cached: CapacityCache.forecast once the day's profile is cached
+
+Usage: python benchmarks/capacity.py [--bookings 100000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import capacity  # noqa: E402
+import schema  # noqa: E402
+from synthetic_db import generate  # noqa: E402
+
+WEEKS = (8, 26, 52)
+HORIZON_DAYS = 14
+
+
+def rows_baseline(conn, today, weeks):
+    """Per-(weekday, window) means from one Row per booking, without NumPy"""
+    start = today - timedelta(weeks=weeks)
+    totals = defaultdict(lambda: [0, 0])
+    for row in conn.execute('''
+        SELECT pickupDate, pickupTime, numberOfBags FROM bookings
+        WHERE pickupDate >= ? AND pickupDate < ? AND COALESCE(status, '') != 'cancelled'
+    ''', (start.isoformat(), today.isoformat())):
+        weekday = date.fromisoformat(row['pickupDate'][:10]).weekday()
+        slot = totals[(weekday, row['pickupTime'])]
+        slot[0] += 1
+        slot[1] += max(row['numberOfBags'] or 0, 1)
+    return {key: (count / weeks, bags / weeks) for key, (count, bags) in totals.items()}
+
+
+def timed(fn, repeat):
+    """Median wall time of fn() in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(times), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pickup capacity forecast')
+    parser.add_argument('--bookings', type=int, default=100_000, help='Synthetic bookings over two years')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {'bookings': args.bookings, 'horizon_days': HORIZON_DAYS, 'weeks': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'capacity.db')
+        generate(path, args.bookings, drivers=20, bcrypt_rounds=4)
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        schema.install_admin_schema(conn)
+        schema.analyze(conn)
+
+        # Forecast from the last week of generated pickups, so every trailing week has data
+        today = date.fromisoformat(conn.execute('SELECT MAX(pickupDate) FROM bookings').fetchone()[0])
+        today -= timedelta(days=7)
+
+        for weeks in WEEKS:
+            cache = capacity.CapacityCache()
+            kwargs = {'start': today.isoformat(), 'days': HORIZON_DAYS, 'weeks': weeks}
+            cache.forecast(conn, **kwargs)
+            results['weeks'][weeks] = {
+                'history_bookings': conn.execute(
+                    'SELECT COUNT(*) FROM bookings WHERE pickupDate >= ? AND pickupDate < ?',
+                    ((today - timedelta(weeks=weeks)).isoformat(), today.isoformat())
+                ).fetchone()[0],
+                'rows_ms': timed(lambda: rows_baseline(conn, today, weeks), args.repeat),
+                'cold_ms': timed(lambda: capacity.build_forecast(
+                    capacity.weekly_profile(conn, today, weeks),
+                    capacity.load_slots(conn, today, HORIZON_DAYS), today, HORIZON_DAYS
+                ), args.repeat),
+                'cached_ms': timed(lambda: cache.forecast(conn, **kwargs), args.repeat),
+            }
+        conn.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.bookings:,} bookings, {HORIZON_DAYS}-day forecast, median of {args.repeat}')
+    for weeks, r in results['weeks'].items():
+        print(f'  {weeks:>2} weeks ({r["history_bookings"]:>6,} bookings)   rows {r["rows_ms"]:>7.1f} ms'
+              f'   cold {r["cold_ms"]:>6.1f} ms   cached {r["cached_ms"]:>5.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
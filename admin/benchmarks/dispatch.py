@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: batch driver dispatch
+Plans a synthetic day of unassigned bookings (2,000 by default) across 100 drivers and
+reports planning time and how balanced and compact the routes are. The target is
+under one second per plan.
+
+Usage: python benchmarks/dispatch.py [--bookings 2000] [--drivers 100] [--runs 20]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dispatch import plan_dispatch  # noqa: E402
+from synthetic_db import CITIES, PICKUP_SLOTS, STREETS  # noqa: E402
+
+TARGET_SECONDS = 1.0
+
+
+def build_day(bookings, drivers, seed):
+    rnd = random.Random(seed)
+    # A metro area's worth of ZIP codes, a few of them much busier than the rest
+    zips = [f'98{n:03d}' for n in range(1, 60)]
+    weights = [rnd.choice([1, 1, 1, 2, 5]) for _ in zips]
+
+    day = []
+    for booking_id in range(1, bookings + 1):
+        address = f'{rnd.randint(100, 9999)} {rnd.choice(STREETS)}, {rnd.choice(CITIES)}'
+        if rnd.random() < 0.9:
+            address += f', WA {rnd.choices(zips, weights)[0]}'
+        day.append({
+            'id': booking_id,
+            'address': address,
+            'pickupTime': rnd.choice(PICKUP_SLOTS),
+            'numberOfBags': rnd.choice([0, 1, 2, 2, 3, 3, 4, 5]),
+        })
+    crew = [{'id': driver_id, 'full_name': f'Driver {driver_id}'} for driver_id in range(1, drivers + 1)]
+    return day, crew
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch driver dispatch')
+    parser.add_argument('--bookings', type=int, default=2000)
+    parser.add_argument('--drivers', type=int, default=100)
+    parser.add_argument('--capacity', type=int, default=80, help='Bags per driver')
+    parser.add_argument('--max-stops', type=int, default=8, help='Stops per driver per pickup window')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    bookings, drivers = build_day(args.bookings, args.drivers, args.seed)
+
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        plan = plan_dispatch(bookings, drivers, args.capacity, args.max_stops)
+        timings.append(time.perf_counter() - started)
+
+    summary = plan['summary']
+    zones_per_driver = [len(route['zones']) for route in plan['routes']]
+    loads = [route['bags'] for route in plan['routes']]
+    results = {
+        'bookings': args.bookings,
+        'drivers': args.drivers,
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3),
+        'assigned': summary['assigned'],
+        'unassigned': summary['unassigned'],
+        'drivers_used': summary['drivers_used'],
+        'zones': summary['zones'],
+        'bags_per_driver': {
+            'min': min(loads, default=0),
+            'mean': round(statistics.mean(loads), 2) if loads else 0,
+            'max': max(loads, default=0),
+            'stdev': round(statistics.pstdev(loads), 2) if loads else 0,
+        },
+        'zones_per_driver': {
+            'mean': round(statistics.mean(zones_per_driver), 2) if zones_per_driver else 0,
+            'max': max(zones_per_driver, default=0),
+        },
+        'within_target': max(timings) < TARGET_SECONDS,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f'{args.bookings:,} bookings, {args.drivers} drivers, {summary["zones"]} zones, {args.runs} runs')
+        print(f'  plan time      p50 {results["p50_ms"]:.1f} ms   max {results["max_ms"]:.1f} ms'
+              f'   ({"OK" if results["within_target"] else "OVER"} vs {TARGET_SECONDS:.0f}s target)')
+        print(f'  assigned       {summary["assigned"]:,} / {args.bookings:,}'
+              f'   unassigned {summary["unassigned"]}   drivers used {summary["drivers_used"]}')
+        bags = results['bags_per_driver']
+        print(f'  bags/driver    min {bags["min"]}   mean {bags["mean"]}   max {bags["max"]}   stdev {bags["stdev"]}')
+        zones = results['zones_per_driver']
+        print(f'  zones/driver   mean {zones["mean"]}   max {zones["max"]}')
+
+    sys.exit(0 if results['within_target'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Route benchmark: drives the admin app through Flask's test client
+For each database size a synthetic arielgo.db is generated (and cached under
+benchmarks/data/), then every route is requested in a fresh process pointed at it.
+Reports p50/p95/p99 latency and SQL statements per request, and writes them as JSON
+keyed by git commit so two runs can be diffed.
+
+Usage:
+    python benchmarks/routes.py                          # 10k, 100k and 1M bookings
+    python benchmarks/routes.py --sizes 10000 --requests 50
+    python benchmarks/routes.py --baseline benchmarks/results/abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ADMIN_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ADMIN_DIR)
+
+from synthetic_db import PASSWORD, generate  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_DRIVERS = 300
+# Requests per route; login pays for a full bcrypt check each time
+DEFAULT_REQUESTS = 200
+LOGIN_REQUESTS = 20
+WARMUP_REQUESTS = 5
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(timings, queries, statuses):
+    ordered = sorted(timings)
+    return {
+        'requests': len(timings),
+        'p50_ms': round(_percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(_percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(_percentile(ordered, 99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        'status_codes': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def instrument_queries(db):
+    """Count statements run on pooled connections; returns the mutable counter"""
+    counter = {'queries': 0}
+
+    def trace(statement):
+        # Trigger bodies are reported as "-- TRIGGER name"; count only top-level statements
+        if not statement.startswith('--'):
+            counter['queries'] += 1
+
+    for pool in (db.read_pool, db.write_pool):
+        def acquire(original=pool.acquire):
+            conn = original()
+            conn.set_trace_callback(trace)
+            return conn
+        pool.acquire = acquire
+    return counter
+
+
+def run_worker(db_path, requests, login_requests, seed):
+    """Benchmark every route against db_path in this process; returns per-route results"""
+    started = time.perf_counter()
+    import app as admin_app
+    import db
+    from pagination import encode_cursor
+    startup = time.perf_counter() - started
+
+    counter = instrument_queries(db)
+    app = admin_app.app
+    rnd = random.Random(seed)
+
+    conn = sqlite3.connect(db_path)
+    max_id = conn.execute('SELECT MAX(id) FROM bookings').fetchone()[0] or 1
+    middle = conn.execute(
+        'SELECT createdAt, id FROM bookings WHERE id >= ? ORDER BY id LIMIT 1', (max_id // 2,)
+    ).fetchone()
+    conn.close()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': PASSWORD})
+
+    def login():
+        # A fresh client each time so the request is a real, unauthenticated login
+        return app.test_client().post('/login', data={'username': 'admin', 'password': PASSWORD})
+
+    # Revalidation as a polling wall display does it: same URL, ETag from the last response
+    def revalidate(url):
+        etags = []
+
+        def request():
+            if not etags:
+                etags.append(client.get(url).headers.get('ETag', ''))
+            return client.get(url, headers={'If-None-Match': etags[0]})
+        return request
+
+    scenarios = [
+        ('login', login, login_requests),
+        ('dashboard', lambda: client.get('/'), requests),
+        ('bookings', lambda: client.get('/bookings'), requests),
+        ('bookings_pending', lambda: client.get('/bookings?status=pending'), requests),
+        ('bookings_deep_page', lambda: client.get(f'/bookings?cursor={encode_cursor(*middle)}'), requests),
+        ('booking_detail', lambda: client.get(f'/bookings/{rnd.randint(1, max_id)}'), requests),
+        ('api_stats', lambda: client.get('/api/stats'), requests),
+        ('dashboard_not_modified', revalidate('/'), requests),
+        ('api_stats_not_modified', revalidate('/api/stats'), requests),
+        ('booking_detail_not_modified', revalidate(f'/bookings/{max_id // 2}'), requests),
+        ('drivers', lambda: client.get('/drivers'), requests),
+    ]
+
+    results = {}
+    for name, request, count in scenarios:
+        for _ in range(min(WARMUP_REQUESTS, count)):
+            request().get_data()
+
+        timings, queries, statuses = [], [], []
+        for _ in range(count):
+            counter['queries'] = 0
+            t0 = time.perf_counter()
+            response = request()
+            # Streamed pages only finish rendering once the body is read
+            response.get_data()
+            timings.append(time.perf_counter() - t0)
+            queries.append(counter['queries'])
+            statuses.append(response.status_code)
+        results[name] = summarize(timings, queries, statuses)
+        print(f'    {name:<20} p50 {results[name]["p50_ms"]:>9.3f} ms   '
+              f'p95 {results[name]["p95_ms"]:>9.3f} ms   '
+              f'p99 {results[name]["p99_ms"]:>9.3f} ms   '
+              f'{results[name]["queries_per_request"]:>6.2f} queries', file=sys.stderr)
+
+    return {'startup_seconds': round(startup, 3), 'routes': results}
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ADMIN_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+        dirty = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--', '.'], cwd=ADMIN_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def compare(baseline, current):
+    """Print p50/p95 and query-count changes against a previous results file"""
+    print(f'\nvs {baseline["meta"]["commit"]}:')
+    for size, result in current['results'].items():
+        before = baseline['results'].get(size)
+        if before is None:
+            continue
+        print(f'  {int(size):,} bookings')
+        for route, now in result['routes'].items():
+            then = before['routes'].get(route)
+            if then is None:
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms'):
+                ratio = now[key] / then[key] if then[key] else float('inf')
+                changes.append(f'{key[:3]} {then[key]:.2f} -> {now[key]:.2f} ms ({ratio:.2f}x)')
+            changes.append(f'queries {then["queries_per_request"]} -> {now["queries_per_request"]}')
+            print(f'    {route:<20} ' + '   '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark admin routes against synthetic databases')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Bookings per database')
+    parser.add_argument('--drivers', type=int, default=DEFAULT_DRIVERS)
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='Requests per route')
+    parser.add_argument('--login-requests', type=int, default=LOGIN_REQUESTS)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'))
+    parser.add_argument('--regenerate', action='store_true', help='Rebuild cached databases')
+    parser.add_argument('--output', help='Results file (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--baseline', help='Previous results file to compare against')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.worker, args.requests, args.login_requests, args.seed)
+        json.dump(result, sys.stdout)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'requests_per_route': args.requests,
+            'login_requests': args.login_requests,
+            'drivers': args.drivers,
+            'bcrypt_rounds': args.bcrypt_rounds,
+        },
+        'results': {},
+    }
+
+    for size in args.sizes:
+        path = os.path.join(args.data_dir, f'arielgo-{size}-d{args.drivers}-s{args.seed}-r{args.bcrypt_rounds}.db')
+        print(f'{size:,} bookings ({path})', file=sys.stderr)
+        if args.regenerate or not os.path.exists(path):
+            elapsed = generate(path, size, args.drivers, args.seed, args.bcrypt_rounds)
+            print(f'    generated in {elapsed:.1f}s', file=sys.stderr)
+
+        # A fresh process per database, so module-level pools and caches start cold
+        env = dict(os.environ, ARIELGO_DB_PATH=path)
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--worker', path,
+             '--requests', str(args.requests), '--login-requests', str(args.login_requests),
+             '--seed', str(args.seed)],
+            cwd=ADMIN_DIR, env=env, text=True
+        )
+        # The worker's JSON is its last line of stdout
+        report['results'][str(size)] = json.loads(output.strip().splitlines()[-1])
+
+    output_path = args.output or os.path.join(BENCH_DIR, 'results', f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f'\nResults written to {output_path}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
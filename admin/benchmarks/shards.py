@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: aggregate queries fanned out across location databases
+Splits a fixed number of synthetic bookings across 1, 2, 4 and 8 location files and
+times, for each split:
+
+- stats:  stats.read_stats over every booking (a full GROUP BY scan, as before
+          booking_stats is installed), one location after another and through
+          shards.fan_out, whose threads run the scans side by side
+- page:   shards.newest, one 50-row page k-way merged from every location
+
+Each scan covers 1/N of the bookings, so with a core per location the fanned-out
+stats time should fall close to 1/N; on fewer cores it flattens at the core count.
+
+Usage: python benchmarks/shards.py [--bookings 400000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+SHARD_COUNTS = (1, 2, 4, 8)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from synthetic_db import generate  # noqa: E402
+
+_tmp = tempfile.TemporaryDirectory()
+_paths = {f'loc{i}': os.path.join(_tmp.name, f'loc{i}.db') for i in range(max(SHARD_COUNTS))}
+# The location set is read at import, so configure every location the largest split uses
+os.environ['ARIELGO_LOCATIONS'] = ','.join(f'{name}={path}' for name, path in _paths.items())
+
+import db  # noqa: E402
+import metrics  # noqa: E402
+import shards  # noqa: E402
+import stats  # noqa: E402
+from booking_view import LIST_COLUMNS  # noqa: E402
+
+
+def timed(fn, repeat):
+    """Median wall time of fn() in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(times), 2)
+
+
+def build(count, bookings):
+    """Spread bookings over the first count locations; returns {location: read-only connection}"""
+    connections = {}
+    for i, name in enumerate(list(_paths)[:count]):
+        path = _paths[name]
+        generate(path, bookings // count, drivers=20, seed=i + 1, bcrypt_rounds=4)
+        conn = sqlite3.connect(path, isolation_level=None)
+        if i:
+            # Accounts live at the primary location only
+            conn.execute('DROP TABLE admin_users')
+        db.install_indexes(conn)
+        conn.execute('ANALYZE')
+        conn.close()
+        connections[name] = db.pools_for(name)[1].acquire()
+    return connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fan-out of aggregate queries across locations')
+    parser.add_argument('--bookings', type=int, default=400_000, help='Synthetic bookings in total')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    # Every full scan here is deliberate; keep them out of the slow-query log
+    metrics.slow_query_logger.disabled = True
+
+    results = {'bookings': args.bookings, 'cpus': os.cpu_count(), 'locations': {}}
+    for count in SHARD_COUNTS:
+        connections = build(count, args.bookings)
+        locations = list(connections)
+
+        def sequential():
+            return stats.sum_stats(stats.read_stats(conn) for conn in connections.values())
+
+        def fanned_out():
+            return stats.sum_stats(shards.fan_out(
+                lambda conn, location: stats.read_stats(conn), locations, connections
+            ).values())
+
+        assert sequential() == fanned_out()
+        fanned_out()  # warm the page cache
+        results['locations'][count] = {
+            'sequential_ms': timed(sequential, args.repeat),
+            'fan_out_ms': timed(fanned_out, args.repeat),
+            'page_ms': timed(lambda: shards.newest(locations, LIST_COLUMNS, page_size=50,
+                                                   connections=connections), args.repeat),
+        }
+        for name, conn in connections.items():
+            db.pools_for(name)[1].release(conn)
+            db.pools_for(name)[1].close_all()
+
+    base = results['locations'][SHARD_COUNTS[0]]['fan_out_ms']
+    for r in results['locations'].values():
+        r['speedup'] = round(base / r['fan_out_ms'], 2) if r['fan_out_ms'] else 0.0
+    _tmp.cleanup()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.bookings:,} bookings split across N locations, {results["cpus"]} CPUs, median of {args.repeat}')
+    for count, r in results['locations'].items():
+        print(f'  {count} location{"s" if count != 1 else " "}   stats: sequential {r["sequential_ms"]:>7.1f} ms'
+              f'   fan-out {r["fan_out_ms"]:>7.1f} ms ({r["speedup"]:.2f}x)   page {r["page_ms"]:>6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Synthetic arielgo.db generator for benchmarks
+Creates bookings and admin_users with the production schema (database/database.js and
+database/create_admin_users.py, plus the itemsJson and driver_id columns the admin app
+reads) and fills them with deterministic random data. Admin-side tables and triggers
+are left for the app to install on first start, as they would be on a real database.
+
+Every account's password is "benchmark"; the super admin is "admin".
+
+Usage: python benchmarks/synthetic_db.py out.db --bookings 100000 [--drivers 300]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import bcrypt
+
+PASSWORD = 'benchmark'
+
+SERVICES = {
+    # code: (price per bag in cents, or None for per-item services)
+    'standard': 3200,
+    'same-day': 4200,
+    'rush': 5500,
+    'dry-cleaning': None,
+    'specialty': None,
+}
+# Rough production mix: mostly bag services, per-item services are the minority
+SERVICE_WEIGHTS = [50, 20, 10, 15, 5]
+# Older bookings are mostly done; the last few days are still in flight
+SETTLED_STATUSES = (['completed', 'cancelled'], [90, 10])
+OPEN_STATUSES = (['pending', 'confirmed', 'in_progress', 'completed', 'cancelled'], [35, 30, 15, 15, 5])
+
+ITEMS = {
+    'dry-cleaning': [
+        ('dress-shirt', 'Dress Shirt', 450), ('pants', 'Pants / Trousers', 750),
+        ('suit-2pc', 'Suit (2-piece)', 1800), ('dress', 'Dress', 1400),
+        ('sweater', 'Sweater', 800), ('coat-jacket', 'Coat / Jacket', 2000),
+    ],
+    'specialty': [
+        ('comforter-queen', 'Comforter (Queen)', 3000), ('blanket', 'Blanket', 1800),
+        ('duvet-cover', 'Duvet Cover', 2000), ('pillow', 'Pillow', 1000),
+    ],
+}
+PICKUP_SLOTS = ['8:00 AM - 10:00 AM', '10:00 AM - 12:00 PM', '12:00 PM - 2:00 PM',
+                '2:00 PM - 4:00 PM', '4:00 PM - 6:00 PM', '6:00 PM - 8:00 PM']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie',
+               'Avery', 'Quinn', 'Drew', 'Reese', 'Skyler', 'Rowan', 'Emerson', 'Hayden']
+LAST_NAMES = ['Nguyen', 'Garcia', 'Smith', 'Kim', 'Patel', 'Johnson', 'Lee', 'Brown',
+              'Martinez', 'Davis', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Moore']
+STREETS = ['Pine St', 'Broadway', 'Madison Ave', 'Rainier Ave S', 'Aurora Ave N',
+           'Capitol Way', 'Pacific Ave', '6th Ave', 'Main St', 'Yesler Way']
+CITIES = ['Seattle', 'Tacoma', 'Bellevue', 'Renton', 'Olympia', 'Kent']
+NOTES = [None, None, None, 'Leave at front door', 'Call on arrival', 'Gate code 1234',
+         'Fragrance-free detergent please', 'Hang dry delicates']
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS bookings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        email TEXT NOT NULL,
+        address TEXT NOT NULL,
+        service TEXT NOT NULL,
+        pickupDate TEXT NOT NULL,
+        pickupTime TEXT,
+        numberOfBags INTEGER DEFAULT 1,
+        pricePerBag INTEGER NOT NULL,
+        totalPrice INTEGER NOT NULL,
+        status TEXT DEFAULT 'pending',
+        notes TEXT,
+        paymentIntentId TEXT,
+        paymentStatus TEXT DEFAULT 'pending',
+        stripeCustomerId TEXT,
+        createdAt TEXT DEFAULT CURRENT_TIMESTAMP,
+        updatedAt TEXT DEFAULT CURRENT_TIMESTAMP,
+        user_id INTEGER,
+        itemsJson TEXT,
+        driver_id INTEGER REFERENCES admin_users(id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_status ON bookings(status);
+    CREATE INDEX IF NOT EXISTS idx_pickup_date ON bookings(pickupDate);
+
+    CREATE TABLE IF NOT EXISTS admin_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        full_name TEXT,
+        role TEXT NOT NULL DEFAULT 'admin',
+        is_active INTEGER DEFAULT 1,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        last_login TEXT
+    );
+'''
+
+
+def _name(rnd):
+    return f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}'
+
+
+def generate_users(rnd, drivers, password_hash, now):
+    yield ('admin', password_hash, 'admin@arielgo.com', 'Administrator', 'super_admin', 1,
+           (now - timedelta(days=900)).strftime('%Y-%m-%d %H:%M:%S'))
+    for i in range(drivers):
+        yield (f'driver{i:04d}', password_hash, f'driver{i:04d}@arielgo.com', _name(rnd), 'driver',
+               1 if rnd.random() < 0.85 else 0,
+               (now - timedelta(days=rnd.randint(1, 900))).strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def generate_bookings(rnd, count, driver_ids, now, days=730):
+    """Bookings spread over the last `days` days, oldest first"""
+    span = days * 86400
+    for i in range(count):
+        created = now - timedelta(seconds=span - span * i // max(count, 1) + rnd.randint(0, 59))
+        service = rnd.choices(list(SERVICES), SERVICE_WEIGHTS)[0]
+        price_per_bag = SERVICES[service]
+
+        if price_per_bag is None:
+            picked = rnd.sample(ITEMS[service], rnd.randint(1, 3))
+            items = []
+            for key, label, price in picked:
+                quantity = rnd.randint(1, 4)
+                items.append({'item': key, 'name': label, 'quantity': quantity,
+                              'pricePerItem': price, 'total': price * quantity})
+            items_json = json.dumps(items)
+            bags, price_per_bag = 0, 0
+            total = sum(item['total'] for item in items)
+        else:
+            items_json = None
+            bags = rnd.randint(1, 5)
+            total = bags * price_per_bag
+
+        statuses, weights = OPEN_STATUSES if now - created < timedelta(days=7) else SETTLED_STATUSES
+        status = rnd.choices(statuses, weights)[0]
+        driver_id = rnd.choice(driver_ids) if driver_ids and status != 'pending' else None
+        stamp = created.strftime('%Y-%m-%d %H:%M:%S')
+        name = _name(rnd)
+
+        yield (
+            name, f'(206) 555-{rnd.randint(0, 9999):04d}',
+            f'{name.lower().replace(" ", ".")}{i}@example.com',
+            f'{rnd.randint(100, 9999)} {rnd.choice(STREETS)}, {rnd.choice(CITIES)}, WA',
+            service, (created + timedelta(days=rnd.randint(0, 3))).strftime('%Y-%m-%d'),
+            rnd.choice(PICKUP_SLOTS), bags, price_per_bag, total, status, rnd.choice(NOTES),
+            'paid' if status != 'cancelled' else 'refunded', stamp, stamp, items_json, driver_id,
+        )
+
+
+def generate(path, bookings, drivers=300, seed=42, bcrypt_rounds=12):
+    """Write a fresh synthetic database to path; returns elapsed seconds"""
+    started = time.perf_counter()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    rnd = random.Random(seed)
+    now = datetime(2026, 1, 1)
+    password_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(bcrypt_rounds)).decode('utf-8')
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    # Bulk load only; the app switches the file to WAL when it opens it
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.executescript(SCHEMA)
+
+    conn.execute('BEGIN')
+    conn.executemany('''
+        INSERT INTO admin_users (username, password_hash, email, full_name, role, is_active, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', generate_users(rnd, drivers, password_hash, now))
+    driver_ids = [row[0] for row in conn.execute("SELECT id FROM admin_users WHERE role = 'driver'")]
+
+    conn.executemany('''
+        INSERT INTO bookings (name, phone, email, address, service, pickupDate, pickupTime,
+                              numberOfBags, pricePerBag, totalPrice, status, notes,
+                              paymentStatus, createdAt, updatedAt, itemsJson, driver_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', generate_bookings(rnd, bookings, driver_ids, now))
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.close()
+
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic arielgo.db')
+    parser.add_argument('path', help='Output database file (overwritten)')
+    parser.add_argument('--bookings', type=int, default=100_000)
+    parser.add_argument('--drivers', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12,
+                        help='Cost of the shared password hash (login latency depends on it)')
+    args = parser.parse_args()
+
+    elapsed = generate(args.path, args.bookings, args.drivers, args.seed, args.bcrypt_rounds)
+    print(f'✅ {args.path}: {args.bookings:,} bookings, {args.drivers} drivers in {elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
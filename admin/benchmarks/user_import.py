@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bulk account import
+Imports N synthetic drivers into a scratch database two ways and reports accounts per
+second and the projected time for 10,000 accounts:
+
+- one by one: hash on the calling thread, one INSERT and commit per account
+  (what create_driver does per form submission)
+- user_import.import_users: hashes across all cores, batched executemany transactions
+
+bcrypt dominates both, so the import scales with cores; the cost factor matters as
+much (each +1 doubles the time).
+
+Usage: python benchmarks/user_import.py [--accounts 500] [--rounds 12] [--workers N]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bcrypt  # noqa: E402
+
+from synthetic_db import SCHEMA  # noqa: E402
+from user_import import import_users  # noqa: E402
+
+PROJECTED_ACCOUNTS = 10_000
+
+
+def build_rows(count, prefix):
+    return [
+        (n + 2, {'username': f'{prefix}{n:05d}', 'password': f'pw-{n:05d}-secret',
+                 'email': f'{prefix}{n:05d}@arielgo.com', 'full_name': f'Driver {n}'})
+        for n in range(count)
+    ]
+
+
+def one_by_one(conn, rows, rounds):
+    """conn is in autocommit mode, so every INSERT is its own transaction"""
+    for _, user in rows:
+        password_hash = bcrypt.hashpw(user['password'].encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+        conn.execute('''
+            INSERT INTO admin_users (username, password_hash, email, full_name, role, is_active)
+            VALUES (?, ?, ?, ?, 'driver', 1)
+        ''', (user['username'], password_hash, user['email'], user['full_name']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk account import')
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Hashing processes')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = {'accounts': args.accounts, 'rounds': args.rounds, 'workers': args.workers}
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'import.db'), isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.executescript(SCHEMA)
+
+        started = time.perf_counter()
+        one_by_one(conn, build_rows(args.accounts, 'serial'), args.rounds)
+        serial = time.perf_counter() - started
+
+        started = time.perf_counter()
+        imported = import_users(conn, build_rows(args.accounts, 'bulk'), workers=args.workers, rounds=args.rounds)
+        bulk = time.perf_counter() - started
+        conn.close()
+
+    for name, elapsed in (('one_by_one', serial), ('import_users', bulk)):
+        results[name] = {
+            'seconds': round(elapsed, 3),
+            'accounts_per_second': round(args.accounts / elapsed, 1),
+            'projected_10k_seconds': round(elapsed / args.accounts * PROJECTED_ACCOUNTS, 1),
+        }
+    results['import_users']['imported'] = imported['imported']
+    results['speedup'] = round(serial / bulk, 2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f'{args.accounts:,} accounts, bcrypt cost {args.rounds}, {args.workers} hashing processes')
+        for name in ('one_by_one', 'import_users'):
+            r = results[name]
+            print(f'  {name:<13} {r["seconds"]:>8.2f} s   {r["accounts_per_second"]:>8.1f} accounts/s'
+                  f'   10k accounts in ~{r["projected_10k_seconds"]:,.0f} s')
+        print(f'  speedup       {results["speedup"]}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Lightweight read-only view over booking rows
+Wraps a sqlite3.Row without copying it and decodes itemsJson only when a template asks for it.
+"""
+import json
+
+# Columns each page actually renders; routes select only these
+DASHBOARD_COLUMNS = (
+    'id, name, service, itemsJson, numberOfBags, totalPrice, status, createdAt'
+)
+LIST_COLUMNS = (
+    'id, name, phone, email, service, itemsJson, numberOfBags, totalPrice, status, '
+    'pickupDate, pickupTime, createdAt'
+)
+DETAIL_COLUMNS = (
+    'b.id, b.name, b.phone, b.email, b.address, b.service, b.itemsJson, b.numberOfBags, '
+    'b.totalPrice, b.status, b.notes, b.pickupDate, b.pickupTime, b.driver_id, '
+    'b.createdAt, b.updatedAt'
+)
+
+_UNSET = object()
+
+
+class BookingView:
+    """
+    Booking row with attribute and item access, like the dicts templates used to get
+    itemsJson is parsed on first access and memoized (None if it is not valid JSON).
+    location names the database the row came from, when the page reads several.
+    """
+    __slots__ = ('_row', '_items', 'location')
+
+    def __init__(self, row, location=None):
+        self._row = row
+        self._items = _UNSET
+        self.location = location
+
+    @property
+    def itemsJson(self):
+        if self._items is _UNSET:
+            raw = self._row['itemsJson']
+            if raw:
+                try:
+                    self._items = json.loads(raw)
+                except (json.JSONDecodeError, TypeError):
+                    self._items = None
+            else:
+                self._items = raw
+        return self._items
+
+    def __getattr__(self, name):
+        try:
+            return self._row[name]
+        except IndexError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key):
+        if key == 'itemsJson':
+            return self.itemsJson
+        try:
+            return self._row[key]
+        except IndexError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self._row.keys()
+
+    def to_dict(self, parse_items=True):
+        """Plain dict copy, for JSON responses; with parse_items=False itemsJson stays the stored text"""
+        booking = dict(zip(self._row.keys(), self._row))
+        if parse_items and 'itemsJson' in booking:
+            booking['itemsJson'] = self.itemsJson
+        return booking
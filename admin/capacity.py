@@ -0,0 +1,314 @@
+"""
+Pickup-slot capacity forecast
+For each upcoming pickup day and pickupTime window, what is already booked next to
+what the same weekday and window averaged over the trailing weeks, and how many
+drivers that takes at the dispatch limits. Slot rows are fetched as plain tuples from
+a covering index, one row per day and slot, and folded into per-window arrays with
+NumPy bincounts.
+
+The trailing-week profile only changes when the day does, so it is cached per day.
+Upcoming bookings are a small index range and are re-read on every call.
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+import archive
+from dispatch import DISPATCH_DRIVER_CAPACITY, DISPATCH_MAX_STOPS_PER_WINDOW, window_start
+
+# Weeks of history averaged per weekday and window
+CAPACITY_TRAILING_WEEKS = int(os.getenv('CAPACITY_TRAILING_WEEKS', '8'))
+# Days ahead to forecast, starting today
+CAPACITY_HORIZON_DAYS = int(os.getenv('CAPACITY_HORIZON_DAYS', '14'))
+MAX_TRAILING_WEEKS = 52
+MAX_HORIZON_DAYS = 56
+# Weekly profiles kept per worker, least recently used dropped first
+CAPACITY_CACHE_PROFILES = 32
+
+# Slots per pickup day: day offset from :start (-1 if pickupDate isn't a date), window,
+# service, bookings and bags. Per-item orders count as one bag, as in dispatch. Grouped
+# in index order, so SQLite hands back one row per slot instead of one per booking.
+SLOT_QUERY = '''
+    SELECT COALESCE(CAST(julianday(substr(pickupDate, 1, 10)) - julianday(:start) AS INTEGER), -1),
+           COALESCE(pickupTime, ''), COALESCE(service, ''),
+           COUNT(*), SUM(MAX(COALESCE(numberOfBags, 0), 1))
+    FROM {table}
+    WHERE pickupDate >= :start AND pickupDate < :end AND COALESCE(status, '') != 'cancelled'
+    GROUP BY pickupDate, pickupTime, service
+'''
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+def _window_order(window):
+    start = window_start(window)
+    return (start is None, start or 0, window)
+
+
+def _codes(values):
+    """(integer code per value, distinct values in code order)"""
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.int64,
+                        count=len(values))
+    return codes, list(index)
+
+
+def fetch_slots(conn, start, days):
+    """
+    Slot rows for the days from start as columns: (day, window, service, bookings, bags)
+    Live and archived bookings are read separately so each stays an index-ordered GROUP BY.
+    """
+    params = {'start': start.isoformat(), 'end': (start + timedelta(days=days)).isoformat()}
+    rows = []
+    for table in ('bookings', archive.ARCHIVE_TABLE) if archive.has_archive(conn) else ('bookings',):
+        cursor = conn.execute(SLOT_QUERY.format(table=table), params)
+        # Plain tuples: building a Row per slot would cost more than the aggregation
+        cursor.row_factory = None
+        rows += cursor.fetchall()
+    if not rows:
+        return ((),) * 5
+    return tuple(zip(*rows))
+
+
+def load_slots(conn, start, days):
+    """
+    Bookings and bags per (day, window, service) for the days from start
+    Returns (windows, services, bookings, bags); the two arrays have shape
+    (days, len(windows), len(services)), windows in time order.
+    """
+    day, window, service, bookings, bags = fetch_slots(conn, start, days)
+    day = np.fromiter(day, dtype=np.int64, count=len(day))
+    valid = (day >= 0) & (day < days)
+
+    window_codes, windows = _codes(window)
+    service_codes, services = _codes(service)
+    # Re-code windows so that code order is time order
+    ordered = sorted(windows, key=_window_order)
+    window_codes = np.array([ordered.index(label) for label in windows], dtype=np.int64)[window_codes]
+
+    shape = (days, len(ordered), len(services))
+    size = days * len(ordered) * len(services)
+    if not size:
+        return ordered, services, np.zeros(shape), np.zeros(shape)
+    flat = np.ravel_multi_index((day[valid], window_codes[valid], service_codes[valid]), shape)
+    totals = [
+        np.bincount(flat, weights=np.fromiter(column, dtype=np.float64, count=len(column))[valid],
+                    minlength=size).reshape(shape)
+        for column in (bookings, bags)
+    ]
+    return ordered, services, totals[0], totals[1]
+
+
+def _align(array, labels, all_labels, axis):
+    """array re-indexed along axis from labels to all_labels (missing labels are zero)"""
+    shape = list(array.shape)
+    shape[axis] = len(all_labels)
+    aligned = np.zeros(shape, dtype=array.dtype)
+    index = [slice(None)] * array.ndim
+    index[axis] = [all_labels.index(label) for label in labels]
+    aligned[tuple(index)] = array
+    return aligned
+
+
+def weekly_profile(conn, today, weeks):
+    """
+    Mean bookings and bags per (weekday, window, service) over the weeks before today
+    Row 0 is today's weekday. Returns (windows, services, bookings, bags).
+    """
+    windows, services, bookings, bags = load_slots(conn, today - timedelta(weeks=weeks), weeks * 7)
+    shape = (weeks, 7, len(windows), len(services))
+    return windows, services, bookings.reshape(shape).mean(axis=0), bags.reshape(shape).mean(axis=0)
+
+
+def drivers_needed(bags, window_bookings, capacity=DISPATCH_DRIVER_CAPACITY,
+                   max_stops=DISPATCH_MAX_STOPS_PER_WINDOW):
+    """Drivers for a day: enough for its bags and for its busiest window's stops"""
+    busiest = max(window_bookings, default=0)
+    return max(math.ceil(bags / capacity - 1e-9), math.ceil(busiest / max_stops - 1e-9), 0)
+
+
+def build_forecast(profile, upcoming, today, days):
+    """Combine a weekly profile and upcoming bookings into the per-day forecast"""
+    p_windows, p_services, p_bookings, p_bags = profile
+    u_windows, u_services, u_bookings, u_bags = upcoming
+    windows = sorted(set(p_windows) | set(u_windows), key=_window_order)
+    services = sorted(set(p_services) | set(u_services))
+
+    def aligned(array, array_windows, array_services):
+        return _align(_align(array, array_windows, windows, 1), array_services, services, 2)
+
+    # Day t's projection is the profile row for its weekday (row 0 = today's weekday)
+    rows = np.arange(days) % 7
+    projected = aligned(p_bookings, p_windows, p_services)[rows]
+    projected_bags = aligned(p_bags, p_windows, p_services)[rows]
+    booked = aligned(u_bookings, u_windows, u_services)
+    booked_bags = aligned(u_bags, u_windows, u_services)
+
+    # Plan for whichever is higher: what the weekday usually brings or what is already in
+    expected = np.maximum(booked.sum(axis=2), projected.sum(axis=2))
+    expected_bags = np.maximum(booked_bags.sum(axis=2), projected_bags.sum(axis=2))
+
+    forecast = []
+    for t in range(days):
+        day = today + timedelta(days=t)
+        forecast.append({
+            'date': day.isoformat(),
+            'weekday': WEEKDAYS[day.weekday()],
+            'booked': {'bookings': int(booked[t].sum()), 'bags': int(booked_bags[t].sum())},
+            'projected': {'bookings': round(float(projected[t].sum()), 1),
+                          'bags': round(float(projected_bags[t].sum()), 1)},
+            'drivers_needed': drivers_needed(float(expected_bags[t].sum()), expected[t].tolist()),
+            'by_service': {
+                service: round(float(projected[t, :, s].sum()), 1) for s, service in enumerate(services)
+            },
+            'slots': [
+                {
+                    'window': window,
+                    'booked': int(booked[t, w].sum()),
+                    'booked_bags': int(booked_bags[t, w].sum()),
+                    'projected': round(float(projected[t, w].sum()), 1),
+                    'projected_bags': round(float(projected_bags[t, w].sum()), 1),
+                }
+                for w, window in enumerate(windows)
+            ],
+        })
+    return windows, forecast
+
+
+def merge_forecasts(results):
+    """
+    build_forecast() results for several locations summed into one (windows, forecast)
+    Drivers don't move between locations, so drivers_needed is the sum of each one's.
+    """
+    windows = sorted({window for location_windows, _ in results for window in location_windows},
+                     key=_window_order)
+    merged = []
+    for days in zip(*(forecast for _, forecast in results)):
+        slots = {window: dict.fromkeys(('booked', 'booked_bags', 'projected', 'projected_bags'), 0)
+                 for window in windows}
+        by_service = {}
+        for day in days:
+            for slot in day['slots']:
+                for key, total in slots[slot['window']].items():
+                    slots[slot['window']][key] = total + slot[key]
+            for service, projected in day['by_service'].items():
+                by_service[service] = by_service.get(service, 0) + projected
+        merged.append({
+            'date': days[0]['date'],
+            'weekday': days[0]['weekday'],
+            'booked': {key: sum(day['booked'][key] for day in days) for key in ('bookings', 'bags')},
+            'projected': {key: round(sum(day['projected'][key] for day in days), 1)
+                          for key in ('bookings', 'bags')},
+            'drivers_needed': sum(day['drivers_needed'] for day in days),
+            'by_service': {service: round(by_service[service], 1) for service in sorted(by_service)},
+            'slots': [
+                {
+                    'window': window,
+                    'booked': slots[window]['booked'],
+                    'booked_bags': slots[window]['booked_bags'],
+                    'projected': round(slots[window]['projected'], 1),
+                    'projected_bags': round(slots[window]['projected_bags'], 1),
+                }
+                for window in windows
+            ],
+        })
+    return windows, merged
+
+
+def forecast_response(start, days, weeks, results):
+    """The capacity forecast body for build_forecast() results, one per location"""
+    windows, forecast = results[0] if len(results) == 1 else merge_forecasts(results)
+    return {
+        'start': start.isoformat(),
+        'days': days,
+        'trailing_weeks': weeks,
+        'driver_capacity': DISPATCH_DRIVER_CAPACITY,
+        'max_stops_per_window': DISPATCH_MAX_STOPS_PER_WINDOW,
+        'windows': windows,
+        'forecast': forecast,
+    }
+
+
+def parse_forecast_args(start=None, days=None, weeks=None):
+    """Validated (start date, days, weeks); raises ValueError with a user-facing message"""
+    try:
+        start = date.fromisoformat(start) if start else date.today()
+    except ValueError:
+        raise ValueError('start must be a date in YYYY-MM-DD format') from None
+    try:
+        days = int(days) if days else CAPACITY_HORIZON_DAYS
+        weeks = int(weeks) if weeks else CAPACITY_TRAILING_WEEKS
+    except ValueError:
+        raise ValueError('days and weeks must be whole numbers') from None
+    if not 1 <= days <= MAX_HORIZON_DAYS:
+        raise ValueError(f'days must be between 1 and {MAX_HORIZON_DAYS}')
+    if not 1 <= weeks <= MAX_TRAILING_WEEKS:
+        raise ValueError(f'weeks must be between 1 and {MAX_TRAILING_WEEKS}')
+    return start, days, weeks
+
+
+class CapacityCache:
+    """
+    Weekly profiles per (location, start, weeks), dropped when the day changes
+    Only profiles starting today or earlier are cached: a later start's trailing weeks
+    include days that can still be booked.
+    """
+
+    def __init__(self, max_profiles=CAPACITY_CACHE_PROFILES):
+        self._lock = threading.Lock()
+        self._day = None
+        self._profiles = OrderedDict()
+        self.max_profiles = max_profiles
+
+        self.hits = 0
+        self.misses = 0
+
+    def profile(self, conn, today, weeks, location=None):
+        key = (location, today, weeks)
+        with self._lock:
+            if self._day != date.today():
+                self._day = date.today()
+                self._profiles.clear()
+            cacheable = today <= self._day
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+                self.hits += 1
+                return profile
+            self.misses += 1
+
+        profile = weekly_profile(conn, today, weeks)
+        if cacheable:
+            with self._lock:
+                self._profiles[key] = profile
+                self._profiles.move_to_end(key)
+                while len(self._profiles) > self.max_profiles:
+                    self._profiles.popitem(last=False)
+        return profile
+
+    def location_forecast(self, conn, start, days, weeks, location=None):
+        """build_forecast() at one location, for arguments already through parse_forecast_args"""
+        profile = self.profile(conn, start, weeks, location)
+        return build_forecast(profile, load_slots(conn, start, days), start, days)
+
+    def forecast(self, conn, start=None, days=None, weeks=None):
+        """The capacity forecast for days from start, projected from the trailing weeks"""
+        start, days, weeks = parse_forecast_args(start, days, weeks)
+        return forecast_response(start, days, weeks, [self.location_forecast(conn, start, days, weeks)])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'profiles': len(self._profiles),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+capacity_cache = CapacityCache()
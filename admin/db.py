@@ -0,0 +1,376 @@
+"""
+SQLite connection management for the admin dashboard
+Long-lived connections are pooled per process and handed out per request via Flask's g
+
+Bookings can be split across per-location database files (ARIELGO_LOCATIONS), one per
+city, each with its own pools. The first location is the primary: it also holds
+admin_users and the admin-only tables, and read-only connections to the other
+locations attach it as "accounts" so their queries can still join driver names.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+from flask import g, has_request_context, request
+
+import metrics
+
+DB_PATH = os.getenv(
+    'ARIELGO_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'database', 'arielgo.db')
+)
+# Per-location databases as "name=path,name=path"; the first is the primary location.
+# Unset, there is a single location, "main", at DB_PATH.
+LOCATIONS_SETTING = os.getenv('ARIELGO_LOCATIONS', '')
+
+# Milliseconds SQLite waits on a locked database before raising "database is locked"
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+# Maximum open connections per pool (one read-write and one read-only pool per process)
+POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))
+# Seconds a request waits for a free pooled connection before giving up
+POOL_TIMEOUT = float(os.getenv('SQLITE_POOL_TIMEOUT', '10'))
+
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Indexes the admin routes depend on (bookings itself is created by server.js)
+BOOKING_INDEXES = [
+    # Keyset pagination of /bookings, newest first
+    'CREATE INDEX IF NOT EXISTS idx_bookings_created ON bookings(createdAt, id)',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_status_created ON bookings(status, createdAt, id)',
+    # Per-driver workload on /drivers
+    'CREATE INDEX IF NOT EXISTS idx_bookings_driver_status_pickup ON bookings(driver_id, status, pickupDate)',
+    # Capacity forecast: covers every column it reads, in GROUP BY order, so a year of
+    # slots is one index range with no sort
+    'CREATE INDEX IF NOT EXISTS idx_bookings_pickup_slot ON bookings(pickupDate, pickupTime, service, status, numberOfBags)',
+]
+# Only the primary location has admin_users
+ACCOUNT_INDEXES = [
+    # Active-driver pickers (ordered by name), the drivers page and the users page
+    'CREATE INDEX IF NOT EXISTS idx_admin_users_role_active ON admin_users(role, is_active, full_name)',
+    'CREATE INDEX IF NOT EXISTS idx_admin_users_role_created ON admin_users(role, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_admin_users_created ON admin_users(created_at)',
+]
+INDEXES = BOOKING_INDEXES + ACCOUNT_INDEXES
+
+_LOCATION_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def parse_locations(value, default_path=DB_PATH):
+    """
+    {name: absolute path} from an ARIELGO_LOCATIONS value, primary first
+    An empty value is the single location "main" at default_path. Raises ValueError
+    for an entry that isn't name=path or a name given twice.
+    """
+    locations = {}
+    for entry in filter(None, (part.strip() for part in value.split(','))):
+        name, sep, path = (part.strip() for part in entry.partition('='))
+        if not sep or not path or not _LOCATION_NAME.match(name):
+            raise ValueError(f'ARIELGO_LOCATIONS entry {entry!r} is not name=path')
+        if name in locations:
+            raise ValueError(f'ARIELGO_LOCATIONS names {name!r} twice')
+        locations[name] = os.path.abspath(path)
+    return locations or {'main': os.path.abspath(default_path)}
+
+
+LOCATIONS = parse_locations(LOCATIONS_SETTING)
+PRIMARY_LOCATION = next(iter(LOCATIONS))
+# Everything that isn't per-location (accounts, CLIs' default --db) uses the primary
+DB_PATH = LOCATIONS[PRIMARY_LOCATION]
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection frees up within POOL_TIMEOUT"""
+
+
+class UnknownLocation(LookupError):
+    """Raised for a location that isn't in LOCATIONS"""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections
+    Idle connections are reused most-recently-released first so hot ones stay warm
+    """
+
+    def __init__(self, db_path, read_only=False, max_size=POOL_SIZE,
+                 busy_timeout_ms=BUSY_TIMEOUT_MS, acquire_timeout=POOL_TIMEOUT, attach=None):
+        self.db_path = os.path.abspath(db_path)
+        self.read_only = read_only
+        # {schema name: path} attached read-only to every read-only connection
+        self.attach = dict(attach or {})
+        self.max_size = max_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._open = 0
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _connect(self):
+        """Open and configure a new connection"""
+        if self.read_only:
+            uri = f'file:{pathname2url(self.db_path)}?mode=ro'
+            conn = sqlite3.connect(
+                uri, uri=True, check_same_thread=False, factory=metrics.InstrumentedConnection
+            )
+            # Only read-only connections attach: BEGIN IMMEDIATE on a writer would lock
+            # every attached file too
+            for name, path in self.attach.items():
+                conn.execute(
+                    f'ATTACH DATABASE ? AS {name}', (f'file:{pathname2url(os.path.abspath(path))}?mode=ro',)
+                )
+        else:
+            conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, factory=metrics.InstrumentedConnection
+            )
+            # WAL lets readers proceed while server.js (or another worker) writes
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def acquire(self):
+        """Take a connection from the pool, opening one if under max_size"""
+        started = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    self.hits += 1
+                    conn = self._idle.pop()
+                    break
+
+                if self._open < self.max_size:
+                    self._open += 1
+                    self.misses += 1
+                    conn = None
+                    break
+
+                if started is None:
+                    started = time.perf_counter()
+                    self.waits += 1
+
+                remaining = self.acquire_timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    self._record_wait(started)
+                    raise PoolTimeout('Timed out waiting for a database connection')
+                self._cond.wait(remaining)
+
+            if started is not None:
+                self._record_wait(started)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+
+        return conn
+
+    def _record_wait(self, started):
+        waited = time.perf_counter() - started
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding it if it is unusable"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on release)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Snapshot of pool usage and lock-wait counters"""
+        with self._cond:
+            requests = self.hits + self.misses
+            return {
+                'mode': 'ro' if self.read_only else 'rw',
+                'max_size': self.max_size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 4) if requests else 0.0,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_time_ms': round(self.wait_time * 1000, 3),
+                'max_wait_ms': round(self.max_wait_time * 1000, 3),
+            }
+
+
+write_pool = ConnectionPool(DB_PATH)
+read_pool = ConnectionPool(DB_PATH, read_only=True)
+
+# (read-write pool, read-only pool) per location
+location_pools = {PRIMARY_LOCATION: (write_pool, read_pool)}
+for _name, _path in LOCATIONS.items():
+    if _name != PRIMARY_LOCATION:
+        location_pools[_name] = (
+            ConnectionPool(_path),
+            ConnectionPool(_path, read_only=True, attach={'accounts': DB_PATH}),
+        )
+
+
+def pools_for(location=None):
+    """(read-write pool, read-only pool) of a location, the primary by default"""
+    try:
+        return location_pools[location or PRIMARY_LOCATION]
+    except KeyError:
+        raise UnknownLocation(location) from None
+
+
+def _connection_keys(location):
+    """g attribute names for a location's (read-only, read-write) request connections"""
+    if location == PRIMARY_LOCATION:
+        return '_db_ro', '_db_rw'
+    return f'_db_ro_{location}', f'_db_rw_{location}'
+
+
+def get_db_connection(readonly=None, location=None):
+    """
+    Get the pooled connection for the current request
+    GET/HEAD requests get a read-only connection unless readonly=False is passed.
+    location picks another location's database (the primary by default). The
+    connection is returned to the pool at teardown, so callers must not close it.
+    """
+    if readonly is None:
+        readonly = has_request_context() and request.method in READ_ONLY_METHODS
+
+    location = location or PRIMARY_LOCATION
+    writer, reader = pools_for(location)
+    ro_key, rw_key = _connection_keys(location)
+
+    # A request that already holds the writer can read through it too
+    if readonly and rw_key in g:
+        return g.get(rw_key)
+
+    key = ro_key if readonly else rw_key
+    conn = g.get(key)
+    if conn is None:
+        conn = (reader if readonly else writer).acquire()
+        # Statements on this connection are now counted against the request
+        conn.recorder = metrics.current()
+        setattr(g, key, conn)
+    return conn
+
+
+def release_db_connections(exc=None):
+    """Teardown hook: hand this request's connections back to their pools"""
+    for location, (writer, reader) in location_pools.items():
+        for key, pool in zip(_connection_keys(location), (reader, writer)):
+            conn = g.pop(key, None)
+            if conn is not None:
+                conn.recorder = None
+                pool.release(conn)
+
+
+def split_statements(script):
+    """Split a schema script into statements, keeping trigger bodies whole"""
+    statements, buffer = [], ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip():
+                statements.append(buffer.strip())
+            buffer = ''
+    return statements
+
+
+_TRIGGER_NAME = re.compile(r'CREATE TRIGGER IF NOT EXISTS (\w+)')
+
+
+def _normalized(sql):
+    """Statement text with whitespace collapsed and no trailing semicolon, for comparison"""
+    return ' '.join(sql.rstrip().rstrip(';').split())
+
+
+def drop_outdated_triggers(conn, statements):
+    """
+    Drop installed triggers whose SQL differs from their CREATE TRIGGER IF NOT EXISTS
+    statement among statements, so running the statements afterwards re-creates them.
+    Returns the names dropped; run it in the installing transaction.
+    """
+    dropped = []
+    for statement in statements:
+        match = _TRIGGER_NAME.match(statement)
+        if not match:
+            continue
+        installed = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (match.group(1),)
+        ).fetchone()
+        if installed is not None and _normalized(installed[0]) != _normalized(
+            statement.replace(' IF NOT EXISTS', '', 1)
+        ):
+            conn.execute(f'DROP TRIGGER {match.group(1)}')
+            dropped.append(match.group(1))
+    return dropped
+
+
+def install_indexes(conn):
+    """Create any missing bookings indexes"""
+    for statement in BOOKING_INDEXES:
+        conn.execute(statement)
+    conn.commit()
+
+
+def install_account_indexes(conn):
+    """Create any missing admin_users indexes (primary location only)"""
+    for statement in ACCOUNT_INDEXES:
+        conn.execute(statement)
+    conn.commit()
+
+
+def pool_stats():
+    """Counters for both pools, and for each other location's pools"""
+    pools = {'read_write': write_pool.stats(), 'read_only': read_pool.stats()}
+    if len(location_pools) > 1:
+        pools['locations'] = {
+            location: {'read_write': writer.stats(), 'read_only': reader.stats()}
+            for location, (writer, reader) in location_pools.items()
+        }
+    return pools
+
+
+def init_app(app):
+    """Register connection teardown on the Flask app"""
+    app.teardown_appcontext(release_db_connections)
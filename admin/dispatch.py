@@ -0,0 +1,237 @@
+"""
+Batch driver dispatch
+Assigns every unassigned booking for a pickup date to the active drivers in one
+greedy pass. Bookings are grouped by address zone, so each driver tends to stay in a
+few zones. Drivers' bag capacity and stops per pickup window are respected, and load
+is spread towards an even share.
+"""
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+# Bags one driver can carry over a day
+DISPATCH_DRIVER_CAPACITY = int(os.getenv('DISPATCH_DRIVER_CAPACITY', '40'))
+# Pickups one driver can make inside a single pickupTime window
+DISPATCH_MAX_STOPS_PER_WINDOW = int(os.getenv('DISPATCH_MAX_STOPS_PER_WINDOW', '6'))
+
+# Bookings still waiting for a pickup
+DISPATCHABLE_STATUSES = ('pending', 'confirmed')
+# Extra cost, in multiples of a fair share of bags, for sending a driver into a new zone
+ZONE_SWITCH_PENALTY = 0.5
+# Extra cost per fair share of bags loaded beyond a driver's fair share
+OVER_SHARE_PENALTY = 2.0
+
+_ZIP = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+_WINDOW_START = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*([AaPp][Mm])?')
+
+
+def address_zone(address):
+    """ZIP code when the address has one after the street, else the city, else 'unknown'"""
+    parts = [part.strip() for part in (address or '').split(',')]
+    for part in reversed(parts[1:]):
+        match = _ZIP.search(part)
+        if match:
+            return f'zip:{match.group(1)}'
+    if len(parts) >= 2 and parts[1]:
+        return f'city:{parts[1].lower()}'
+    return 'unknown'
+
+
+def window_start(pickup_time):
+    """Minutes after midnight a pickupTime window opens, or None if it can't be read"""
+    match = _WINDOW_START.search(pickup_time or '')
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'pm' else 0)
+    return hour * 60 + minute
+
+
+def booking_load(booking):
+    """Bags a booking takes up; per-item orders count as one bag"""
+    return max(1, booking['numberOfBags'] or 0)
+
+
+class DriverRoute:
+    """A driver's share of the plan while it is being built"""
+    __slots__ = ('id', 'name', 'capacity', 'load', 'stops', 'zones', 'window_stops')
+
+    def __init__(self, driver_id, name, capacity):
+        self.id = driver_id
+        self.name = name
+        self.capacity = capacity
+        self.load = 0
+        self.stops = []
+        self.zones = set()
+        self.window_stops = {}
+
+    def to_dict(self):
+        return {
+            'driver_id': self.id,
+            'driver_name': self.name,
+            'bags': self.load,
+            'capacity': self.capacity,
+            'zones': sorted(self.zones),
+            'stops': sorted(self.stops, key=lambda stop: (stop['window_start'] is None, stop['window_start'] or 0)),
+        }
+
+
+def plan_dispatch(bookings, drivers, capacity=DISPATCH_DRIVER_CAPACITY,
+                  max_stops_per_window=DISPATCH_MAX_STOPS_PER_WINDOW):
+    """
+    Balanced assignment of bookings to drivers
+    bookings need id, address, pickupTime and numberOfBags; drivers need id and full_name.
+    Returns {'routes', 'assignments', 'unassigned', 'summary'}.
+    """
+    started = time.perf_counter()
+    routes = [DriverRoute(driver['id'], driver['full_name'], capacity) for driver in drivers]
+
+    jobs = []
+    zone_loads = {}
+    for booking in bookings:
+        zone = address_zone(booking['address'])
+        load = booking_load(booking)
+        start = window_start(booking['pickupTime'])
+        jobs.append((zone, start, booking['pickupTime'] or '', load, booking['id']))
+        zone_loads[zone] = zone_loads.get(zone, 0) + load
+
+    total_load = sum(zone_loads.values())
+    fair_share = max(1.0, total_load / len(routes)) if routes else 1.0
+
+    # Biggest zones first so dense clusters claim drivers before scattered bookings;
+    # within a zone, earliest window and biggest orders first
+    jobs.sort(key=lambda job: (-zone_loads[job[0]], job[0], job[1] is None, job[1] or 0, -job[3]))
+
+    assignments, unassigned = {}, []
+    for zone, start, window, load, booking_id in jobs:
+        best, best_score = None, None
+        for route in routes:
+            if route.load + load > route.capacity:
+                continue
+            if route.window_stops.get(window, 0) >= max_stops_per_window:
+                continue
+
+            after = route.load + load
+            score = after / fair_share
+            if after > fair_share:
+                score += OVER_SHARE_PENALTY * (after - fair_share) / fair_share
+            if zone not in route.zones:
+                # Each extra zone costs more, keeping routes compact
+                score += ZONE_SWITCH_PENALTY * (1 + len(route.zones))
+            if best_score is None or score < best_score:
+                best, best_score = route, score
+
+        if best is None:
+            unassigned.append({
+                'booking_id': booking_id,
+                'zone': zone,
+                'reason': 'no_drivers' if not routes else 'no_capacity',
+            })
+            continue
+
+        best.load += load
+        best.zones.add(zone)
+        best.window_stops[window] = best.window_stops.get(window, 0) + 1
+        best.stops.append({
+            'booking_id': booking_id, 'zone': zone, 'window': window,
+            'window_start': start, 'bags': load,
+        })
+        assignments[booking_id] = best.id
+
+    used = [route for route in routes if route.stops]
+    return {
+        'routes': [route.to_dict() for route in sorted(used, key=lambda route: -route.load)],
+        'assignments': assignments,
+        'unassigned': unassigned,
+        'summary': {
+            'bookings': len(jobs),
+            'assigned': len(assignments),
+            'unassigned': len(unassigned),
+            'drivers': len(routes),
+            'drivers_used': len(used),
+            'zones': len(zone_loads),
+            'total_bags': total_load,
+            'fair_share_bags': round(fair_share, 2),
+            'max_bags': max((route.load for route in used), default=0),
+            'min_bags': min((route.load for route in used), default=0),
+            'capacity': capacity,
+            'max_stops_per_window': max_stops_per_window,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+        },
+    }
+
+
+def parse_pickup_date(value):
+    """Validate a YYYY-MM-DD pickup date; raises ValueError with a user-facing message"""
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        raise ValueError('date must be a pickup date in YYYY-MM-DD format') from None
+
+
+def load_dispatch_inputs(conn, pickup_date, accounts=None):
+    """
+    Unassigned, still-open bookings for pickup_date and every active driver
+    Drivers are read from accounts, the primary location's connection, when conn is another location's.
+    """
+    placeholders = ', '.join('?' * len(DISPATCHABLE_STATUSES))
+    bookings = conn.execute(f'''
+        SELECT id, address, pickupTime, numberOfBags
+        FROM bookings
+        WHERE pickupDate = ? AND driver_id IS NULL AND status IN ({placeholders})
+        ORDER BY id
+    ''', (pickup_date, *DISPATCHABLE_STATUSES)).fetchall()
+
+    drivers = (accounts or conn).execute('''
+        SELECT id, full_name
+        FROM admin_users
+        WHERE role = 'driver' AND is_active = 1
+        ORDER BY id
+    ''').fetchall()
+    return bookings, drivers
+
+
+def apply_dispatch(conn, assignments, pickup_date, accounts=None):
+    """
+    Write {booking_id: driver_id} in one transaction
+    Only bookings that would still be planned for pickup_date (unassigned, dispatchable
+    status, that pickup date) are touched, so a plan that went stale never overrides a
+    manual assignment or assigns a booking cancelled or completed since; those are
+    reported as 'skipped'. Drivers are checked against accounts when given, as in
+    load_dispatch_inputs. Returns {booking_id: result}.
+    """
+    results = {}
+    updated_at = datetime.now().isoformat()
+    statuses = ', '.join('?' * len(DISPATCHABLE_STATUSES))
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        driver_ids = sorted(set(assignments.values()))
+        active = set()
+        if driver_ids:
+            placeholders = ', '.join('?' * len(driver_ids))
+            active = {
+                row[0] for row in (accounts or conn).execute(f'''
+                    SELECT id FROM admin_users
+                    WHERE role = 'driver' AND is_active = 1 AND id IN ({placeholders})
+                ''', driver_ids)
+            }
+
+        for booking_id, driver_id in assignments.items():
+            if driver_id not in active:
+                results[str(booking_id)] = 'invalid_driver'
+                continue
+            cursor = conn.execute(f'''
+                UPDATE bookings SET driver_id = ?, updatedAt = ?
+                WHERE id = ? AND driver_id IS NULL AND pickupDate = ? AND status IN ({statuses})
+            ''', (driver_id, updated_at, booking_id, pickup_date, *DISPATCHABLE_STATUSES))
+            results[str(booking_id)] = 'assigned' if cursor.rowcount else 'skipped'
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    return results
@@ -0,0 +1,129 @@
+"""
+Version-based ETags for read-heavy pages
+A page's ETag is built from cheap change markers instead of its content: the latest
+booking_changes seq (bumped by triggers on every booking write, including the Node
+server's) and an admin_users version kept by triggers here. With several locations,
+every location's booking seq is part of it. When the browser's
+If-None-Match still matches, the view is skipped entirely, so neither its queries
+nor its template run.
+"""
+import hashlib
+from functools import wraps
+
+from flask import g, make_response, request, session
+from flask_login import current_user
+
+import audit
+import db
+import shards
+from db import get_db_connection, split_statements
+
+VERSIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS change_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_change_versions_admin_users_insert
+    AFTER INSERT ON admin_users
+    BEGIN
+        INSERT INTO change_versions (name, version) VALUES ('admin_users', 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_change_versions_admin_users_update
+    AFTER UPDATE ON admin_users
+    BEGIN
+        INSERT INTO change_versions (name, version) VALUES ('admin_users', 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_change_versions_admin_users_delete
+    AFTER DELETE ON admin_users
+    BEGIN
+        INSERT INTO change_versions (name, version) VALUES ('admin_users', 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1;
+    END;
+'''
+
+
+def install_etags(conn):
+    """Create the change_versions table and its admin_users triggers"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        for statement in split_statements(VERSIONS_SCHEMA):
+            conn.execute(statement)
+
+
+SEQ_QUERY = 'SELECT COALESCE(MAX(seq), 0) FROM booking_changes'
+
+
+def data_versions(conn):
+    """(latest booking change seq, admin_users version) in one statement"""
+    return tuple(conn.execute('''
+        SELECT (SELECT COALESCE(MAX(seq), 0) FROM booking_changes),
+               (SELECT COALESCE(MAX(version), 0) FROM change_versions WHERE name = 'admin_users')
+    ''').fetchone())
+
+
+def request_versions(conn):
+    """data_versions(), read once per request"""
+    versions = g.get('_data_versions')
+    if versions is None:
+        versions = data_versions(conn)
+        if len(db.LOCATIONS) > 1:
+            # A write at any location moves the combined pages on
+            seqs = tuple(
+                get_db_connection(location=location).execute(SEQ_QUERY).fetchone()[0]
+                for location in db.LOCATIONS if location != db.PRIMARY_LOCATION
+            )
+            versions = ((versions[0], *seqs), versions[1])
+        g._data_versions = versions
+    return versions
+
+
+def booking_row_marker(conn, booking_id, **kwargs):
+    """A single booking's current values and latest audit event, for pages that show only that booking"""
+    conn = get_db_connection(location=shards.request_location())
+    row = conn.execute('SELECT * FROM bookings WHERE id = ?', (booking_id,)).fetchone()
+    return (tuple(row) if row is not None else None, audit.latest_event_id(conn, 'booking', booking_id))
+
+
+def compute_etag(conn, marker=None, **view_args):
+    """
+    ETag for the current request
+    Covers the URL, the logged-in user (the navbar shows their name) and either the
+    global booking seq or, with marker set, marker(conn, **view_args) instead.
+    """
+    bookings_version, users_version = request_versions(conn)
+    parts = [request.endpoint, request.full_path, current_user.get_id(), users_version]
+    parts.append(marker(conn, **view_args) if marker else bookings_version)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+
+
+def conditional(marker=None):
+    """
+    Answer GET/HEAD with 304 Not Modified while the page's markers are unchanged
+    Pages about to show flashed messages are always rendered, since the flash is
+    consumed by that render and the cached copy wouldn't have it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            etag = compute_etag(get_db_connection(), marker, **kwargs)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            # Cache privately but revalidate every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,193 @@
+"""
+Streaming CSV / NDJSON export of bookings
+Rows are pulled from SQLite in fetchmany batches and encoded a batch at a time, so
+memory stays flat however many bookings match and the download starts immediately.
+With several locations, each row is exported next to its location and the
+locations' oldest-first streams are merged on createdAt.
+"""
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from archive import ARCHIVE_TABLE
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+# Rows fetched from SQLite and encoded per chunk
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    'id', 'name', 'phone', 'email', 'address', 'service', 'status',
+    'pickupDate', 'pickupTime', 'numberOfBags', 'pricePerBag', 'totalPrice',
+    'paymentStatus', 'driver_id', 'notes', 'itemsJson', 'createdAt', 'updatedAt',
+]
+# Extra CSV columns when itemsJson is expanded to one line per item
+ITEM_COLUMNS = ['item', 'item_name', 'item_quantity', 'item_price', 'item_total']
+# Text cells starting with a formula character are quoted with a leading ' so a
+# spreadsheet shows them as text instead of evaluating them
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parse_date_range(start=None, end=None):
+    """
+    Validate optional YYYY-MM-DD bounds (inclusive) on createdAt
+    Returns (start, end_exclusive) strings; raises ValueError with a user-facing message.
+    """
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+    except ValueError:
+        raise ValueError('start and end must be dates in YYYY-MM-DD format') from None
+
+    if start_date and end_date and start_date > end_date:
+        raise ValueError('start must not be after end')
+    return (
+        start_date.isoformat() if start_date else None,
+        (end_date + timedelta(days=1)).isoformat() if end_date else None,
+    )
+
+
+def export_query(status_filter='all', start=None, end_exclusive=None, include_archived=False):
+    """
+    Oldest-first bookings query for the given filters, walking idx_bookings_created
+    With include_archived, bookings_archive is merged in on the same index order.
+    """
+    clauses, params = [], []
+    if status_filter != 'all':
+        clauses.append('status = ?')
+        params.append(status_filter)
+    if start:
+        clauses.append('createdAt >= ?')
+        params.append(start)
+    if end_exclusive:
+        clauses.append('createdAt < ?')
+        params.append(end_exclusive)
+
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+    sql = f'SELECT {", ".join(EXPORT_COLUMNS)} FROM bookings{where}'
+    if include_archived:
+        sql += f' UNION ALL SELECT {", ".join(EXPORT_COLUMNS)} FROM {ARCHIVE_TABLE}{where}'
+        params = params * 2
+    return sql + ' ORDER BY createdAt, id', params
+
+
+def iter_batches(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """Lists of rows from cursor, batch_size at a time"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _tagged(cursor, rank, location):
+    for row in cursor:
+        yield (row['createdAt'] or '', rank, row['id']), location, row
+
+
+def merge_batches(cursors, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Lists of (location, row) from oldest-first cursors ({location: cursor}), batch_size
+    at a time, merged on (createdAt, location order, id)
+    """
+    runs = [_tagged(cursor, rank, location) for rank, (location, cursor) in enumerate(cursors.items())]
+    batch = []
+    for _, location, row in heapq.merge(*runs, key=lambda item: item[0]):
+        batch.append((location, row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _parse_items(raw):
+    if not raw:
+        return []
+    try:
+        items = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return items if isinstance(items, list) else []
+
+
+def _csv_text(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_row(row):
+    return [_csv_text(value) for value in row]
+
+
+def csv_chunks(batches, expand_items=False, located=False):
+    """
+    CSV text, one chunk per batch, header first
+    Text cells that a spreadsheet would read as a formula are prefixed with '.
+    Items that aren't JSON objects are skipped. With located, batches hold
+    (location, row) pairs and location is the first column.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow((['location'] if located else []) + EXPORT_COLUMNS + (ITEM_COLUMNS if expand_items else []))
+    yield buffer.getvalue()
+
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            if located:
+                location, row = row
+                values = [location] + _csv_row(row)
+            else:
+                values = _csv_row(row)
+            if not expand_items:
+                writer.writerow(values)
+                continue
+
+            items = [item for item in _parse_items(row['itemsJson']) if isinstance(item, dict)]
+            if not items:
+                writer.writerow(values + [''] * len(ITEM_COLUMNS))
+            for item in items:
+                writer.writerow(values + [
+                    _csv_text(item.get('item', '')),
+                    _csv_text(item.get('name', '')),
+                    _csv_text(item.get('quantity', '')),
+                    _csv_text(item.get('pricePerItem', '')),
+                    _csv_text(item.get('total', '')),
+                ])
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(batches, expand_items=False, located=False):
+    """
+    One JSON object per line, one chunk per batch; expanded items become a nested list
+    With located, batches hold (location, row) pairs and each object gets a location key.
+    """
+    keys = EXPORT_COLUMNS
+    for rows in batches:
+        lines = []
+        for row in rows:
+            if located:
+                location, row = row
+                booking = {'location': location, **dict(zip(keys, row))}
+            else:
+                booking = dict(zip(keys, row))
+            if expand_items:
+                booking['itemsJson'] = _parse_items(booking['itemsJson'])
+            lines.append(json.dumps(booking, separators=(',', ':')))
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a text stream on the fly as one gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
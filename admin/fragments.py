@@ -0,0 +1,132 @@
+"""
+Rendered-fragment cache for the dashboard's booking table
+Templates wrap a block in {% call cached_fragment(name, *key) %}; the rendered HTML is
+kept under (name, key, data version) in a byte-bounded LRU. The data version is the
+booking_changes seq and admin_users version, so any write from any process moves
+pages on to fresh keys; admin writes also clear the cache so dead entries don't
+linger. Views hand the templates Deferred rows, so a hit runs none of the block's queries.
+A call block renders its whole body before returning it, so streamed pages such as
+/bookings don't use the cache.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+import etags
+from db import get_db_connection
+
+FRAGMENT_CACHE_MAX_BYTES = int(os.getenv('FRAGMENT_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+# Fragments bigger than this share of the cache are rendered but not kept
+MAX_FRAGMENT_SHARE = 0.25
+
+
+class Deferred:
+    """Template data loaded on first use, so a cached fragment never triggers its query"""
+    __slots__ = ('_load', '_value', '_loaded')
+
+    def __init__(self, load):
+        self._load = load
+        self._value = None
+        self._loaded = False
+
+    def _get(self):
+        if not self._loaded:
+            self._value = self._load()
+            self._loaded = True
+        return self._value
+
+    def __bool__(self):
+        return bool(self._get())
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+class FragmentCache:
+    """LRU of rendered HTML bounded by total size in bytes"""
+
+    def __init__(self, max_bytes=FRAGMENT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.oversized = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes * MAX_FRAGMENT_SHARE:
+            with self._lock:
+                self.oversized += 1
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (html, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+                self._bytes = 0
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'oversized': self.oversized,
+                'invalidations': self.invalidations,
+            }
+
+
+fragment_cache = FragmentCache()
+
+
+def cached_fragment(name, *key, caller):
+    """
+    Jinja call-block helper: {% call cached_fragment('name', filter, ...) %}...{% endcall %}
+    Everything the block renders must be determined by name, key and the data version.
+    """
+    full_key = (name, key, etags.request_versions(get_db_connection()))
+    html = fragment_cache.get(full_key)
+    if html is None:
+        html = str(caller())
+        fragment_cache.set(full_key, html)
+    return Markup(html)
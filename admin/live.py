@@ -0,0 +1,273 @@
+"""
+Live dashboard updates over Server-Sent Events
+Served from the ASGI tier (async_api.py), where an open stream is a coroutine; the
+Flask /api/live route holds a worker thread per stream, so it takes at most
+LIVE_MAX_STREAMS of them and is meant for development.
+Triggers append every booking insert, update and delete to booking_changes. One
+poller thread per worker tails that log at each location from its last seen seq and
+fans each delta out to every connected browser watching the location, so N open
+dashboards cost one query per location per tick.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+
+import db
+import stats
+from archive import ARCHIVE_GUARD, ARCHIVE_GUARD_SCHEMA
+from db import drop_outdated_triggers, split_statements
+
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '2'))
+# Streams the Flask route serves per worker; keep it below gunicorn's --threads
+LIVE_MAX_STREAMS = int(os.getenv('LIVE_MAX_STREAMS', '4'))
+# Where dashboards open the stream; production points it at the async tier,
+# /async/api/live (empty: the Flask route)
+LIVE_STREAM_URL = os.getenv('LIVE_STREAM_URL', '')
+# Seconds between keep-alive comments on an idle stream
+LIVE_HEARTBEAT = 15
+# Events buffered per browser before it is considered too slow and dropped
+SUBSCRIBER_BUFFER = 256
+# Changes read per poll; a bigger backlog is drained over the following ticks
+BATCH_SIZE = 500
+
+FEED_SCHEMA = ARCHIVE_GUARD_SCHEMA + f'''
+    CREATE TABLE IF NOT EXISTS booking_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        booking_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_booking_changes_insert
+    AFTER INSERT ON bookings
+    BEGIN
+        INSERT INTO booking_changes (booking_id, kind) VALUES (NEW.id, 'created');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_booking_changes_update
+    AFTER UPDATE ON bookings
+    BEGIN
+        INSERT INTO booking_changes (booking_id, kind) VALUES (
+            NEW.id,
+            CASE
+                WHEN OLD.status IS NOT NEW.status THEN 'status'
+                WHEN OLD.driver_id IS NOT NEW.driver_id THEN 'driver'
+                ELSE 'updated'
+            END
+        );
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_booking_changes_delete
+    AFTER DELETE ON bookings
+    {ARCHIVE_GUARD}
+    BEGIN
+        INSERT INTO booking_changes (booking_id, kind) VALUES (OLD.id, 'deleted');
+    END;
+
+    -- Keep roughly the last 10k changes
+    CREATE TRIGGER IF NOT EXISTS trg_booking_changes_prune
+    AFTER INSERT ON booking_changes
+    WHEN NEW.seq % 1000 = 0
+    BEGIN
+        DELETE FROM booking_changes WHERE seq <= NEW.seq - 10000;
+    END;
+'''
+
+CHANGES_QUERY = '''
+    SELECT c.seq, c.kind, c.booking_id AS id,
+           b.name, b.service, b.status, b.driver_id, b.itemsJson, b.numberOfBags,
+           b.totalPrice, b.pickupDate, b.pickupTime, b.createdAt, b.updatedAt,
+           u.full_name AS driver_name
+    FROM booking_changes c
+    LEFT JOIN bookings b ON b.id = c.booking_id
+    LEFT JOIN admin_users u ON u.id = b.driver_id
+    WHERE c.seq > ?
+    ORDER BY c.seq
+    LIMIT ?
+'''
+
+
+def install_feed(conn):
+    """Create the change log and its triggers"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        statements = split_statements(FEED_SCHEMA)
+        drop_outdated_triggers(conn, statements)
+        for statement in statements:
+            conn.execute(statement)
+
+
+class FeedFull(Exception):
+    """Raised when a subscriber limit passed to ChangeFeed.subscribe is reached"""
+
+
+def format_event(event, data, event_id=None):
+    """Encode one SSE message"""
+    message = f'event: {event}\n'
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    return message + f'data: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class ChangeFeed:
+    """
+    Shared poller that tails every location's booking_changes and broadcasts to
+    subscriber queues. Each subscriber watches a set of locations: it gets their
+    booking events, tagged with the location, and their totals summed.
+    """
+
+    def __init__(self, poll_interval=LIVE_POLL_INTERVAL, locations=None):
+        self.poll_interval = poll_interval
+        self.locations = list(locations or db.LOCATIONS)
+
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._thread = None
+        self._stop = threading.Event()
+        # Per location: high-water mark and latest totals
+        self.last_seq = {}
+        self._stats = {}
+
+        self.polls = 0
+        self.events = 0
+        self.dropped = 0
+
+    def subscribe(self, locations=None, subscription=None, limit=None):
+        """
+        Register a browser watching locations (all of them by default); starts the poller if it is the first one
+        subscription is anything with put_nowait/get_nowait (a bounded queue.Queue by
+        default). Raises FeedFull when limit subscribers are already registered.
+        """
+        if subscription is None:
+            subscription = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                raise FeedFull(f'{limit} live streams already open')
+            self._subscribers[subscription] = frozenset(locations or self.locations)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name='booking-change-feed', daemon=True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.pop(subscription, None)
+
+    def _run(self):
+        while True:
+            for location in self.locations:
+                try:
+                    self.poll(location)
+                except sqlite3.Error:
+                    # Locked or briefly unavailable; try again next tick
+                    pass
+
+            if self._stop.wait(self.poll_interval):
+                return
+            with self._lock:
+                if not self._subscribers:
+                    # Last browser left; the next subscribe starts from the head again
+                    self._thread = None
+                    self.last_seq = {}
+                    self._stats = {}
+                    return
+
+    def poll(self, location=None):
+        """Read one location's changes past its high-water mark and broadcast them"""
+        location = location or db.PRIMARY_LOCATION
+        pool = db.pools_for(location)[1]
+        conn = pool.acquire()
+        try:
+            last_seq = self.last_seq.get(location)
+            if last_seq is None:
+                self._stats[location] = stats.read_stats(conn)
+                self.last_seq[location] = conn.execute(
+                    'SELECT COALESCE(MAX(seq), 0) FROM booking_changes'
+                ).fetchone()[0]
+                return
+
+            rows = conn.execute(CHANGES_QUERY, (last_seq, BATCH_SIZE)).fetchall()
+            self.polls += 1
+            if not rows:
+                return
+
+            # Booking ids and seqs repeat across locations, so event ids carry the location
+            single = len(self.locations) == 1
+            messages = [
+                format_event('booking', {
+                    'kind': row['kind'],
+                    'location': location,
+                    'booking': {key: row[key] for key in row.keys() if key not in ('seq', 'kind')},
+                }, row['seq'] if single else f'{location}:{row["seq"]}')
+                for row in rows
+            ]
+            self._stats[location] = stats.read_stats(conn)
+            self.last_seq[location] = rows[-1]['seq']
+        finally:
+            pool.release(conn)
+
+        self.events += len(rows)
+        self._broadcast(location, messages)
+
+    def _broadcast(self, location, messages):
+        with self._lock:
+            subscribers = [
+                (subscription, locations) for subscription, locations in self._subscribers.items()
+                if location in locations
+            ]
+
+        for subscription, locations in subscribers:
+            totals = stats.sum_stats(self._stats[name] for name in locations if name in self._stats)
+            try:
+                for message in messages + [format_event('stats', totals)]:
+                    subscription.put_nowait(message)
+            except queue.Full:
+                # Slow client: cut it loose rather than buffer without bound
+                self.unsubscribe(subscription)
+                self.dropped += 1
+                while True:
+                    try:
+                        subscription.get_nowait()
+                    except queue.Empty:
+                        break
+                subscription.put_nowait(None)
+
+    def stream(self, subscription, initial=()):
+        """Generator of SSE text for one browser"""
+        try:
+            yield f'retry: {int(self.poll_interval * 1000) * 2}\n\n'
+            yield from initial
+            while True:
+                try:
+                    message = subscription.get(timeout=LIVE_HEARTBEAT)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'poller_running': self._thread is not None and self._thread.is_alive(),
+                'poll_interval': self.poll_interval,
+                'last_seq': dict(self.last_seq),
+                'polls': self.polls,
+                'events': self.events,
+                'dropped_subscribers': self.dropped,
+            }
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Per-driver daily manifests with ordered stops
+Stops are ordered window by window with a nearest-neighbour tour improved by 2-opt,
+using coordinates from the local geocode_cache table (never a network call). Finished
+manifests are stored in driver_manifests and dropped by triggers when a booking's
+driver, status, pickup slot or any detail shown on a stop changes.
+
+Usage:
+    python manifests.py precompute --date 2025-03-14
+    python manifests.py import-geocodes geocodes.csv   # address,latitude,longitude
+    python manifests.py missing-geocodes > todo.csv
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from booking_view import BookingView
+from db import DB_PATH, drop_outdated_triggers, split_statements
+from dispatch import parse_pickup_date, window_start
+
+# Optional "lat,lng" every route starts from (e.g. the laundry); unset starts at the first pickup
+ROUTE_DEPOT = os.getenv('ROUTE_DEPOT')
+# Bookings that don't appear on a manifest
+EXCLUDED_STATUSES = ('cancelled',)
+# Upper bound on 2-opt improvement passes per window
+MAX_TWO_OPT_PASSES = 50
+
+MANIFEST_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        address_key TEXT PRIMARY KEY,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        source TEXT,
+        updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS driver_manifests (
+        driver_id INTEGER NOT NULL,
+        pickup_date TEXT NOT NULL,
+        manifest_json TEXT NOT NULL,
+        generated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (driver_id, pickup_date)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_bookings_driver_pickup ON bookings(driver_id, pickupDate);
+
+    CREATE TRIGGER IF NOT EXISTS trg_driver_manifests_insert
+    AFTER INSERT ON bookings
+    WHEN NEW.driver_id IS NOT NULL
+    BEGIN
+        DELETE FROM driver_manifests
+        WHERE driver_id = NEW.driver_id AND pickup_date = NEW.pickupDate;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_driver_manifests_update
+    AFTER UPDATE OF driver_id, status, address, pickupDate, pickupTime,
+                    name, phone, service, numberOfBags, itemsJson, notes ON bookings
+    BEGIN
+        DELETE FROM driver_manifests
+        WHERE (driver_id = OLD.driver_id AND pickup_date = OLD.pickupDate)
+           OR (driver_id = NEW.driver_id AND pickup_date = NEW.pickupDate);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_driver_manifests_delete
+    AFTER DELETE ON bookings
+    WHEN OLD.driver_id IS NOT NULL
+    BEGIN
+        DELETE FROM driver_manifests
+        WHERE driver_id = OLD.driver_id AND pickup_date = OLD.pickupDate;
+    END;
+'''
+
+_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'boulevard': 'blvd', 'drive': 'dr',
+    'lane': 'ln', 'court': 'ct', 'place': 'pl', 'highway': 'hwy', 'parkway': 'pkwy',
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+    'northeast': 'ne', 'northwest': 'nw', 'southeast': 'se', 'southwest': 'sw',
+    'apartment': 'apt', 'suite': 'ste', 'washington': 'wa',
+}
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize_address(address):
+    """Cache key for an address: lowercase words, punctuation dropped, common abbreviations"""
+    words = _NON_WORD.sub(' ', (address or '').lower()).split()
+    return ' '.join(_ABBREVIATIONS.get(word, word) for word in words)
+
+
+def install_manifests(conn):
+    """
+    Create the geocode cache, manifest cache and invalidation triggers
+    An update trigger from an older schema is replaced, and the manifests it may have
+    left stale are dropped.
+    """
+    statements = split_statements(MANIFEST_SCHEMA)
+    update_trigger = next(s for s in statements if 'trg_driver_manifests_update' in s)
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        outdated = drop_outdated_triggers(conn, [update_trigger])
+        for statement in statements:
+            conn.execute(statement)
+        if outdated:
+            conn.execute('DELETE FROM driver_manifests')
+
+
+def haversine_km(a, b):
+    lat1, lng1 = map(math.radians, a)
+    lat2, lng2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 12742 * math.asin(math.sqrt(h))
+
+
+def path_km(points, start=None):
+    """Length of an open path, optionally from a fixed start point"""
+    legs = ([start] if start else []) + points
+    return sum(haversine_km(legs[i], legs[i + 1]) for i in range(len(legs) - 1))
+
+
+def nearest_neighbour(points, start=None):
+    """Visit order (indexes into points) always moving to the closest unvisited point"""
+    if not points:
+        return []
+    if start is None:
+        order, position = [0], points[0]
+    else:
+        order, position = [], start
+
+    remaining = set(range(len(points))) - set(order)
+    while remaining:
+        nearest = min(remaining, key=lambda i: haversine_km(position, points[i]))
+        remaining.discard(nearest)
+        order.append(nearest)
+        position = points[nearest]
+    return order
+
+
+def two_opt(points, order, start=None):
+    """Reverse segments of an open path for as long as that shortens it"""
+    route = [points[i] for i in order]
+    order = list(order)
+
+    for _ in range(MAX_TWO_OPT_PASSES):
+        improved = False
+        for i in range(len(route) - 1):
+            before = start if i == 0 else route[i - 1]
+            for j in range(i + 1, len(route)):
+                # Swap legs before->i and j->after for before->j and i->after
+                removed = added = 0.0
+                if before is not None:
+                    removed += haversine_km(before, route[i])
+                    added += haversine_km(before, route[j])
+                if j + 1 < len(route):
+                    removed += haversine_km(route[j], route[j + 1])
+                    added += haversine_km(route[i], route[j + 1])
+                if added + 1e-9 < removed:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+def order_stops(stops, depot=None):
+    """
+    Sequence a driver's stops for the day
+    Windows are visited in time order; inside each, located stops follow a
+    nearest-neighbour + 2-opt path that starts where the previous window ended.
+    Stops without cached coordinates go last in their window.
+    Returns (ordered stops, nearest-neighbour km, final km).
+    """
+    windows = {}
+    for stop in stops:
+        windows.setdefault(stop['pickupTime'] or '', []).append(stop)
+
+    ordered, position = [], depot
+    nn_km = final_km = 0.0
+    for window in sorted(windows, key=lambda w: (window_start(w) is None, window_start(w) or 0, w)):
+        located = [stop for stop in windows[window] if stop['latitude'] is not None]
+        unlocated = [stop for stop in windows[window] if stop['latitude'] is None]
+
+        points = [(stop['latitude'], stop['longitude']) for stop in located]
+        order = nearest_neighbour(points, position)
+        nn_km += path_km([points[i] for i in order], position)
+        order = two_opt(points, order, position)
+        final_km += path_km([points[i] for i in order], position)
+
+        ordered.extend(located[i] for i in order)
+        ordered.extend(unlocated)
+        if order:
+            position = points[order[-1]]
+
+    return ordered, nn_km, final_km
+
+
+def _depot():
+    if not ROUTE_DEPOT:
+        return None
+    try:
+        latitude, longitude = (float(part) for part in ROUTE_DEPOT.split(','))
+    except ValueError:
+        return None
+    return latitude, longitude
+
+
+def _item_count(row):
+    """Items in a per-item order; 0 when itemsJson is empty or not a valid JSON list"""
+    items = BookingView(row).itemsJson
+    return len(items) if isinstance(items, list) else 0
+
+
+def build_manifest(conn, driver_id, pickup_date, depot=None):
+    """Compute one driver's manifest for pickup_date from bookings and geocode_cache"""
+    started = time.perf_counter()
+    placeholders = ', '.join('?' * len(EXCLUDED_STATUSES))
+    rows = conn.execute(f'''
+        SELECT id, name, phone, address, service, numberOfBags, itemsJson, status,
+               pickupTime, notes
+        FROM bookings
+        WHERE driver_id = ? AND pickupDate = ? AND COALESCE(status, '') NOT IN ({placeholders})
+        ORDER BY id
+    ''', (driver_id, pickup_date, *EXCLUDED_STATUSES)).fetchall()
+
+    keys = {row['id']: normalize_address(row['address']) for row in rows}
+    coordinates = {}
+    unique_keys = sorted(set(keys.values()))
+    # Chunked to stay under SQLite's bound-variable limit
+    for offset in range(0, len(unique_keys), 500):
+        chunk = unique_keys[offset:offset + 500]
+        for key, latitude, longitude in conn.execute(f'''
+            SELECT address_key, latitude, longitude FROM geocode_cache
+            WHERE address_key IN ({', '.join('?' * len(chunk))})
+        ''', chunk):
+            coordinates[key] = (latitude, longitude)
+
+    stops = []
+    for row in rows:
+        latitude, longitude = coordinates.get(keys[row['id']], (None, None))
+        stops.append({
+            'booking_id': row['id'],
+            'name': row['name'],
+            'phone': row['phone'],
+            'address': row['address'],
+            'service': row['service'],
+            'numberOfBags': row['numberOfBags'],
+            'items': _item_count(row),
+            'status': row['status'],
+            'pickupTime': row['pickupTime'],
+            'notes': row['notes'],
+            'latitude': latitude,
+            'longitude': longitude,
+        })
+
+    start = depot if depot is not None else _depot()
+    ordered, nn_km, final_km = order_stops(stops, start)
+
+    previous = start
+    for sequence, stop in enumerate(ordered, 1):
+        stop['sequence'] = sequence
+        here = (stop['latitude'], stop['longitude']) if stop['latitude'] is not None else None
+        stop['leg_km'] = round(haversine_km(previous, here), 3) if previous and here else None
+        if here:
+            previous = here
+
+    return {
+        'driver_id': driver_id,
+        'date': pickup_date,
+        'stops': ordered,
+        'stop_count': len(ordered),
+        'unlocated_stops': sum(1 for stop in ordered if stop['latitude'] is None),
+        'total_km': round(final_km, 3),
+        'nearest_neighbour_km': round(nn_km, 3),
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'compute_ms': round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def get_manifest(read_conn, write_conn_factory, driver_id, pickup_date):
+    """
+    Cached manifest, computing and storing it on a miss
+    write_conn_factory is only called on a miss, so cache hits stay read-only.
+    Returns (manifest, cache_hit).
+    """
+    row = read_conn.execute(
+        'SELECT manifest_json FROM driver_manifests WHERE driver_id = ? AND pickup_date = ?',
+        (driver_id, pickup_date)
+    ).fetchone()
+    if row is not None:
+        return json.loads(row[0]), True
+
+    conn = write_conn_factory()
+    # Built under the write lock so no booking change lands between reading and caching
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        manifest = build_manifest(conn, driver_id, pickup_date)
+        _store(conn, manifest)
+    return manifest, False
+
+
+def _store(conn, manifest):
+    conn.execute('''
+        INSERT OR REPLACE INTO driver_manifests (driver_id, pickup_date, manifest_json, generated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (manifest['driver_id'], manifest['date'], json.dumps(manifest, separators=(',', ':'))))
+
+
+def precompute_manifests(conn, pickup_date):
+    """Build and store every assigned driver's manifest for pickup_date; returns the manifests"""
+    manifests = []
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        driver_ids = [row[0] for row in conn.execute('''
+            SELECT DISTINCT driver_id FROM bookings
+            WHERE pickupDate = ? AND driver_id IS NOT NULL
+            ORDER BY driver_id
+        ''', (pickup_date,))]
+
+        conn.execute('DELETE FROM driver_manifests WHERE pickup_date = ?', (pickup_date,))
+        for driver_id in driver_ids:
+            manifest = build_manifest(conn, driver_id, pickup_date)
+            _store(conn, manifest)
+            manifests.append(manifest)
+    return manifests
+
+
+def import_geocodes(conn, rows, source='import'):
+    """
+    Upsert (address, latitude, longitude) rows into geocode_cache
+    Cached manifests are cleared since stop order may change. Returns the row count.
+    """
+    entries = [
+        (normalize_address(address), float(latitude), float(longitude), source)
+        for address, latitude, longitude in rows
+    ]
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('''
+            INSERT INTO geocode_cache (address_key, latitude, longitude, source, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(address_key) DO UPDATE SET
+                latitude = excluded.latitude,
+                longitude = excluded.longitude,
+                source = excluded.source,
+                updated_at = excluded.updated_at
+        ''', entries)
+        conn.execute('DELETE FROM driver_manifests')
+    return len(entries)
+
+
+def missing_geocodes(conn, since=None):
+    """Booking addresses with no geocode_cache entry, one per normalized key"""
+    cached = {row[0] for row in conn.execute('SELECT address_key FROM geocode_cache')}
+    sql = 'SELECT DISTINCT address FROM bookings'
+    params = ()
+    if since:
+        sql += ' WHERE pickupDate >= ?'
+        params = (since,)
+
+    seen = set()
+    for (address,) in conn.execute(sql, params):
+        key = normalize_address(address)
+        if key and key not in cached and key not in seen:
+            seen.add(key)
+            yield address
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Driver manifests and the geocode cache')
+    parser.add_argument('--db', default=DB_PATH, help='Path to arielgo.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    precompute = commands.add_parser('precompute', help="Build every driver's manifest for a date")
+    precompute.add_argument('--date', required=True, help='Pickup date, YYYY-MM-DD')
+
+    importer = commands.add_parser('import-geocodes', help='Load address,latitude,longitude CSV rows')
+    importer.add_argument('csv_file')
+    importer.add_argument('--source', default='import')
+
+    missing = commands.add_parser('missing-geocodes', help='Print addresses that have no coordinates')
+    missing.add_argument('--since', help='Only bookings picked up on or after this date')
+
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    install_manifests(conn)
+
+    if args.command == 'precompute':
+        started = time.perf_counter()
+        manifests = precompute_manifests(conn, parse_pickup_date(args.date))
+        stops = sum(m['stop_count'] for m in manifests)
+        unlocated = sum(m['unlocated_stops'] for m in manifests)
+        print(f'✅ {len(manifests)} manifests, {stops} stops ({unlocated} without coordinates) '
+              f'in {time.perf_counter() - started:.2f}s')
+    elif args.command == 'import-geocodes':
+        with open(args.csv_file, newline='') as f:
+            rows = [row[:3] for row in csv.reader(f) if len(row) >= 3 and row[0] != 'address']
+        print(f'✅ {import_geocodes(conn, rows, args.source)} addresses cached')
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['address'])
+        for address in missing_geocodes(conn, args.since):
+            writer.writerow([address])
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""
+Per-request timing, SQL statement counts and Prometheus metrics
+Pooled connections are InstrumentedConnection objects that time every execute() and
+report it to the request that checked them out. Each response gets a Server-Timing
+header (db, template, total), each finished request lands in per-endpoint latency
+histograms served as Prometheus text, and slow statements are logged with their
+SQL and parameter shapes. Streamed responses (exports, live updates) get no
+Server-Timing: their headers go out before the body renders, so only the
+Prometheus histogram, observed when the stream closes, covers them.
+"""
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import before_render_template, g, request, template_rendered
+
+# Statements slower than this are logged and kept for /api/db/slow-queries
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+# Optional bearer token that lets a scraper read /metrics without a login session
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_HISTORY = 100
+
+slow_query_logger = logging.getLogger('arielgo.slow_query')
+
+
+def param_shape(parameters):
+    """Types of bound parameters, without their values"""
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+
+
+class RequestMetrics:
+    """Timings collected while one request is handled"""
+    __slots__ = ('started', 'queries', 'db_time', 'template_time', '_template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._template_started = None
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection that times execute()/executemany()
+    Time is measured to the first result row; rows fetched later, e.g. while a streamed
+    template renders, count towards template time.
+    """
+    recorder = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(sql, started, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(sql, started, seq_of_parameters, many=True)
+
+    def _record(self, sql, started, parameters, many=False):
+        elapsed = time.perf_counter() - started
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.queries += 1
+            recorder.db_time += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            registry.slow_query(sql, parameters, elapsed, many)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+class MetricsRegistry:
+    """Per-process request metrics, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._requests = {}
+        self._db_seconds = {}
+        self._queries = {}
+        self._slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)
+        self._slow_query_count = 0
+        self._collectors = []
+
+    def observe(self, endpoint, method, status, duration, metrics):
+        with self._lock:
+            key = (endpoint, method)
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = Histogram()
+            histogram.observe(duration)
+
+            status_key = (endpoint, method, status)
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+            self._db_seconds[key] = self._db_seconds.get(key, 0.0) + metrics.db_time
+            self._queries[key] = self._queries.get(key, 0) + metrics.queries
+
+    def slow_query(self, sql, parameters, elapsed, many=False):
+        statement = ' '.join(sql.split())
+        if many:
+            rows = parameters if isinstance(parameters, (list, tuple)) else None
+            shape = f'{len(rows)} x {param_shape(rows[0])}' if rows else 'many'
+        else:
+            shape = param_shape(parameters)
+
+        endpoint = request.endpoint if request else None
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(elapsed * 1000, 3),
+            'endpoint': endpoint,
+            'sql': statement[:1000],
+            'params': shape,
+        }
+        with self._lock:
+            self._slow_queries.append(entry)
+            self._slow_query_count += 1
+        slow_query_logger.warning(
+            'Slow query (%.1f ms, %s): %s params=%s',
+            entry['duration_ms'], endpoint or '-', entry['sql'], shape
+        )
+
+    def slow_queries(self):
+        with self._lock:
+            return list(reversed(self._slow_queries))
+
+    def add_collector(self, prefix, collect, label=None):
+        """
+        Export a stats() dict as gauges named arielgo_<prefix>_<key>
+        With label set, collect() returns {label value: stats dict}.
+        """
+        self._collectors.append((prefix, collect, label))
+
+    def render(self):
+        lines = [
+            '# HELP arielgo_request_duration_seconds Request latency, including streamed bodies',
+            '# TYPE arielgo_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            for (endpoint, method), histogram in sorted(self._latency.items()):
+                labels = _labels(endpoint=endpoint, method=method)
+                for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                    lines.append(f'arielgo_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'arielgo_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'arielgo_request_duration_seconds_sum{{{labels}}} {histogram.total:.6f}')
+                lines.append(f'arielgo_request_duration_seconds_count{{{labels}}} {histogram.count}')
+
+            lines += [
+                '# HELP arielgo_requests_total Requests handled, by status code',
+                '# TYPE arielgo_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'arielgo_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {count}')
+
+            lines += [
+                '# HELP arielgo_db_queries_total SQL statements executed',
+                '# TYPE arielgo_db_queries_total counter',
+            ]
+            for (endpoint, method), count in sorted(self._queries.items()):
+                lines.append(f'arielgo_db_queries_total{{{_labels(endpoint=endpoint, method=method)}}} {count}')
+
+            lines += [
+                '# HELP arielgo_db_seconds_total Time spent executing SQL statements',
+                '# TYPE arielgo_db_seconds_total counter',
+            ]
+            for (endpoint, method), seconds in sorted(self._db_seconds.items()):
+                lines.append(f'arielgo_db_seconds_total{{{_labels(endpoint=endpoint, method=method)}}} {seconds:.6f}')
+
+            lines += [
+                '# HELP arielgo_slow_queries_total Statements slower than SLOW_QUERY_MS',
+                '# TYPE arielgo_slow_queries_total counter',
+                f'arielgo_slow_queries_total {self._slow_query_count}',
+            ]
+
+        for prefix, collect, label in self._collectors:
+            groups = collect() if label else {None: collect()}
+            gauges = {}
+            for group, stats in groups.items():
+                for key, value in stats.items():
+                    # Nested summaries (e.g. hash_ms percentiles) and flags are left to the JSON APIs
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    labels = f'{{{_labels(**{label: group})}}}' if label else ''
+                    gauges.setdefault(f'arielgo_{prefix}_{key}', []).append(f'{labels} {value}')
+            for name, samples in gauges.items():
+                lines.append(f'# TYPE {name} gauge')
+                lines.extend(name + sample for sample in samples)
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def token_authorized(authorization):
+    """True if an Authorization header carries METRICS_TOKEN as a bearer token"""
+    if not METRICS_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip(), METRICS_TOKEN)
+
+
+def current():
+    """This request's metrics, or None outside a request"""
+    return g.get('_request_metrics') if request else None
+
+
+def _start_request():
+    g._request_metrics = RequestMetrics()
+
+
+def _template_started(sender, template, context, **extra):
+    metrics = current()
+    if metrics is not None:
+        metrics._template_started = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    metrics = current()
+    if metrics is not None and metrics._template_started is not None:
+        metrics.template_time += time.perf_counter() - metrics._template_started
+        metrics._template_started = None
+
+
+def _finish_request(response):
+    metrics = current()
+    if metrics is None:
+        return response
+
+    if not response.is_streamed:
+        total = time.perf_counter() - metrics.started
+        response.headers['Server-Timing'] = (
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries", '
+            f'tpl;dur={metrics.template_time * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+    status = response.status_code
+
+    # Observed when the server closes the response, so streamed bodies are included
+    def observe():
+        registry.observe(endpoint, method, status, time.perf_counter() - metrics.started, metrics)
+
+    response.call_on_close(observe)
+    return response
+
+
+def init_app(app):
+    """Time every request and add the Server-Timing header to unstreamed responses"""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
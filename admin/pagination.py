@@ -0,0 +1,99 @@
+"""
+Keyset (cursor) pagination for booking listings
+Pages are walked on (createdAt, id) so every page costs one index range read,
+no matter how deep into the history it is.
+"""
+import base64
+import binascii
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Clamp a per_page query parameter to 1..MAX_PAGE_SIZE"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(created_at, booking_id):
+    """Opaque URL-safe token for the position after (created_at, booking_id)"""
+    raw = f'{created_at}|{booking_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; returns None for a missing or malformed token"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+        created_at, booking_id = raw.rsplit('|', 1)
+        return created_at, int(booking_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_query(columns, where=None, params=(), cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Build a newest-first page query over bookings
+    Fetches one extra row so the page knows whether an older page exists.
+    """
+    clauses = [where] if where else []
+    params = list(params)
+
+    if cursor is not None:
+        clauses.append('(createdAt, id) < (?, ?)')
+        params.extend(cursor)
+
+    sql = f'SELECT {columns} FROM bookings'
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY createdAt DESC, id DESC LIMIT ?'
+    params.append(page_size + 1)
+
+    return sql, params
+
+
+class KeysetPage:
+    """
+    One page of rows, consumed lazily while a streamed template renders
+    Truthiness peeks at the first row only; len() and next_cursor are final
+    once the template has iterated the page.
+    """
+
+    def __init__(self, cursor, page_size, process=None):
+        self._cursor = cursor
+        self._process = process or (lambda row: row)
+        self.page_size = page_size
+        self.count = 0
+        self.next_cursor = None
+        self._first = None
+        self._peeked = False
+
+    def _peek(self):
+        if not self._peeked:
+            self._first = self._cursor.fetchone()
+            self._peeked = True
+        return self._first
+
+    def __bool__(self):
+        return self._peek() is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        row = self._peek()
+        while row is not None:
+            if self.count == self.page_size:
+                # The extra row only tells us an older page exists
+                self.next_cursor = encode_cursor(last['createdAt'], last['id'])
+                break
+            last = row
+            self.count += 1
+            yield self._process(row)
+            row = self._cursor.fetchone()
@@ -0,0 +1,190 @@
+"""
+Password hashing and verification off the request thread
+bcrypt work runs in a small dedicated process pool with a cap on queued jobs,
+so a burst of logins is rejected quickly instead of starving dashboard requests.
+"""
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+# bcrypt cost factor for new hashes (existing hashes keep the cost they were made with)
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+# Worker processes dedicated to bcrypt; 0 runs hashing inline on the request thread
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+# Jobs allowed in flight (running + queued) before new ones are rejected
+HASH_MAX_PENDING = int(os.getenv('HASH_MAX_PENDING', str(max(1, HASH_WORKERS) * 4)))
+# Seconds a request waits for its hash before giving up
+HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', '10'))
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hash pool is saturated or a job times out"""
+
+
+def _checkpw(password, password_hash):
+    return bcrypt.checkpw(password, password_hash)
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _hash_text(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _timed(fn, args, submitted_at):
+    """Runs in the worker: returns (result, queue wait, hash time) in seconds"""
+    started = time.time()
+    result = fn(*args)
+    return result, started - submitted_at, time.time() - started
+
+
+class HashPool:
+    """Size-limited process pool for bcrypt with queue-depth and latency counters"""
+
+    SAMPLE_SIZE = 1000
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING, timeout=HASH_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._hash_times = deque(maxlen=self.SAMPLE_SIZE)
+        self._wait_times = deque(maxlen=self.SAMPLE_SIZE)
+
+    def _get_executor(self):
+        # Created lazily, and again after a fork, so each gunicorn worker owns its pool
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._pid = os.getpid()
+        return self._executor
+
+    def run(self, fn, *args):
+        """Run fn(*args) in the pool and wait for the result"""
+        if self.workers <= 0:
+            result, wait, elapsed = _timed(fn, args, time.time())
+            self._record(wait, elapsed)
+            return result
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HashPoolBusy('Password hashing queue is full')
+            self._pending += 1
+            executor = self._get_executor()
+
+        try:
+            future = executor.submit(_timed, fn, args, time.time())
+        except BaseException:
+            self._job_done()
+            raise
+        # A job still counts against max_pending until a worker is done with it, even
+        # after its caller has given up waiting
+        future.add_done_callback(self._job_done)
+
+        try:
+            result, wait, elapsed = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise HashPoolBusy('Password hashing timed out') from None
+
+        self._record(wait, elapsed)
+        return result
+
+    def _job_done(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def _record(self, wait, elapsed):
+        with self._lock:
+            self.completed += 1
+            self._wait_times.append(max(wait, 0.0))
+            self._hash_times.append(elapsed)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'bcrypt_rounds': BCRYPT_ROUNDS,
+                'hash_ms': _summary(self._hash_times),
+                'queue_wait_ms': _summary(self._wait_times),
+            }
+
+
+def _summary(samples):
+    """p50/p95/max in milliseconds over the recent samples"""
+    if not samples:
+        return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+    return {
+        'p50': round(ordered[len(ordered) // 2] * 1000, 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'max': round(ordered[-1] * 1000, 3),
+    }
+
+
+hash_pool = HashPool()
+
+
+def verify_password(password, password_hash):
+    """
+    Verify password against hash
+    Supports both bcrypt (new) and SHA256 (legacy) for migration
+    """
+    # Check if it's a bcrypt hash (starts with $2a$, $2b$, or $2y$)
+    if password_hash.startswith('$2'):
+        return hash_pool.run(_checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    # Legacy SHA256 support (for migration period)
+    return hashlib.sha256(password.encode()).hexdigest() == password_hash
+
+
+def hash_password(password):
+    """Hash a password using bcrypt (secure password hashing)"""
+    return hash_pool.run(_hashpw, password.encode('utf-8'), BCRYPT_ROUNDS).decode('utf-8')
+
+
+def hash_passwords(passwords, workers=None, rounds=BCRYPT_ROUNDS, chunksize=16):
+    """
+    Hash many passwords across every core, yielding hashes in input order
+    For bulk jobs (imports, CLIs): uses its own process pool rather than hash_pool,
+    whose queue cap is sized to protect request latency.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for password in passwords:
+            yield _hash_text(password, rounds)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(
+            _hash_text, passwords, itertools.repeat(rounds), chunksize=chunksize
+        )
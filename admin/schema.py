@@ -0,0 +1,226 @@
+"""
+Admin schema: the indexes and trigger-maintained tables the routes depend on
+Also keeps a catalog of the admin queries and checks their plans with EXPLAIN QUERY
+PLAN, so a query that has lost its index shows up as a failed check, not a slow page.
+Add a query here whenever a route grows a new one.
+"""
+import re
+import sqlite3
+
+import archive
+import audit
+import capacity
+import db
+import etags
+import live
+import manifests
+import search
+import stats
+import timeseries
+from booking_view import DASHBOARD_COLUMNS, DETAIL_COLUMNS, LIST_COLUMNS
+from dispatch import DISPATCHABLE_STATUSES
+from export import export_query
+from pagination import keyset_query
+from workload import WORKLOAD_QUERY
+
+# Installed in order; later tables' triggers assume the earlier ones exist
+INSTALLERS = [
+    ('indexes', db.install_indexes),
+    ('account_indexes', db.install_account_indexes),
+    ('bookings_archive', archive.install_archive),
+    ('booking_stats', stats.install_stats),
+    ('booking_changes', live.install_feed),
+    ('change_versions', etags.install_etags),
+    ('bookings_fts', search.install_search),
+    ('booking_rollups', timeseries.install_timeseries),
+    ('driver_manifests', manifests.install_manifests),
+    ('audit_events', audit.install_audit),
+]
+# Installers for admin_users, which only the primary location has
+ACCOUNT_INSTALLERS = ('account_indexes', 'change_versions')
+
+_ACTIVE_DRIVERS = '''
+    SELECT id, username, full_name
+    FROM admin_users
+    WHERE role = 'driver' AND is_active = 1
+    ORDER BY full_name
+'''
+_STATUS_PLACEHOLDERS = ', '.join('?' * len(DISPATCHABLE_STATUSES))
+_EXCLUDED_PLACEHOLDERS = ', '.join('?' * len(manifests.EXCLUDED_STATUSES))
+_CURSOR = ('2026-01-01 00:00:00', 1000)
+_DAY = '2026-01-01'
+
+# (name, sql, params) for every query an admin page or API runs on request
+ADMIN_QUERIES = [
+    ('login', 'SELECT * FROM admin_users WHERE username = ? AND is_active = 1', ('admin',)),
+    ('load_user', 'SELECT * FROM admin_users WHERE id = ? AND is_active = 1', (1,)),
+    ('dashboard_recent_bookings',
+     f'SELECT {DASHBOARD_COLUMNS} FROM bookings ORDER BY createdAt DESC LIMIT 10', ()),
+    ('active_drivers', _ACTIVE_DRIVERS, ()),
+    ('bookings_page', *keyset_query(LIST_COLUMNS)),
+    ('bookings_page_cursor', *keyset_query(LIST_COLUMNS, cursor=_CURSOR)),
+    ('bookings_page_status', *keyset_query(LIST_COLUMNS, 'status = ?', ('pending',))),
+    ('bookings_page_status_cursor',
+     *keyset_query(LIST_COLUMNS, 'status = ?', ('pending',), cursor=_CURSOR)),
+    ('bookings_search', f'''
+        SELECT {LIST_COLUMNS}
+        FROM (
+            SELECT rowid AS match_id, {search.RANK} AS score
+            FROM bookings_fts
+            WHERE bookings_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        ) matches
+        JOIN bookings ON bookings.id = matches.match_id
+        ORDER BY matches.score, bookings.createdAt DESC
+    ''', ('"smith"*', 50)),
+    ('booking_detail', f'''
+        SELECT {DETAIL_COLUMNS}, u.full_name as driver_name
+        FROM bookings b
+        LEFT JOIN admin_users u ON b.driver_id = u.id
+        WHERE b.id = ?
+    ''', (1,)),
+    ('booking_audit_events', audit.TARGET_EVENTS_QUERY, ('booking', 1, 50)),
+    ('booking_audit_marker', audit.LATEST_EVENT_QUERY, ('booking', 1)),
+    ('assign_driver_lookup',
+     'SELECT * FROM admin_users WHERE id = ? AND role = ? AND is_active = 1', (2, 'driver')),
+    ('export_status_range', *export_query('completed', '2025-01-01', '2025-02-01')),
+    ('export_range', *export_query('all', '2025-01-01', '2025-02-01')),
+    ('export_with_archive', *export_query('completed', '2025-01-01', None, include_archived=True)),
+    ('archived_booking_detail', archive.ARCHIVED_DETAIL_QUERY, (1,)),
+    ('archive_candidates', archive.ELIGIBLE_QUERY,
+     (*archive.ARCHIVABLE_STATUSES, '2025-01-01', '2025-01-01', archive.ARCHIVE_CHUNK_SIZE)),
+    ('capacity_slots', capacity.SLOT_QUERY.format(table='bookings'),
+     {'start': '2025-11-01', 'end': '2026-01-01'}),
+    ('capacity_slots_archived', capacity.SLOT_QUERY.format(table=archive.ARCHIVE_TABLE),
+     {'start': '2025-11-01', 'end': '2026-01-01'}),
+    ('stats', 'SELECT status, booking_count, revenue, bags FROM booking_stats', ()),
+    ('timeseries_daily', '''
+        SELECT day, service, status, SUM(booking_count), SUM(revenue), SUM(bags)
+        FROM booking_rollup_daily WHERE basis = ? AND day BETWEEN ? AND ?
+        GROUP BY day, service, status
+    ''', ('created', '2025-12-01', '2025-12-31')),
+    ('timeseries_hourly', '''
+        SELECT hour, service, status, SUM(booking_count), SUM(revenue), SUM(bags)
+        FROM booking_rollup_hourly WHERE hour BETWEEN ? AND ?
+        GROUP BY hour, service, status
+    ''', ('2025-12-31 00:00', '2025-12-31 23:00')),
+    ('live_changes', live.CHANGES_QUERY, (0, 100)),
+    ('data_versions', '''
+        SELECT (SELECT COALESCE(MAX(seq), 0) FROM booking_changes),
+               (SELECT COALESCE(MAX(version), 0) FROM change_versions WHERE name = 'admin_users')
+    ''', ()),
+    ('dispatch_bookings', f'''
+        SELECT id, address, pickupTime, numberOfBags
+        FROM bookings
+        WHERE pickupDate = ? AND driver_id IS NULL AND status IN ({_STATUS_PLACEHOLDERS})
+        ORDER BY id
+    ''', (_DAY, *DISPATCHABLE_STATUSES)),
+    ('dispatch_drivers', '''
+        SELECT id, full_name
+        FROM admin_users
+        WHERE role = 'driver' AND is_active = 1
+        ORDER BY id
+    ''', ()),
+    ('driver_workload', WORKLOAD_QUERY,
+     {'today': _DAY, 'week_start': '2025-12-29', 'week_end': '2026-01-04'}),
+    ('driver_manifest_bookings', f'''
+        SELECT id, name, phone, address, service, numberOfBags, itemsJson, status,
+               pickupTime, notes
+        FROM bookings
+        WHERE driver_id = ? AND pickupDate = ? AND COALESCE(status, '') NOT IN ({_EXCLUDED_PLACEHOLDERS})
+        ORDER BY id
+    ''', (2, _DAY, *manifests.EXCLUDED_STATUSES)),
+    ('driver_manifest_cached',
+     'SELECT manifest_json FROM driver_manifests WHERE driver_id = ? AND pickup_date = ?', (2, _DAY)),
+    ('drivers_page', 'SELECT * FROM admin_users WHERE role = ? ORDER BY created_at DESC', ('driver',)),
+    ('drivers_by_name',
+     'SELECT id, full_name, is_active FROM admin_users WHERE role = ? ORDER BY full_name', ('driver',)),
+    ('users_page', 'SELECT * FROM admin_users ORDER BY created_at DESC', ()),
+]
+
+# A plan may read a table in full only while it holds fewer rows than this
+MIN_SCAN_ROWS = 1000
+
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)(?: AS (\S+))?$')
+# FROM/JOIN <table> [AS] [alias], to map a plan's aliases back to tables
+_TABLE_REFERENCE = re.compile(
+    r'\b(?:FROM|JOIN)\s+(\w+)'
+    r'(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|LEFT|CROSS|INNER|ORDER|GROUP|LIMIT)\b)(\w+))?',
+    re.IGNORECASE,
+)
+
+
+def install_admin_schema(conn, on_error=None, accounts=True):
+    """
+    Run every installer against conn
+    An installer that fails (e.g. bookings not created yet) is reported to
+    on_error(name, error) and skipped; without on_error the error is raised.
+    accounts=False skips the admin_users installers, for a non-primary location.
+    """
+    for name, install in INSTALLERS:
+        if not accounts and name in ACCOUNT_INSTALLERS:
+            continue
+        try:
+            install(conn)
+        except sqlite3.Error as e:
+            if on_error is None:
+                raise
+            on_error(name, e)
+
+
+def analyze(conn, analysis_limit=1000):
+    """Refresh planner statistics; analysis_limit bounds the rows sampled per index"""
+    conn.execute(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    conn.commit()
+
+
+def explain(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN detail lines for sql"""
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def full_scans(plan, sql):
+    """Tables a plan reads in full, without an index (aliases resolved against sql)"""
+    aliases = {}
+    for table, alias in _TABLE_REFERENCE.findall(sql):
+        aliases[alias or table] = table
+    scans = []
+    for detail in plan:
+        match = _FULL_SCAN.match(detail)
+        if match:
+            name = match.group(2) or match.group(1)
+            scans.append(aliases.get(name, name))
+    return scans
+
+
+def check_query_plans(conn, queries=ADMIN_QUERIES, min_rows=MIN_SCAN_ROWS):
+    """
+    Explain every admin query
+    Returns [(name, plan, problems)]; a problem is a full scan of a table with at least
+    min_rows rows, or the error from a query that can't be planned (e.g. a missing
+    table). Scans of subqueries and small tables are allowed.
+    """
+    row_counts = {}
+
+    def rows_in(table):
+        if table not in row_counts:
+            try:
+                row_counts[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            except sqlite3.Error:
+                # Not a table: a subquery or CTE the plan materialized
+                row_counts[table] = 0
+        return row_counts[table]
+
+    results = []
+    for name, sql, params in queries:
+        try:
+            plan = explain(conn, sql, params)
+        except sqlite3.Error as e:
+            results.append((name, [], [str(e)]))
+            continue
+        problems = [f'full scan of {table}' for table in full_scans(plan, sql) if rows_in(table) >= min_rows]
+        results.append((name, plan, problems))
+    return results
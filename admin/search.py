@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Full-text booking search backed by SQLite FTS5
+bookings_fts mirrors name, phone, email, address and notes (plus the phone number
+reduced to digits) and is kept current by triggers on bookings, so writes from the
+Node server are indexed too. Usage: python search.py [install|rebuild]
+"""
+import argparse
+import re
+import sqlite3
+
+from db import DB_PATH, split_statements
+
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 200
+
+# Phone with the usual punctuation stripped, so "5551234567" finds "(555) 123-4567"
+PHONE_DIGITS = '''replace(replace(replace(replace(replace(replace(
+    COALESCE({0}.phone, ''), ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', '')'''
+
+SEARCH_SCHEMA = f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5(
+        name, phone, email, address, notes, phone_digits,
+        tokenize = "unicode61 remove_diacritics 2",
+        prefix = '2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_fts_insert
+    AFTER INSERT ON bookings
+    BEGIN
+        INSERT INTO bookings_fts (rowid, name, phone, email, address, notes, phone_digits)
+        VALUES (NEW.id, NEW.name, NEW.phone, NEW.email, NEW.address, NEW.notes,
+                {PHONE_DIGITS.format('NEW')});
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_fts_delete
+    AFTER DELETE ON bookings
+    BEGIN
+        DELETE FROM bookings_fts WHERE rowid = OLD.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_fts_update
+    AFTER UPDATE OF name, phone, email, address, notes ON bookings
+    BEGIN
+        DELETE FROM bookings_fts WHERE rowid = OLD.id;
+        INSERT INTO bookings_fts (rowid, name, phone, email, address, notes, phone_digits)
+        VALUES (NEW.id, NEW.name, NEW.phone, NEW.email, NEW.address, NEW.notes,
+                {PHONE_DIGITS.format('NEW')});
+    END;
+'''
+
+# Name and contact details outrank a passing mention in the address or notes
+RANK = 'bm25(bookings_fts, 10.0, 6.0, 6.0, 2.0, 1.0, 6.0)'
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+_PHONE_LIKE = re.compile(r'^[\d\s()+.-]+$')
+
+
+def install_search(conn):
+    """Create the FTS index and triggers, filling the index if it was just created"""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bookings_fts'"
+    ).fetchone()
+
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        for statement in split_statements(SEARCH_SCHEMA):
+            conn.execute(statement)
+        if not existed:
+            _rebuild(conn)
+
+
+def rebuild_search(conn):
+    """Re-index every booking in one transaction"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        _rebuild(conn)
+
+
+def _rebuild(conn):
+    conn.execute('DELETE FROM bookings_fts')
+    conn.execute(f'''
+        INSERT INTO bookings_fts (rowid, name, phone, email, address, notes, phone_digits)
+        SELECT id, name, phone, email, address, notes, {PHONE_DIGITS.format('bookings')}
+        FROM bookings
+    ''')
+    conn.execute("INSERT INTO bookings_fts (bookings_fts) VALUES ('optimize')")
+
+
+def build_match(query):
+    """
+    Turn free text into an FTS5 MATCH expression, or None if it has no terms
+    Every word must match as a prefix; phone-looking input also matches the digits column.
+    """
+    terms = _TERM.findall(query or '')
+    if not terms:
+        return None
+
+    expression = ' AND '.join(f'"{term}"*' for term in terms)
+
+    digits = re.sub(r'\D', '', query)
+    if len(terms) > 1 and len(digits) >= 3 and _PHONE_LIKE.match(query.strip()):
+        expression = f'({expression}) OR phone_digits : "{digits}"*'
+    return expression
+
+
+def search_bookings(conn, query, columns, limit=DEFAULT_SEARCH_LIMIT, score=False):
+    """
+    Best matches first, then newest; returns a cursor over the selected booking columns
+    With score, each row also has the match's rank as `score` (lower is better).
+    """
+    match = build_match(query)
+    if match is None:
+        return iter(())
+
+    # Rank and limit inside the index, then fetch just those bookings
+    return conn.execute(f'''
+        SELECT {columns}{', matches.score' if score else ''}
+        FROM (
+            SELECT rowid AS match_id, {RANK} AS score
+            FROM bookings_fts
+            WHERE bookings_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        ) matches
+        JOIN bookings ON bookings.id = matches.match_id
+        ORDER BY matches.score, bookings.createdAt DESC
+    ''', (match, limit))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the bookings_fts search index')
+    parser.add_argument('command', choices=['install', 'rebuild'])
+    parser.add_argument('--db', default=DB_PATH, help='Path to arielgo.db')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+
+    if args.command == 'install':
+        install_search(conn)
+        print('✅ bookings_fts index and triggers installed')
+    else:
+        rebuild_search(conn)
+        count = conn.execute('SELECT COUNT(*) FROM bookings_fts').fetchone()[0]
+        print(f'✅ bookings_fts rebuilt ({count} bookings indexed)')
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
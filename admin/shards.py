@@ -0,0 +1,157 @@
+"""
+Per-location booking databases, read in parallel
+Each location (city) keeps its bookings in its own SQLite file (db.LOCATIONS), so one
+city's writes never queue behind another's lock. A single booking is addressed by
+?location= next to its id. Pages that cover several locations run their query against
+each one on a small thread pool, since sqlite3 releases the GIL while a statement runs,
+and then merge the results: totals are summed, and listings are k-way merged newest
+first with a cursor that remembers which location the page ended at.
+"""
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from flask import abort, request
+
+import db
+import pagination
+import search
+from booking_view import BookingView
+from pagination import DEFAULT_PAGE_SIZE, keyset_query
+
+# Threads running per-location queries (default: one per location)
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS') or 0) or len(db.LOCATIONS)
+
+# Position of each location in merged listings, which break createdAt ties by location
+RANK = {location: rank for rank, location in enumerate(db.LOCATIONS)}
+_NAMES = list(db.LOCATIONS)
+_MAX_ID = 2 ** 63 - 1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """The process-wide fan-out thread pool, started on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix='shard')
+        return _executor
+
+
+def request_location():
+    """The location named by ?location=, the primary by default; 404 for an unknown one"""
+    location = request.args.get('location') or db.PRIMARY_LOCATION
+    if location not in db.LOCATIONS:
+        abort(404)
+    return location
+
+
+def request_locations():
+    """Locations a combined page covers: the one picked in ?location=, or all of them"""
+    location = request.args.get('location')
+    if not location:
+        return list(db.LOCATIONS)
+    if location not in db.LOCATIONS:
+        abort(404)
+    return [location]
+
+
+def location_param(location):
+    """?location= value for links to a booking at location (None, i.e. left out, for the primary)"""
+    return None if location in (None, db.PRIMARY_LOCATION) else location
+
+
+def fan_out(fn, locations=None, connections=None):
+    """
+    {location: fn(conn, location)} for each location, run in parallel
+    By default each location is read through the request's connection to it; pass
+    connections ({location: conn}) outside a request. With one location fn runs inline.
+    fn must return fully fetched results, not a cursor.
+    """
+    locations = list(locations or db.LOCATIONS)
+    if connections is None:
+        connections = {location: db.get_db_connection(location=location) for location in locations}
+    if len(locations) == 1:
+        return {locations[0]: fn(connections[locations[0]], locations[0])}
+    futures = {location: executor().submit(fn, connections[location], location) for location in locations}
+    return {location: future.result() for location, future in futures.items()}
+
+
+def encode_cursor(created_at, booking_id, location):
+    """Merged-listing token for the position after booking_id at location"""
+    return pagination.encode_cursor(f'{created_at}|{location}', booking_id)
+
+
+def decode_cursor(token):
+    """
+    Inverse of encode_cursor: (created_at, booking_id, location), or None for a missing
+    or malformed token. A single-location token is read as the primary's.
+    """
+    cursor = pagination.decode_cursor(token)
+    if cursor is None:
+        return None
+    created_at, booking_id = cursor
+    head, sep, location = created_at.rpartition('|')
+    if not sep:
+        return created_at, booking_id, db.PRIMARY_LOCATION
+    if location not in RANK:
+        return None
+    return head, booking_id, location
+
+
+def location_cursor(cursor, location):
+    """The (createdAt, id) keyset bound at one location for a merged-listing cursor"""
+    created_at, booking_id, cursor_location = cursor
+    if location == cursor_location:
+        return created_at, booking_id
+    # On a createdAt tie, locations ranked below the cursor's come after it in full
+    # and those ranked above it don't come after it at all
+    return created_at, _MAX_ID if RANK[location] < RANK[cursor_location] else 0
+
+
+class MergedPage(list):
+    """One page of a merged listing; next_cursor is set when an older page exists"""
+    next_cursor = None
+
+
+def newest(locations, columns, where=None, params=(), cursor=None, page_size=DEFAULT_PAGE_SIZE,
+           connections=None):
+    """
+    One newest-first page of bookings across locations
+    Each location reads at most page_size + 1 rows past the cursor (one keyset range
+    read) and the sorted runs are k-way merged on (createdAt, location, id). Rows come
+    back as BookingViews tagged with their location.
+    """
+    def read(conn, location):
+        bound = location_cursor(cursor, location) if cursor else None
+        sql, sql_params = keyset_query(columns, where, params, cursor=bound, page_size=page_size)
+        rank = RANK[location]
+        return [((row['createdAt'] or '', rank, row['id']), row) for row in conn.execute(sql, sql_params)]
+
+    runs = fan_out(read, locations, connections)
+    merged = list(islice(heapq.merge(*runs.values(), key=lambda item: item[0], reverse=True), page_size + 1))
+
+    page = MergedPage(BookingView(row, _NAMES[rank]) for (_, rank, _), row in merged[:page_size])
+    if len(merged) > page_size:
+        created_at, rank, booking_id = merged[page_size - 1][0]
+        page.next_cursor = encode_cursor(created_at, booking_id, _NAMES[rank])
+    return page
+
+
+def search_bookings(locations, query, columns, limit=search.DEFAULT_SEARCH_LIMIT, connections=None):
+    """
+    Best search matches across locations, as BookingViews tagged with their location
+    Each location returns its own best limit, ranked against its own index, and the
+    runs are merged on rank, then newest first. Rows also carry their `score`.
+    """
+    def read(conn, location):
+        return [BookingView(row, location) for row in search.search_bookings(conn, query, columns, limit, score=True)]
+
+    results = [view for views in fan_out(read, locations, connections).values() for view in views]
+    results.sort(key=lambda view: view.createdAt or '', reverse=True)
+    results.sort(key=lambda view: view.score)
+    return results[:limit]
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Booking statistics kept current by SQLite triggers
+booking_stats holds one row per status, so totals are a read of a handful of rows
+instead of a scan of bookings. Usage: python stats.py [install|rebuild|verify]
+"""
+import argparse
+import sqlite3
+import sys
+
+from archive import ARCHIVE_GUARD, ARCHIVE_GUARD_SCHEMA, lifetime_bookings
+from db import DB_PATH, drop_outdated_triggers, split_statements
+
+BOOKING_STATUSES = ['pending', 'confirmed', 'in_progress', 'completed', 'cancelled']
+
+STATS_SCHEMA = ARCHIVE_GUARD_SCHEMA + f'''
+    CREATE TABLE IF NOT EXISTS booking_stats (
+        status TEXT PRIMARY KEY,
+        booking_count INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0,
+        bags INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_booking_stats_insert
+    AFTER INSERT ON bookings
+    BEGIN
+        INSERT INTO booking_stats (status, booking_count, revenue, bags)
+        VALUES (COALESCE(NEW.status, ''), 1, COALESCE(NEW.totalPrice, 0), COALESCE(NEW.numberOfBags, 0))
+        ON CONFLICT(status) DO UPDATE SET
+            booking_count = booking_count + 1,
+            revenue = revenue + excluded.revenue,
+            bags = bags + excluded.bags;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_booking_stats_delete
+    AFTER DELETE ON bookings
+    {ARCHIVE_GUARD}
+    BEGIN
+        UPDATE booking_stats SET
+            booking_count = booking_count - 1,
+            revenue = revenue - COALESCE(OLD.totalPrice, 0),
+            bags = bags - COALESCE(OLD.numberOfBags, 0)
+        WHERE status = COALESCE(OLD.status, '');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_booking_stats_update
+    AFTER UPDATE OF status, totalPrice, numberOfBags ON bookings
+    WHEN OLD.status IS NOT NEW.status
+      OR OLD.totalPrice IS NOT NEW.totalPrice
+      OR OLD.numberOfBags IS NOT NEW.numberOfBags
+    BEGIN
+        UPDATE booking_stats SET
+            booking_count = booking_count - 1,
+            revenue = revenue - COALESCE(OLD.totalPrice, 0),
+            bags = bags - COALESCE(OLD.numberOfBags, 0)
+        WHERE status = COALESCE(OLD.status, '');
+
+        INSERT INTO booking_stats (status, booking_count, revenue, bags)
+        VALUES (COALESCE(NEW.status, ''), 1, COALESCE(NEW.totalPrice, 0), COALESCE(NEW.numberOfBags, 0))
+        ON CONFLICT(status) DO UPDATE SET
+            booking_count = booking_count + 1,
+            revenue = revenue + excluded.revenue,
+            bags = bags + excluded.bags;
+    END;
+'''
+
+# Single-pass rollup used to (re)build the table and as a fallback when it is missing;
+# {source} is bookings, or bookings plus the archive (see rollup_query)
+ROLLUP_QUERY = '''
+    SELECT COALESCE(status, '') AS status,
+           COUNT(*) AS booking_count,
+           COALESCE(SUM(totalPrice), 0) AS revenue,
+           COALESCE(SUM(numberOfBags), 0) AS bags
+    FROM {source}
+    GROUP BY COALESCE(status, '')
+'''
+
+
+def rollup_query(conn):
+    """ROLLUP_QUERY over every booking ever made, archived ones included"""
+    return ROLLUP_QUERY.format(source=lifetime_bookings(conn, 'status, totalPrice, numberOfBags'))
+
+
+def install_stats(conn):
+    """Create the summary table and triggers, seeding it if it was just created"""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'booking_stats'"
+    ).fetchone()
+
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        statements = split_statements(STATS_SCHEMA)
+        drop_outdated_triggers(conn, statements)
+        for statement in statements:
+            conn.execute(statement)
+        if not existed:
+            _rebuild(conn)
+
+
+def rebuild_stats(conn):
+    """Recompute booking_stats from live and archived bookings in one transaction"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        _rebuild(conn)
+
+
+def _rebuild(conn):
+    conn.execute('DELETE FROM booking_stats')
+    conn.execute(f'''
+        INSERT INTO booking_stats (status, booking_count, revenue, bags)
+        {rollup_query(conn)}
+    ''')
+
+
+def verify_stats(conn):
+    """
+    Compare booking_stats against a fresh rollup of live and archived bookings
+    Returns a list of (status, stored, actual) tuples for every row that drifted
+    """
+    stored = {
+        row[0]: tuple(row[1:])
+        for row in conn.execute('SELECT status, booking_count, revenue, bags FROM booking_stats')
+    }
+    actual = {row[0]: tuple(row[1:]) for row in conn.execute(rollup_query(conn))}
+
+    drift = []
+    for status in sorted(set(stored) | set(actual)):
+        stored_row = stored.get(status, (0, 0, 0))
+        actual_row = actual.get(status, (0, 0, 0))
+        if stored_row != actual_row:
+            drift.append((status, stored_row, actual_row))
+    return drift
+
+
+def read_stats(conn):
+    """
+    Booking totals and per-status counts
+    Reads booking_stats when installed, otherwise falls back to one GROUP BY scan
+    """
+    try:
+        rows = conn.execute(
+            'SELECT status, booking_count, revenue, bags FROM booking_stats'
+        ).fetchall()
+    except sqlite3.OperationalError:
+        rows = conn.execute(rollup_query(conn)).fetchall()
+
+    stats = {
+        'total_bookings': 0,
+        'revenue': 0,
+        'total_bags': 0,
+        'by_status': {status: 0 for status in BOOKING_STATUSES},
+    }
+    for status, booking_count, revenue, bags in rows:
+        stats['total_bookings'] += booking_count
+        stats['revenue'] += revenue
+        stats['total_bags'] += bags
+        if status in stats['by_status']:
+            stats['by_status'][status] = booking_count
+    return stats
+
+
+def sum_stats(results):
+    """Totals across several read_stats() results, e.g. one per location"""
+    total = {
+        'total_bookings': 0,
+        'revenue': 0,
+        'total_bags': 0,
+        'by_status': {status: 0 for status in BOOKING_STATUSES},
+    }
+    for result in results:
+        for key in ('total_bookings', 'revenue', 'total_bags'):
+            total[key] += result[key]
+        for status, count in result['by_status'].items():
+            total['by_status'][status] = total['by_status'].get(status, 0) + count
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the booking_stats summary table')
+    parser.add_argument('command', choices=['install', 'rebuild', 'verify'])
+    parser.add_argument('--db', default=DB_PATH, help='Path to arielgo.db')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+
+    if args.command == 'install':
+        install_stats(conn)
+        print('✅ booking_stats table and triggers installed')
+    elif args.command == 'rebuild':
+        rebuild_stats(conn)
+        print('✅ booking_stats rebuilt from bookings')
+    else:
+        drift = verify_stats(conn)
+        if drift:
+            for status, stored, actual in drift:
+                print(f'❌ {status or "(none)"}: stored {stored} != actual {actual}')
+            print('Run "python stats.py rebuild" to repair')
+            sys.exit(1)
+        print('✅ booking_stats matches bookings')
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The admin modules import each other flat, as they do when run from admin/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
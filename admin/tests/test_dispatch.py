@@ -0,0 +1,79 @@
+from dispatch import address_zone, plan_dispatch, window_start
+
+
+def booking(booking_id, address='1 Pine St, Seattle, WA 98101', pickup_time='9:00 AM - 11:00 AM', bags=1):
+    return {'id': booking_id, 'address': address, 'pickupTime': pickup_time, 'numberOfBags': bags}
+
+
+def drivers(count):
+    return [{'id': 100 + i, 'full_name': f'Driver {i}'} for i in range(count)]
+
+
+def test_address_zone_prefers_zip_after_the_street():
+    assert address_zone('1 Pine St, Seattle, WA 98101') == 'zip:98101'
+    assert address_zone('1 Pine St, Seattle, WA 98101-1234') == 'zip:98101'
+    assert address_zone('1 Pine St, Tacoma') == 'city:tacoma'
+
+
+def test_address_zone_ignores_numbers_in_the_street_and_missing_addresses():
+    assert address_zone('98101 Pine St') == 'unknown'
+    assert address_zone('') == 'unknown'
+    assert address_zone(None) == 'unknown'
+
+
+def test_window_start():
+    assert window_start('9:00 AM - 11:00 AM') == 9 * 60
+    assert window_start('2pm-4pm') == 14 * 60
+    assert window_start('12:30 PM') == 12 * 60 + 30
+    assert window_start('12 AM') == 0
+    assert window_start('14:15') == 14 * 60 + 15
+    assert window_start('anytime') is None
+    assert window_start(None) is None
+
+
+def test_plan_never_exceeds_driver_capacity():
+    bookings = [booking(i, bags=6) for i in range(1, 5)]
+    plan = plan_dispatch(bookings, drivers(2), capacity=10)
+
+    assert plan['summary']['assigned'] == 2
+    assert all(route['bags'] <= 10 for route in plan['routes'])
+    assert {item['reason'] for item in plan['unassigned']} == {'no_capacity'}
+    assert len(plan['assignments']) + len(plan['unassigned']) == len(bookings)
+
+
+def test_plan_respects_stops_per_window():
+    bookings = [booking(i) for i in range(1, 4)] + [booking(4, pickup_time='1:00 PM - 3:00 PM')]
+    plan = plan_dispatch(bookings, drivers(1), max_stops_per_window=2)
+
+    assert [item['booking_id'] for item in plan['unassigned']] == [3]
+    stops = plan['routes'][0]['stops']
+    assert [stop['booking_id'] for stop in stops] == [1, 2, 4]
+    assert [stop['window_start'] for stop in stops] == [540, 540, 780]
+
+
+def test_plan_without_drivers_reports_every_booking():
+    plan = plan_dispatch([booking(1), booking(2)], [])
+
+    assert plan['assignments'] == {}
+    assert [item['reason'] for item in plan['unassigned']] == ['no_drivers', 'no_drivers']
+
+
+def test_plan_keeps_zones_compact_and_spreads_load():
+    bookings = (
+        [booking(i, address='1 Pine St, Seattle, WA 98101', bags=2) for i in range(1, 5)]
+        + [booking(i, address='9 Oak Ave, Seattle, WA 98115', bags=2) for i in range(5, 9)]
+    )
+    plan = plan_dispatch(bookings, drivers(2), max_stops_per_window=10)
+
+    assert plan['summary']['unassigned'] == 0
+    # Balancing splits at most one zone between the two drivers
+    assert sum(len(route['zones']) for route in plan['routes']) <= 3
+    # Nobody ends up more than one booking past a fair share
+    assert plan['summary']['fair_share_bags'] == 8
+    assert plan['summary']['max_bags'] <= 8 + 2
+
+
+def test_per_item_bookings_count_as_one_bag():
+    plan = plan_dispatch([booking(1, bags=None), booking(2, bags=0)], drivers(1))
+
+    assert plan['summary']['total_bags'] == 2
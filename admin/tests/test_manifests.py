@@ -0,0 +1,94 @@
+import sqlite3
+
+import pytest
+
+from manifests import build_manifest, install_manifests, normalize_address, order_stops, path_km, two_opt
+
+
+def stop(booking_id, pickup_time, latitude=None, longitude=None):
+    return {'booking_id': booking_id, 'pickupTime': pickup_time, 'latitude': latitude, 'longitude': longitude}
+
+
+def test_two_opt_untangles_a_crossing_path():
+    points = [(47.60, -122.33), (47.60, -122.31), (47.60, -122.32), (47.60, -122.30)]
+    order = two_opt(points, [0, 1, 2, 3])
+
+    assert sorted(order) == [0, 1, 2, 3]
+    assert order == [0, 2, 1, 3]
+    assert path_km([points[i] for i in order]) < path_km(points)
+
+
+def test_two_opt_starts_from_a_fixed_point():
+    points = [(47.60, -122.30), (47.60, -122.32)]
+    order = two_opt(points, [0, 1], start=(47.60, -122.33))
+
+    assert order == [1, 0]
+
+
+def test_order_stops_visits_windows_in_time_order_with_unlocated_stops_last():
+    stops = [
+        stop(1, '1:00 PM - 3:00 PM', 47.61, -122.33),
+        stop(2, '9:00 AM - 11:00 AM'),
+        stop(3, '9:00 AM - 11:00 AM', 47.60, -122.30),
+        stop(4, '9:00 AM - 11:00 AM', 47.60, -122.32),
+        stop(5, None, 47.70, -122.40),
+    ]
+    ordered, nn_km, final_km = order_stops(stops, depot=(47.60, -122.33))
+
+    assert [s['booking_id'] for s in ordered] == [4, 3, 2, 1, 5]
+    assert final_km <= nn_km
+
+
+def test_order_stops_without_stops():
+    assert order_stops([]) == ([], 0.0, 0.0)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('''
+        CREATE TABLE bookings (
+            id INTEGER PRIMARY KEY, name TEXT, phone TEXT, address TEXT, service TEXT,
+            numberOfBags INTEGER, itemsJson TEXT, status TEXT, pickupDate TEXT,
+            pickupTime TEXT, notes TEXT, driver_id INTEGER
+        )
+    ''')
+    install_manifests(conn)
+    yield conn
+    conn.close()
+
+
+def add_booking(conn, booking_id, address, items_json=None, status='confirmed'):
+    conn.execute('''
+        INSERT INTO bookings (id, name, address, service, itemsJson, status, pickupDate, pickupTime, driver_id)
+        VALUES (?, 'Customer', ?, 'dry-cleaning', ?, ?, '2026-03-14', '9:00 AM - 11:00 AM', 7)
+    ''', (booking_id, address, items_json, status))
+
+
+def test_build_manifest_counts_only_valid_item_lists(conn):
+    add_booking(conn, 1, '1 Pine St, Seattle', '[{"item": "shirt"}, {"item": "suit"}]')
+    add_booking(conn, 2, '2 Pine St, Seattle', '{not json')
+    add_booking(conn, 3, '3 Pine St, Seattle', '{"item": "shirt"}')
+    add_booking(conn, 4, '4 Pine St, Seattle', '')
+    add_booking(conn, 5, '5 Pine St, Seattle', '[]', status='cancelled')
+
+    manifest = build_manifest(conn, 7, '2026-03-14')
+
+    assert {s['booking_id']: s['items'] for s in manifest['stops']} == {1: 2, 2: 0, 3: 0, 4: 0}
+
+
+def test_build_manifest_handles_missing_and_uncached_addresses(conn):
+    add_booking(conn, 1, None)
+    add_booking(conn, 2, '')
+    add_booking(conn, 3, '12 Main Street, Seattle')
+    conn.execute(
+        'INSERT INTO geocode_cache (address_key, latitude, longitude) VALUES (?, 47.6, -122.3)',
+        (normalize_address('12 Main St., Seattle'),)
+    )
+
+    manifest = build_manifest(conn, 7, '2026-03-14')
+
+    assert [s['booking_id'] for s in manifest['stops']] == [3, 1, 2]
+    assert manifest['unlocated_stops'] == 2
+    assert [s['leg_km'] for s in manifest['stops']] == [None, None, None]
@@ -0,0 +1,84 @@
+import user_cache
+from user_cache import SqliteInvalidationLog, UserCache
+
+
+def test_set_and_invalidate():
+    cache = UserCache()
+    assert cache.set(1, 'alice', cache.stamp())
+    assert cache.get('1') == 'alice'
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+
+def test_invalidation_during_load_is_not_undone():
+    cache = UserCache()
+    stamp = cache.stamp()
+    # The account is deactivated while the load is still reading the old row
+    cache.invalidate(1)
+
+    assert not cache.set(1, 'stale', stamp)
+    assert cache.get(1) is None
+    assert cache.set(1, 'fresh', cache.stamp())
+    assert cache.get(1) == 'fresh'
+
+
+def test_invalidating_another_user_does_not_block_a_load():
+    cache = UserCache()
+    stamp = cache.stamp()
+    cache.invalidate(2)
+
+    assert cache.set(1, 'alice', stamp)
+
+
+def test_clear_during_load_rejects_the_load():
+    cache = UserCache()
+    stamp = cache.stamp()
+    cache.clear()
+
+    assert not cache.set(1, 'stale', stamp)
+
+
+def test_pruned_tombstones_still_reject_older_stamps(monkeypatch):
+    cache = UserCache()
+    stamp = cache.stamp()
+    cache.invalidate(1)
+    monkeypatch.setattr(user_cache, 'TOMBSTONE_SECONDS', -1)
+
+    assert not cache.set(1, 'stale', stamp)
+    assert not cache._tombstones
+    assert cache.set(1, 'fresh', cache.stamp())
+
+
+def test_entries_expire():
+    cache = UserCache(ttl=0)
+    cache.set(1, 'alice')
+
+    assert cache.get(1) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_lru_eviction():
+    cache = UserCache(max_size=2)
+    cache.set(1, 'a')
+    cache.set(2, 'b')
+    cache.get(1)
+    cache.set(3, 'c')
+
+    assert cache.get(2) is None
+    assert cache.get(1) == 'a'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_shared_log_reaches_other_workers(tmp_path):
+    log_path = str(tmp_path / 'user-cache.db')
+    worker_a = UserCache(shared_log=SqliteInvalidationLog(log_path), sync_interval=0)
+    worker_b = UserCache(shared_log=SqliteInvalidationLog(log_path), sync_interval=0)
+    worker_b.get(1)
+    stamp = worker_b.stamp()
+
+    worker_a.invalidate(1)
+
+    # worker_b's in-flight load picks up the invalidation on its next sync
+    assert worker_b.get(1) is None
+    assert not worker_b.set(1, 'stale', stamp)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Daily and hourly booking rollups kept current by SQLite triggers
+booking_rollup_daily is bucketed by both createdAt and pickupDate, booking_rollup_hourly
+by createdAt only (pickups are booked as time slots, not hours). Buckets are UTC, like
+createdAt. Usage: python timeseries.py [install|backfill|verify]
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+
+from archive import ARCHIVE_GUARD, ARCHIVE_GUARD_SCHEMA, lifetime_bookings
+from db import DB_PATH, drop_outdated_triggers, split_statements
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+BASES = ('created', 'pickup')
+
+# Range used when the request gives no start, per granularity
+DEFAULT_SPAN_DAYS = {'hour': 2, 'day': 30, 'week': 84, 'month': 365}
+# Longest range a single request may ask for
+MAX_SPAN_DAYS = {'hour': 31, 'day': 3660, 'week': 3660, 'month': 3660}
+
+# Bucket expressions over a bookings row; {0} is NEW, OLD or bookings
+CREATED_DAY = "COALESCE(date({0}.createdAt), '')"
+PICKUP_DAY = "COALESCE(date({0}.pickupDate), '')"
+CREATED_HOUR = "COALESCE(strftime('%Y-%m-%d %H:00', {0}.createdAt), '')"
+
+SERVICE = "COALESCE({0}.service, '')"
+STATUS = "COALESCE({0}.status, '')"
+
+ROLLUP_TABLES = '''
+    CREATE TABLE IF NOT EXISTS booking_rollup_daily (
+        basis TEXT NOT NULL,
+        day TEXT NOT NULL,
+        service TEXT NOT NULL,
+        status TEXT NOT NULL,
+        booking_count INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0,
+        bags INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (basis, day, service, status)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS booking_rollup_hourly (
+        hour TEXT NOT NULL,
+        service TEXT NOT NULL,
+        status TEXT NOT NULL,
+        booking_count INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0,
+        bags INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour, service, status)
+    ) WITHOUT ROWID;
+'''
+
+# (table, key columns, key values, bucket expression) for every rollup a booking lands in
+ROLLUPS = [
+    ('booking_rollup_daily', ('basis', 'day'), ("'created'",), CREATED_DAY),
+    ('booking_rollup_daily', ('basis', 'day'), ("'pickup'",), PICKUP_DAY),
+    ('booking_rollup_hourly', ('hour',), (), CREATED_HOUR),
+]
+
+
+def _key(keys, fixed, bucket, row):
+    """Rollup key columns and the SQL expressions that fill them for one row"""
+    columns = list(keys) + ['service', 'status']
+    values = list(fixed) + [bucket.format(row), SERVICE.format(row), STATUS.format(row)]
+    return columns, values
+
+
+def _add(row):
+    statements = []
+    for table, keys, fixed, bucket in ROLLUPS:
+        columns, values = _key(keys, fixed, bucket, row)
+        statements.append(f'''
+        INSERT INTO {table} ({', '.join(columns)}, booking_count, revenue, bags)
+        VALUES ({', '.join(values)}, 1,
+                COALESCE({row}.totalPrice, 0), COALESCE({row}.numberOfBags, 0))
+        ON CONFLICT({', '.join(columns)}) DO UPDATE SET
+            booking_count = booking_count + 1,
+            revenue = revenue + excluded.revenue,
+            bags = bags + excluded.bags;''')
+    return ''.join(statements)
+
+
+def _subtract(row):
+    statements = []
+    for table, keys, fixed, bucket in ROLLUPS:
+        columns, values = _key(keys, fixed, bucket, row)
+        match = ' AND '.join(f'{column} = {value}' for column, value in zip(columns, values))
+        statements.append(f'''
+        UPDATE {table} SET
+            booking_count = booking_count - 1,
+            revenue = revenue - COALESCE({row}.totalPrice, 0),
+            bags = bags - COALESCE({row}.numberOfBags, 0)
+        WHERE {match};''')
+    return ''.join(statements)
+
+
+TIMESERIES_SCHEMA = ARCHIVE_GUARD_SCHEMA + ROLLUP_TABLES + f'''
+    CREATE TRIGGER IF NOT EXISTS trg_booking_rollups_insert
+    AFTER INSERT ON bookings
+    BEGIN{_add('NEW')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_booking_rollups_delete
+    AFTER DELETE ON bookings
+    {ARCHIVE_GUARD}
+    BEGIN{_subtract('OLD')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_booking_rollups_update
+    AFTER UPDATE OF status, service, totalPrice, numberOfBags, createdAt, pickupDate ON bookings
+    WHEN OLD.status IS NOT NEW.status
+      OR OLD.service IS NOT NEW.service
+      OR OLD.totalPrice IS NOT NEW.totalPrice
+      OR OLD.numberOfBags IS NOT NEW.numberOfBags
+      OR OLD.createdAt IS NOT NEW.createdAt
+      OR OLD.pickupDate IS NOT NEW.pickupDate
+    BEGIN{_subtract('OLD')}{_add('NEW')}
+    END;
+'''
+
+
+def _backfill_query(conn, keys, fixed, bucket):
+    """Rollup of every booking, archived ones included, into one rollup table's columns"""
+    _, values = _key(keys, fixed, bucket, 'bookings')
+    source = lifetime_bookings(conn, 'createdAt, pickupDate, service, status, totalPrice, numberOfBags')
+    return f'''
+        SELECT {', '.join(values)},
+               COUNT(*), COALESCE(SUM(totalPrice), 0), COALESCE(SUM(numberOfBags), 0)
+        FROM {source} AS bookings
+        GROUP BY {', '.join(values[len(fixed):])}
+    '''
+
+
+def install_timeseries(conn):
+    """Create the rollup tables and triggers, backfilling them if they were just created"""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'booking_rollup_daily'"
+    ).fetchone()
+
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        statements = split_statements(TIMESERIES_SCHEMA)
+        drop_outdated_triggers(conn, statements)
+        for statement in statements:
+            conn.execute(statement)
+        if not existed:
+            _backfill(conn)
+
+
+def backfill_timeseries(conn):
+    """Rebuild both rollup tables from live and archived bookings in one transaction"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        _backfill(conn)
+
+
+def _backfill(conn):
+    conn.execute('DELETE FROM booking_rollup_daily')
+    conn.execute('DELETE FROM booking_rollup_hourly')
+    for table, keys, fixed, bucket in ROLLUPS:
+        columns = ', '.join(list(keys) + ['service', 'status'])
+        conn.execute(f'''
+            INSERT INTO {table} ({columns}, booking_count, revenue, bags)
+            {_backfill_query(conn, keys, fixed, bucket)}
+        ''')
+
+
+def verify_timeseries(conn):
+    """
+    Compare the rollup tables against a fresh scan of live and archived bookings
+    Returns a list of (table, key, stored, actual) tuples for every bucket that drifted
+    """
+    drift = []
+    for table, keys, fixed, bucket in ROLLUPS:
+        columns, _ = _key(keys, fixed, bucket, 'bookings')
+        where = f'WHERE basis = {fixed[0]}' if fixed else ''
+        width = len(columns)
+        stored = {
+            tuple(row[:width]): tuple(row[width:])
+            for row in conn.execute(f'''
+                SELECT {', '.join(columns)}, booking_count, revenue, bags
+                FROM {table} {where}
+            ''')
+            if any(row[width:])
+        }
+        actual = {
+            tuple(row[:width]): tuple(row[width:])
+            for row in conn.execute(_backfill_query(conn, keys, fixed, bucket))
+        }
+        for key in sorted(set(stored) | set(actual)):
+            stored_row = stored.get(key, (0, 0, 0))
+            actual_row = actual.get(key, (0, 0, 0))
+            if stored_row != actual_row:
+                drift.append((table, key, stored_row, actual_row))
+    return drift
+
+
+def parse_range(granularity, start=None, end=None, today=None):
+    """
+    Validate a granularity and YYYY-MM-DD range, filling in defaults
+    Returns (start, end) dates; raises ValueError with a user-facing message.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of: {", ".join(GRANULARITIES)}')
+
+    try:
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else (today or datetime.now(timezone.utc).date())
+        start_date = (
+            datetime.strptime(start, '%Y-%m-%d').date() if start
+            else end_date - timedelta(days=DEFAULT_SPAN_DAYS[granularity] - 1)
+        )
+    except ValueError:
+        raise ValueError('start and end must be dates in YYYY-MM-DD format') from None
+
+    if start_date > end_date:
+        raise ValueError('start must not be after end')
+    if (end_date - start_date).days + 1 > MAX_SPAN_DAYS[granularity]:
+        raise ValueError(
+            f'{granularity} ranges are limited to {MAX_SPAN_DAYS[granularity]} days'
+        )
+    return start_date, end_date
+
+
+def _bucket_label(granularity, day):
+    if granularity == 'week':
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if granularity == 'month':
+        return day.strftime('%Y-%m')
+    return day.isoformat()
+
+
+def _bucket_labels(granularity, start, end):
+    """Every bucket in the range, oldest first, so empty periods chart as zero"""
+    labels = []
+    day = start
+    while day <= end:
+        if granularity == 'hour':
+            labels.extend(f'{day.isoformat()} {hour:02d}:00' for hour in range(24))
+        else:
+            label = _bucket_label(granularity, day)
+            if not labels or labels[-1] != label:
+                labels.append(label)
+        day += timedelta(days=1)
+    return labels
+
+
+def read_timeseries(conn, granularity='day', start=None, end=None, basis='created',
+                    service=None, status=None):
+    """
+    Revenue, bag and booking counts per bucket, broken down by service and status
+    Reads only rollup rows in the range; start and end are inclusive dates.
+    """
+    if basis not in BASES:
+        raise ValueError(f'basis must be one of: {", ".join(BASES)}')
+    if granularity == 'hour' and basis != 'created':
+        raise ValueError('hourly rollups are only kept for basis=created')
+    start, end = parse_range(granularity, start, end)
+
+    if granularity == 'hour':
+        bucket = 'hour'
+        sql = 'FROM booking_rollup_hourly WHERE hour BETWEEN ? AND ?'
+        params = [f'{start.isoformat()} 00:00', f'{end.isoformat()} 23:00']
+    else:
+        bucket = {
+            'day': 'day',
+            'week': "date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days')",
+            'month': 'substr(day, 1, 7)',
+        }[granularity]
+        sql = 'FROM booking_rollup_daily WHERE basis = ? AND day BETWEEN ? AND ?'
+        params = [basis, start.isoformat(), end.isoformat()]
+
+    if service:
+        sql += ' AND service = ?'
+        params.append(service)
+    if status:
+        sql += ' AND status = ?'
+        params.append(status)
+
+    rows = conn.execute(f'''
+        SELECT {bucket} AS bucket, service, status,
+               SUM(booking_count), SUM(revenue), SUM(bags)
+        {sql}
+        GROUP BY bucket, service, status
+        HAVING SUM(booking_count) != 0
+    ''', params).fetchall()
+
+    series = {
+        label: {'bucket': label, 'bookings': 0, 'revenue': 0, 'bags': 0,
+                'by_service': {}, 'by_status': {}}
+        for label in _bucket_labels(granularity, start, end)
+    }
+    totals = {'bookings': 0, 'revenue': 0, 'bags': 0}
+
+    for label, row_service, row_status, booking_count, revenue, bags in rows:
+        point = series.get(label)
+        if point is None:
+            continue
+        point['bookings'] += booking_count
+        point['revenue'] += revenue
+        point['bags'] += bags
+        point['by_service'][row_service] = point['by_service'].get(row_service, 0) + booking_count
+        point['by_status'][row_status] = point['by_status'].get(row_status, 0) + booking_count
+        totals['bookings'] += booking_count
+        totals['revenue'] += revenue
+        totals['bags'] += bags
+
+    return {
+        'granularity': granularity,
+        'basis': basis,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'rollup_rows': len(rows),
+        'totals': totals,
+        'series': list(series.values()),
+    }
+
+
+def sum_timeseries(results):
+    """One series summed across several read_timeseries() results for the same range, e.g. one per location"""
+    results = list(results)
+    total = dict(results[0], totals=dict(results[0]['totals']), series=[
+        dict(point, by_service=dict(point['by_service']), by_status=dict(point['by_status']))
+        for point in results[0]['series']
+    ])
+    for result in results[1:]:
+        total['rollup_rows'] += result['rollup_rows']
+        for key in ('bookings', 'revenue', 'bags'):
+            total['totals'][key] += result['totals'][key]
+        for point, other in zip(total['series'], result['series']):
+            for key in ('bookings', 'revenue', 'bags'):
+                point[key] += other[key]
+            for breakdown in ('by_service', 'by_status'):
+                for name, count in other[breakdown].items():
+                    point[breakdown][name] = point[breakdown].get(name, 0) + count
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the booking rollup tables')
+    parser.add_argument('command', choices=['install', 'backfill', 'verify'])
+    parser.add_argument('--db', default=DB_PATH, help='Path to arielgo.db')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+
+    if args.command == 'install':
+        install_timeseries(conn)
+        print('✅ Booking rollup tables and triggers installed')
+    elif args.command == 'backfill':
+        backfill_timeseries(conn)
+        days = conn.execute('SELECT COUNT(DISTINCT day) FROM booking_rollup_daily').fetchone()[0]
+        print(f'✅ Booking rollups rebuilt from bookings ({days} days of history)')
+    else:
+        drift = verify_timeseries(conn)
+        if drift:
+            for table, key, stored, actual in drift[:20]:
+                print(f'❌ {table} {key}: stored {stored} != actual {actual}')
+            if len(drift) > 20:
+                print(f'   ... and {len(drift) - 20} more')
+            print('Run "python timeseries.py backfill" to repair')
+            sys.exit(1)
+        print('✅ Booking rollups match bookings')
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+In-process TTL/LRU cache for Flask-Login's user_loader
+Account changes invalidate entries explicitly. With USER_CACHE_SHARED_PATH set,
+invalidations are also published to a small SQLite log that every gunicorn
+worker polls, so a deactivation reaches all workers within USER_CACHE_SYNC_INTERVAL.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+USER_CACHE_SHARED_PATH = os.getenv('USER_CACHE_SHARED_PATH')
+USER_CACHE_SYNC_INTERVAL = float(os.getenv('USER_CACHE_SYNC_INTERVAL', '1'))
+# Seconds an invalidation is remembered, so a load that started before it can't cache stale data
+TOMBSTONE_SECONDS = 60
+
+
+class SqliteInvalidationLog:
+    """
+    Append-only log of invalidated user ids shared between worker processes
+    Kept in its own file so it never contends with booking writes in arielgo.db.
+    """
+    RETENTION = 3600
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+        # Short-lived connection so nothing is shared across a gunicorn fork
+        conn = sqlite3.connect(path, timeout=5)
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_invalidations (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    invalidated_at REAL NOT NULL
+                )
+            ''')
+        conn.close()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode = WAL')
+            self._local.conn = conn
+        return conn
+
+    def publish(self, user_id):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO user_invalidations (user_id, invalidated_at) VALUES (?, ?)',
+                (str(user_id), now)
+            )
+            conn.execute(
+                'DELETE FROM user_invalidations WHERE invalidated_at < ?',
+                (now - self.RETENTION,)
+            )
+
+    def changes_since(self, seq):
+        """
+        Return (latest_seq, user_ids, complete) for entries after seq
+        complete is False when entries after seq were already pruned.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT seq, user_id FROM user_invalidations WHERE seq > ? ORDER BY seq',
+            (seq,)
+        ).fetchall()
+        if not rows:
+            latest = conn.execute('SELECT MAX(seq) FROM user_invalidations').fetchone()[0]
+            return max(seq, latest or 0), [], True
+        return rows[-1][0], [user_id for _, user_id in rows], rows[0][0] == seq + 1
+
+    def latest_seq(self):
+        return self._connect().execute(
+            'SELECT COALESCE(MAX(seq), 0) FROM user_invalidations'
+        ).fetchone()[0]
+
+
+class UserCache:
+    """
+    Bounded LRU of loaded users with a per-entry TTL
+    Loads take a stamp() before reading the database and pass it to set(); a user
+    invalidated since that stamp is not stored, so a deactivation that commits while
+    a load is in flight can't be undone by the load's stale row.
+    """
+
+    def __init__(self, max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL,
+                 shared_log=None, sync_interval=USER_CACHE_SYNC_INTERVAL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_log = shared_log
+        self.sync_interval = sync_interval
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._synced_seq = None
+        self._next_sync = 0.0
+        # Bumped on every invalidation; key -> (generation, monotonic time) of its last one
+        self._generation = 0
+        self._tombstones = OrderedDict()
+        # Stamps at or before this can't be checked any more (tombstones pruned, or a clear)
+        self._horizon = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        """Cached value for user_id, or None on a miss"""
+        key = str(user_id)
+        self._sync()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def stamp(self):
+        """Invalidation generation to pass to set() for a load starting now"""
+        with self._lock:
+            return self._generation
+
+    def set(self, user_id, value, stamp=None):
+        """
+        Cache value for user_id; with stamp, only if user_id wasn't invalidated since
+        Returns whether the value was stored.
+        """
+        key = str(user_id)
+        with self._lock:
+            if stamp is not None:
+                self._prune_tombstones()
+                tombstone = self._tombstones.get(key)
+                if stamp < self._horizon or (tombstone is not None and tombstone[0] > stamp):
+                    return False
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, user_id):
+        """Drop user_id here and, if shared, in every other worker"""
+        self._drop(str(user_id))
+        if self.shared_log is not None:
+            self.shared_log.publish(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            # Every load in flight may be stale
+            self._generation += 1
+            self._horizon = self._generation
+
+    def _drop(self, key):
+        with self._lock:
+            self._generation += 1
+            self._tombstones[key] = (self._generation, time.monotonic())
+            self._tombstones.move_to_end(key)
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def _prune_tombstones(self):
+        """Forget invalidations older than TOMBSTONE_SECONDS (caller holds the lock)"""
+        cutoff = time.monotonic() - TOMBSTONE_SECONDS
+        while self._tombstones:
+            key, (generation, dropped_at) = next(iter(self._tombstones.items()))
+            if dropped_at > cutoff:
+                break
+            del self._tombstones[key]
+            self._horizon = max(self._horizon, generation)
+
+    def _sync(self):
+        """Apply invalidations published by other workers, at most once per sync_interval"""
+        if self.shared_log is None:
+            return
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+
+        try:
+            if self._synced_seq is None:
+                # First sync in this process: nothing cached yet, just catch up
+                self._synced_seq = self.shared_log.latest_seq()
+                return
+            seq, user_ids, complete = self.shared_log.changes_since(self._synced_seq)
+        except sqlite3.Error:
+            # Can't tell what changed; fall back to reloading everyone
+            self.clear()
+            return
+
+        if not complete:
+            self.clear()
+        for key in user_ids:
+            self._drop(key)
+        self._synced_seq = seq
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'shared': self.shared_log is not None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+user_cache = UserCache(
+    shared_log=SqliteInvalidationLog(USER_CACHE_SHARED_PATH) if USER_CACHE_SHARED_PATH else None
+)
@@ -0,0 +1,171 @@
+"""
+Bulk import of admin users and drivers from CSV or JSONL
+Rows are validated and checked against existing usernames and emails first, so
+bcrypt time is only spent on accounts that will be created. Passwords are then
+hashed across every core and inserted in batched transactions. A duplicate skips its
+row, not the batch. Run through database/create_admin_users.py --import.
+"""
+import csv
+import json
+import os
+
+from passwords import BCRYPT_ROUNDS, hash_passwords
+
+IMPORT_BATCH_SIZE = 500
+MIN_PASSWORD_LENGTH = 6
+ROLES = ('driver', 'admin', 'super_admin')
+
+
+def read_rows(path):
+    """(line number, record dict) pairs; .jsonl/.ndjson files are JSON lines, anything else CSV"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson'):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, {'_error': f'invalid JSON ({e.msg})'}
+                    continue
+                yield line_number, record if isinstance(record, dict) else {'_error': 'not a JSON object'}
+        else:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+
+
+def _parse_active(value):
+    if value in (None, ''):
+        return 1
+    if isinstance(value, bool):
+        return int(value)
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'active'):
+        return 1
+    if text in ('0', 'false', 'no', 'inactive'):
+        return 0
+    raise ValueError(f'is_active must be true or false, not {value!r}')
+
+
+def validate(record, default_role='driver'):
+    """A clean user dict from one input record; raises ValueError naming the problem"""
+    if '_error' in record:
+        raise ValueError(record['_error'])
+
+    user = {field: str(record.get(field) or '').strip() for field in ('username', 'email', 'full_name')}
+    # Passwords are taken exactly as given
+    user['password'] = str(record.get('password') or '')
+    missing = [field for field in ('username', 'password', 'email', 'full_name') if not user[field]]
+    if missing:
+        raise ValueError(f'missing {", ".join(missing)}')
+    if len(user['password']) < MIN_PASSWORD_LENGTH:
+        raise ValueError(f'password must be at least {MIN_PASSWORD_LENGTH} characters')
+
+    user['role'] = str(record.get('role') or default_role).strip()
+    if user['role'] not in ROLES:
+        raise ValueError(f'role must be one of: {", ".join(ROLES)}')
+    user['is_active'] = _parse_active(record.get('is_active'))
+    return user
+
+
+def _existing(conn, column, values):
+    """Which of values are already taken in admin_users.column"""
+    found, values = set(), list(values)
+    # Chunked to stay under SQLite's bound-variable limit
+    for offset in range(0, len(values), 500):
+        chunk = values[offset:offset + 500]
+        found.update(row[0] for row in conn.execute(
+            f'SELECT {column} FROM admin_users WHERE {column} IN ({", ".join("?" * len(chunk))})', chunk
+        ))
+    return found
+
+
+def _insert_batch(conn, batch):
+    """Insert one batch; returns the rows that lost a race for their username or email"""
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('''
+            INSERT INTO admin_users (username, password_hash, email, full_name, role, is_active)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        ''', [
+            (user['username'], user['password_hash'], user['email'], user['full_name'],
+             user['role'], user['is_active'])
+            for _, user in batch
+        ])
+        # Every hash is freshly salted, so a row is ours exactly when its hash matches
+        stored = {}
+        for offset in range(0, len(batch), 500):
+            chunk = [user['username'] for _, user in batch[offset:offset + 500]]
+            stored.update(conn.execute(
+                f'SELECT username, password_hash FROM admin_users WHERE username IN ({", ".join("?" * len(chunk))})',
+                chunk
+            ))
+    return [(line, user) for line, user in batch if stored.get(user['username']) != user['password_hash']]
+
+
+def import_users(conn, rows, default_role='driver', batch_size=IMPORT_BATCH_SIZE,
+                 workers=None, rounds=BCRYPT_ROUNDS, dry_run=False, progress=None):
+    """
+    Import (line number, record) rows into admin_users
+    Returns {'valid': n, 'imported': n, 'skipped': [(line, reason)]}. Invalid rows and
+    usernames or emails already taken (in the database or earlier in the file) are
+    skipped and reported; the rest are hashed with hash_passwords() and inserted in
+    transactions of batch_size. dry_run stops before hashing. progress(imported) is
+    called after each batch.
+    """
+    skipped, accepted = [], []
+    usernames, emails = {}, {}
+    for line, record in rows:
+        try:
+            user = validate(record, default_role)
+        except ValueError as e:
+            skipped.append((line, str(e)))
+            continue
+        if user['username'] in usernames:
+            skipped.append((line, f"username {user['username']!r} repeats line {usernames[user['username']]}"))
+            continue
+        if user['email'] in emails:
+            skipped.append((line, f"email {user['email']!r} repeats line {emails[user['email']]}"))
+            continue
+        usernames[user['username']] = emails[user['email']] = line
+        accepted.append((line, user))
+
+    taken_usernames = _existing(conn, 'username', usernames)
+    taken_emails = _existing(conn, 'email', emails)
+    pending = []
+    for line, user in accepted:
+        if user['username'] in taken_usernames:
+            skipped.append((line, f"username {user['username']!r} already exists"))
+        elif user['email'] in taken_emails:
+            skipped.append((line, f"email {user['email']!r} already exists"))
+        else:
+            pending.append((line, user))
+
+    imported = 0
+    if not dry_run:
+        hashes = hash_passwords((user['password'] for _, user in pending), workers, rounds)
+        batch = []
+        for (line, user), password_hash in zip(pending, hashes):
+            user['password_hash'] = password_hash
+            batch.append((line, user))
+            if len(batch) == batch_size:
+                imported += _flush(conn, batch, skipped)
+                batch = []
+                if progress:
+                    progress(imported)
+        if batch:
+            imported += _flush(conn, batch, skipped)
+            if progress:
+                progress(imported)
+
+    skipped.sort()
+    return {'valid': len(pending), 'imported': imported, 'skipped': skipped}
+
+
+def _flush(conn, batch, skipped):
+    lost = _insert_batch(conn, batch)
+    for line, user in lost:
+        skipped.append((line, f"username {user['username']!r} or email {user['email']!r} was taken during the import"))
+    return len(batch) - len(lost)
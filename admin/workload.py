@@ -0,0 +1,137 @@
+"""
+Per-driver workload for today and the current week
+One GROUP BY driver_id query over the week's assigned bookings feeds both the drivers
+page and /api/drivers/workload; with several locations it runs at each one and the
+results are summed. Each location's result is cached per worker and thrown away when
+this worker assigns a driver or changes a status; the booking_changes seq catches
+writes made by other workers or the Node server.
+"""
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+# Upper bound on how long a cached workload is served without re-checking bookings
+WORKLOAD_CACHE_TTL = float(os.getenv('WORKLOAD_CACHE_TTL', '60'))
+
+# Pending and confirmed bookings count as assigned but not picked up yet. CROSS JOIN keeps
+# admin_users as the outer loop, so each driver is a few (driver_id, status, pickupDate)
+# index seeks and the cost follows this week's bookings, not every booking ever assigned.
+WORKLOAD_QUERY = '''
+    SELECT d.id AS driver_id,
+           SUM(b.pickupDate = :today AND b.status IN ('pending', 'confirmed')) AS today_assigned,
+           SUM(b.pickupDate = :today AND b.status = 'in_progress') AS today_in_progress,
+           SUM(b.pickupDate = :today AND b.status = 'completed') AS today_completed,
+           SUM(CASE WHEN b.pickupDate = :today THEN COALESCE(b.numberOfBags, 0) ELSE 0 END) AS today_bags,
+           SUM(CASE WHEN b.pickupDate = :today THEN COALESCE(b.totalPrice, 0) ELSE 0 END) AS today_revenue,
+           SUM(b.status IN ('pending', 'confirmed')) AS week_assigned,
+           SUM(b.status = 'in_progress') AS week_in_progress,
+           SUM(b.status = 'completed') AS week_completed,
+           SUM(COALESCE(b.numberOfBags, 0)) AS week_bags,
+           SUM(COALESCE(b.totalPrice, 0)) AS week_revenue
+    FROM admin_users d
+    CROSS JOIN bookings b
+    WHERE d.role = 'driver' AND b.driver_id = d.id
+      AND b.status IN ('pending', 'confirmed', 'in_progress', 'completed')
+      AND b.pickupDate BETWEEN :week_start AND :week_end
+    GROUP BY d.id
+'''
+
+PERIOD_FIELDS = ('assigned', 'in_progress', 'completed', 'bags', 'revenue')
+
+
+def week_bounds(day):
+    """Monday and Sunday of the week containing day"""
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+
+def empty_workload():
+    return {period: dict.fromkeys(PERIOD_FIELDS, 0) for period in ('today', 'week')}
+
+
+def load_workload(conn, day):
+    """{driver_id: {'today': {...}, 'week': {...}}} for drivers with bookings this week"""
+    week_start, week_end = week_bounds(day)
+    rows = conn.execute(WORKLOAD_QUERY, {
+        'today': day.isoformat(),
+        'week_start': week_start.isoformat(),
+        'week_end': week_end.isoformat(),
+    })
+    workload = {}
+    for row in rows:
+        workload[row['driver_id']] = {
+            period: {field: row[f'{period}_{field}'] or 0 for field in PERIOD_FIELDS}
+            for period in ('today', 'week')
+        }
+    return workload
+
+
+def sum_workloads(results):
+    """One workload summed across several load_workload() results, e.g. one per location"""
+    total = {}
+    for result in results:
+        for driver_id, periods in result.items():
+            driver = total.setdefault(driver_id, empty_workload())
+            for period, fields in periods.items():
+                for field, value in fields.items():
+                    driver[period][field] += value
+    return total
+
+
+def change_marker(conn):
+    """Latest booking_changes seq; moves on every booking write from any process"""
+    return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM booking_changes').fetchone()[0]
+
+
+class WorkloadCache:
+    """The current week's workload per location, kept until a booking write or the TTL"""
+
+    def __init__(self, ttl=WORKLOAD_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, conn, day=None, location=None):
+        """Workload at location for day's week, from cache when nothing has changed since it was built"""
+        day = day or date.today()
+        marker = change_marker(conn)
+
+        with self._lock:
+            entry = self._entries.get(location)
+            if entry is not None:
+                cached_day, cached_marker, expires_at, workload = entry
+                if cached_day == day and cached_marker == marker and expires_at > time.monotonic():
+                    self.hits += 1
+                    return workload
+            self.misses += 1
+
+        workload = load_workload(conn, day)
+        with self._lock:
+            self._entries[location] = (day, marker, time.monotonic() + self.ttl, workload)
+        return workload
+
+    def invalidate(self):
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'cached': bool(self._entries),
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+workload_cache = WorkloadCache()
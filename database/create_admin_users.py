@@ -1,16 +1,36 @@
 #!/usr/bin/env python3
 """
 Create admin users table and add default admin account
+Then bring the admin schema up to date: the indexes and trigger-maintained tables the
+admin routes need, fresh planner statistics, and optionally an EXPLAIN QUERY PLAN check
+of every admin query. Safe to run again; needs the admin dependencies installed.
+
+Usage:
+    python3 create_admin_users.py                      # create/migrate database/arielgo.db
+    python3 create_admin_users.py --check-plans        # ...and fail on full table scans
+    python3 create_admin_users.py --fixture 200000     # check against a large synthetic database
+    python3 create_admin_users.py --import drivers.csv # bulk-create accounts from CSV or JSONL
+    python3 create_admin_users.py --location-db tacoma.db   # ...and migrate another location's bookings
 """
+import argparse
 import sqlite3
 import os
 import hashlib
+import sys
+import tempfile
+import time
+
+ADMIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'admin')
+sys.path.insert(0, ADMIN_DIR)
+
+import schema  # noqa: E402
+import user_import  # noqa: E402
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'arielgo.db')
 
-def create_admin_table():
+def create_admin_table(db_path=DB_PATH):
     """Create admin users table"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     # Create admin users table
@@ -51,5 +71,123 @@ def create_admin_table():
     conn.close()
     print('✅ Admin users table created successfully')
 
+def migrate(db_path=DB_PATH, accounts=True):
+    """
+    Install the admin indexes and tables, then refresh planner statistics
+    accounts=False leaves out admin_users' indexes and triggers, for a location
+    database that only holds bookings.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    skipped = []
+
+    def on_error(name, e):
+        skipped.append(name)
+        print(f'⚠️  Skipped {name}: {e}')
+
+    schema.install_admin_schema(conn, on_error=on_error, accounts=accounts)
+    schema.analyze(conn)
+    conn.close()
+    if not skipped:
+        print(f'✅ Admin indexes and tables up to date in {os.path.basename(db_path)}, statistics refreshed')
+    return skipped
+
+def check_plans(db_path=DB_PATH, min_rows=schema.MIN_SCAN_ROWS, verbose=False):
+    """EXPLAIN every admin query; returns the names of those that scan a large table"""
+    conn = sqlite3.connect(db_path)
+    failures = []
+    for name, plan, problems in schema.check_query_plans(conn, min_rows=min_rows):
+        if problems:
+            failures.append(name)
+            print(f'❌ {name}: {"; ".join(problems)}')
+        elif verbose:
+            print(f'✅ {name}')
+        if problems or verbose:
+            for detail in plan:
+                print(f'      {detail}')
+    conn.close()
+
+    if failures:
+        print(f'❌ {len(failures)} of {len(schema.ADMIN_QUERIES)} admin queries failed the plan check '
+              f'(tables of {min_rows}+ rows must be read through an index)')
+    else:
+        print(f'✅ All {len(schema.ADMIN_QUERIES)} admin queries use an index')
+    return failures
+
+def check_fixture(bookings, min_rows=schema.MIN_SCAN_ROWS, verbose=False):
+    """Migrate and check a throwaway synthetic database with the given number of bookings"""
+    # Appended, not prepended: benchmarks/ has modules named like the admin ones
+    sys.path.append(os.path.join(ADMIN_DIR, 'benchmarks'))
+    from synthetic_db import generate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'fixture.db')
+        elapsed = generate(path, bookings, bcrypt_rounds=4)
+        print(f'✅ Fixture database with {bookings} bookings generated in {elapsed:.1f}s')
+        migrate(path)
+        return check_plans(path, min_rows, verbose)
+
+def import_accounts(path, db_path=DB_PATH, role='driver', batch_size=user_import.IMPORT_BATCH_SIZE,
+                    workers=None, dry_run=False):
+    """Bulk-create accounts from a CSV or JSONL file; returns the number of skipped rows"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    started = time.perf_counter()
+
+    def progress(imported):
+        print(f'   {imported} imported ({time.perf_counter() - started:.1f}s)')
+
+    result = user_import.import_users(
+        conn, user_import.read_rows(path), default_role=role, batch_size=batch_size,
+        workers=workers, dry_run=dry_run, progress=progress
+    )
+    conn.close()
+
+    for line, reason in result['skipped']:
+        print(f'⚠️  Line {line}: {reason}')
+    if dry_run:
+        print(f'ℹ️  Dry run: {result["valid"]} accounts would be imported, {len(result["skipped"])} skipped')
+    else:
+        print(f'✅ Imported {result["imported"]} accounts in {time.perf_counter() - started:.1f}s '
+              f'({len(result["skipped"])} skipped)')
+    return len(result['skipped'])
+
+def main():
+    parser = argparse.ArgumentParser(description='Create and migrate the admin schema')
+    parser.add_argument('--db', default=DB_PATH, help='Database file (default: database/arielgo.db)')
+    parser.add_argument('--location-db', action='append', default=[], metavar='PATH',
+                        help="Also migrate another location's bookings database (repeatable; "
+                             'accounts stay in --db)')
+    parser.add_argument('--check-plans', action='store_true',
+                        help='EXPLAIN every admin query and exit 1 on a full table scan')
+    parser.add_argument('--fixture', type=int, metavar='BOOKINGS',
+                        help='Check plans against a synthetic database of this many bookings instead of --db')
+    parser.add_argument('--min-rows', type=int, default=schema.MIN_SCAN_ROWS,
+                        help='Smallest table a full scan counts against (default: %(default)s)')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan, not just failures')
+    parser.add_argument('--import', dest='import_path', metavar='FILE',
+                        help='Create the accounts in a CSV or JSONL file (username, password, email, '
+                             'full_name, optional role and is_active)')
+    parser.add_argument('--role', default='driver', choices=user_import.ROLES,
+                        help='Role for imported rows without one (default: driver)')
+    parser.add_argument('--batch-size', type=int, default=user_import.IMPORT_BATCH_SIZE,
+                        help='Accounts inserted per transaction')
+    parser.add_argument('--workers', type=int, help='Hashing processes (default: one per core)')
+    parser.add_argument('--dry-run', action='store_true', help='Validate and report duplicates only')
+    args = parser.parse_args()
+
+    if args.import_path:
+        skipped = import_accounts(args.import_path, args.db, args.role, args.batch_size,
+                                  args.workers, args.dry_run)
+        # Skipped rows are reported, not fatal; exit 2 so scripts can still notice them
+        sys.exit(2 if skipped else 0)
+    if args.fixture:
+        failures = check_fixture(args.fixture, args.min_rows, args.verbose)
+    else:
+        create_admin_table(args.db)
+        migrate(args.db)
+        for path in args.location_db:
+            migrate(path, accounts=False)
+        failures = check_plans(args.db, args.min_rows, args.verbose) if args.check_plans else []
+    sys.exit(1 if failures else 0)
+
 if __name__ == '__main__':
-    create_admin_table()
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Rebuild the admin dashboard's booking search index (bookings_fts)
+Triggers keep it current on their own; run this after restoring a backup or bulk
+loading bookings with the triggers missing. Needs the admin dependencies installed.
+
+Without --db, every location in ARIELGO_LOCATIONS is rebuilt. Usage:
+    python3 rebuild_search_index.py [--db PATH]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'admin'))
+
+from db import LOCATIONS  # noqa: E402
+from search import install_search, rebuild_search  # noqa: E402
+
+def rebuild_search_index(db_path):
+    """Install the index if needed, then re-index every booking"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+
+    install_search(conn)
+    rebuild_search(conn)
+
+    count = conn.execute('SELECT COUNT(*) FROM bookings_fts').fetchone()[0]
+    conn.close()
+    print(f'✅ Search index rebuilt in {os.path.basename(db_path)} ({count} bookings indexed)')
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the admin dashboard's booking search index")
+    parser.add_argument('--db', help='Rebuild this database file only (default: every location)')
+    args = parser.parse_args()
+
+    for path in [args.db] if args.db else LOCATIONS.values():
+        rebuild_search_index(path)
+
+if __name__ == '__main__':
+    main()
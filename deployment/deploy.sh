@@ -87,9 +87,14 @@ node -e "const db = require('./database/database-pg.js');" || echo "Database ini
 echo -e "${BLUE}📦 Step 10: Setting up systemd services...${NC}"
 sudo cp /home/ubuntu/laundry-app/deployment/arielgo-backend.service /etc/systemd/system/
 sudo cp /home/ubuntu/laundry-app/deployment/arielgo-admin.service /etc/systemd/system/
+sudo cp /home/ubuntu/laundry-app/deployment/arielgo-admin-async.service /etc/systemd/system/
+sudo cp /home/ubuntu/laundry-app/deployment/arielgo-archive.service /etc/systemd/system/
+sudo cp /home/ubuntu/laundry-app/deployment/arielgo-archive.timer /etc/systemd/system/
 sudo systemctl daemon-reload
 sudo systemctl enable arielgo-backend
 sudo systemctl enable arielgo-admin
+sudo systemctl enable arielgo-admin-async
+sudo systemctl enable arielgo-archive.timer
 
 echo -e "${BLUE}📦 Step 11: Configuring Nginx...${NC}"
 sudo cp /home/ubuntu/laundry-app/deployment/nginx.conf /etc/nginx/sites-available/arielgo
@@ -109,6 +114,8 @@ echo -e "${GREEN}✅ Nginx configured${NC}"
 echo -e "${BLUE}📦 Step 12: Starting services...${NC}"
 sudo systemctl start arielgo-backend
 sudo systemctl start arielgo-admin
+sudo systemctl start arielgo-admin-async
+sudo systemctl start arielgo-archive.timer
 
 # Wait a moment for services to start
 sleep 3